@@ -0,0 +1,456 @@
+import asyncio
+import os
+import threading
+from dataclasses import dataclass, field
+from web3 import Web3
+
+# Seconds between eth_getFilterChanges polls; Ganache mines on every transaction,
+# so this bounds how long after its block a state change becomes visible
+AUCTION_POLL_INTERVAL = float(os.getenv("AUCTION_POLL_INTERVAL", "0.5"))
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+# Contract state read once at start-up; events keep it current afterwards
+STATE_GETTERS = [
+    "seller", "biddingStart", "biddingEnd", "revealEnd", "ended", "biddingDuration",
+    "revealDuration", "energyAmount", "highestBidder", "highestBid", "secondHighestBid"
+]
+# Aggregate view returning every field above plus bidders/deposits in one eth_call
+SNAPSHOT_FUNCTION = "getAuctionSnapshot"
+# Present only on EnergyVickreyAuctionMulti: every open auction, keyed by auction ID
+OPEN_AUCTIONS_FUNCTION = "getOpenAuctions"
+# Closed auctions kept by MultiAuctionState so callers can still read their winners
+CLOSED_AUCTIONS_KEPT = int(os.getenv("CLOSED_AUCTIONS_KEPT", "64"))
+
+@dataclass
+class AuctionSnapshot:
+    """Contract state as of one block."""
+    block: int
+    seller: str
+    bidding_start: int
+    bidding_end: int
+    reveal_end: int
+    ended: bool
+    bidding_duration: int
+    reveal_duration: int
+    energy_amount: int
+    highest_bidder: str
+    highest_bid: int
+    second_highest_bid: int
+    deposits: dict = field(default_factory=dict)  # bidder -> deposit
+
+    @classmethod
+    def from_values(cls, block, values, bidders, deposits):
+        """values are the STATE_GETTERS results in order."""
+        return cls(block, *values, deposits=dict(zip(bidders, deposits)))
+
+    @classmethod
+    def from_struct(cls, values):
+        """Decodes getAuctionSnapshot()'s (blockNumber, <STATE_GETTERS>..., bidders, deposits) tuple."""
+        return cls.from_values(values[0], values[1:-2], values[-2], values[-1])
+
+    def timings(self):
+        return self.bidding_start, self.bidding_end, self.reveal_end
+
+@dataclass
+class MultiAuctionSnapshot:
+    """Every open auction of EnergyVickreyAuctionMulti as of one block."""
+    block: int
+    auctions: dict  # auction ID -> AuctionSnapshot
+
+    @classmethod
+    def from_struct(cls, block, views):
+        """Decodes getOpenAuctions()'s AuctionView tuples (auctionId first, then the auction's fields)."""
+        auctions = {}
+        for (auction_id, seller, bidding_start, bidding_end, reveal_end, ended, energy_amount,
+             highest_bidder, highest_bid, second_highest_bid, bidders, deposits) in views:
+            auctions[auction_id] = AuctionSnapshot(
+                block, seller, bidding_start, bidding_end, reveal_end, ended,
+                bidding_end - bidding_start, reveal_end - bidding_end, energy_amount,
+                highest_bidder, highest_bid, second_highest_bid, dict(zip(bidders, deposits))
+            )
+        return cls(block, auctions)
+
+def has_function(contract, name):
+    return any(item.get("type") == "function" and item.get("name") == name for item in contract.abi)
+
+def create_sealed_bid(value, nonce):
+    """Sealed bid hash, the contracts' keccak256(abi.encodePacked(value, nonce))."""
+    return Web3.solidity_keccak(["uint256", "string"], [int(value), str(nonce)])
+
+def auction_args(auction_id):
+    """Leading contract arguments addressing one auction: (auction_id,) on the multi-auction contract."""
+    return () if auction_id is None else (auction_id,)
+
+def snapshot_calls(contract, block):
+    """The individual reads a snapshot is made of, pinned to `block`."""
+    calls = [getattr(contract.functions, getter)() for getter in STATE_GETTERS]
+    return [call.call(block_identifier=block) for call in calls + [contract.functions.getBidDeposits()]]
+
+def read_snapshot(web3, contract):
+    """
+    One round trip when the contract has getAuctionSnapshot, otherwise one JSON-RPC
+    batch of the individual getters (or separate calls if the node rejects batches).
+    """
+    if has_function(contract, SNAPSHOT_FUNCTION):
+        return AuctionSnapshot.from_struct(getattr(contract.functions, SNAPSHOT_FUNCTION)().call())
+    block = web3.eth.block_number
+    try:
+        with web3.batch_requests() as batch:
+            for call in snapshot_calls(contract, block):
+                batch.add(call)
+            results = batch.execute()
+    except Exception as e:
+        print(f"[AuctionMirror] Batched snapshot failed ({e}), reading fields one by one")
+        results = [getattr(contract.functions, getter)().call(block_identifier=block) for getter in STATE_GETTERS]
+        results.append(contract.functions.getBidDeposits().call(block_identifier=block))
+    bidders, deposits = results[-1]
+    return AuctionSnapshot.from_values(block, results[:-1], bidders, deposits)
+
+async def read_snapshot_async(web3, contract):
+    """read_snapshot for an AsyncWeb3 client."""
+    if has_function(contract, SNAPSHOT_FUNCTION):
+        return AuctionSnapshot.from_struct(await getattr(contract.functions, SNAPSHOT_FUNCTION)().call())
+    block = await web3.eth.block_number
+    calls = snapshot_calls(contract, block)
+    try:
+        async with web3.batch_requests() as batch:
+            for call in calls:
+                batch.add(call)
+            results = await batch.async_execute()
+    except Exception as e:
+        print(f"[AuctionMirror] Batched snapshot failed ({e}), reading fields one by one")
+        for call in calls:
+            call.close()  # Release the coroutines the failed batch never awaited
+        results = list(await asyncio.gather(*snapshot_calls(contract, block)))
+    bidders, deposits = results[-1]
+    return AuctionSnapshot.from_values(block, results[:-1], bidders, deposits)
+
+def read_open_auctions(web3, contract):
+    return MultiAuctionSnapshot.from_struct(*getattr(contract.functions, OPEN_AUCTIONS_FUNCTION)().call())
+
+async def read_open_auctions_async(web3, contract):
+    return MultiAuctionSnapshot.from_struct(*await getattr(contract.functions, OPEN_AUCTIONS_FUNCTION)().call())
+
+def event_topics(contract):
+    """Maps each event's topic0 hash to its name."""
+    topics = {}
+    for item in contract.abi:
+        if item.get("type") == "event":
+            signature = f"{item['name']}({','.join(arg['type'] for arg in item['inputs'])})"
+            topics[bytes(Web3.keccak(text=signature))] = item["name"]
+    return topics
+
+class AuctionState:
+    """
+    Local copy of EnergyVickreyAuction's state, advanced by its events
+    (AuctionStarted, BidPlaced, BidRevealed, AuctionClosed, AuctionReset).
+    Also holds one auction of MultiAuctionState, which decodes the events for it.
+    """
+    concurrent = False  # One auction at a time, addressed as auction ID None
+
+    def __init__(self, contract=None, auction_id=None):
+        self.contract = contract
+        self.topics = event_topics(contract) if contract is not None else {}
+        self.auction_id = auction_id
+        self.block = None  # Last block whose events have been applied
+        self.seller = ZERO_ADDRESS
+        self.bidding_start = 0
+        self.bidding_end = 0
+        self.reveal_end = 0
+        self.ended = True
+        self.bidding_duration = 0
+        self.reveal_duration = 0
+        self.energy_amount = 0
+        self.highest_bidder = ZERO_ADDRESS
+        self.highest_bid = 0
+        self.second_highest_bid = 0
+        self.deposits = {}  # bidder -> deposit for the current round
+        self.revealed = {}  # bidder -> revealed value
+        self.winner = None  # Set by AuctionClosed: (winner, price, energy)
+
+    def load(self, snapshot):
+        """Replaces the local state with an AuctionSnapshot."""
+        self.block = snapshot.block
+        self.seller = snapshot.seller
+        self.bidding_start = snapshot.bidding_start
+        self.bidding_end = snapshot.bidding_end
+        self.reveal_end = snapshot.reveal_end
+        self.ended = snapshot.ended
+        self.bidding_duration = snapshot.bidding_duration
+        self.reveal_duration = snapshot.reveal_duration
+        self.energy_amount = snapshot.energy_amount
+        self.highest_bidder = snapshot.highest_bidder
+        self.highest_bid = snapshot.highest_bid
+        self.second_highest_bid = snapshot.second_highest_bid
+        self.deposits = dict(snapshot.deposits)
+        self.revealed = {}
+
+    def timings(self):
+        return self.bidding_start, self.bidding_end, self.reveal_end
+
+    def read_snapshot(self, web3):
+        return read_snapshot(web3, self.contract)
+
+    async def read_snapshot_async(self, web3):
+        return await read_snapshot_async(web3, self.contract)
+
+    def auction(self, auction_id=None):
+        """Same accessor as MultiAuctionState; there is only the one auction."""
+        return self
+
+    def open_auction_ids(self):
+        return [None] if self.bidding_start != 0 and not self.ended else []
+
+    def clear_round(self):
+        self.highest_bidder = ZERO_ADDRESS
+        self.highest_bid = 0
+        self.second_highest_bid = 0
+        self.deposits = {}
+        self.revealed = {}
+
+    def apply_log(self, log):
+        """Applies one raw log; returns the event name, or None for unknown topics."""
+        name = self.topics.get(bytes(log["topics"][0])) if log["topics"] else None
+        if name is None:
+            return None
+        self.apply_event(name, self.contract.events[name]().process_log(log)["args"], log["blockNumber"])
+        return name
+
+    def apply_event(self, name, args, block):
+        """Applies one decoded event emitted in `block`."""
+        if name == "AuctionStarted":
+            self.clear_round()
+            self.seller = args["seller"]
+            self.energy_amount = args["energyAmount"]
+            self.bidding_end = args["biddingEnd"]
+            self.reveal_end = args["revealEnd"]
+            if "biddingStart" in args:
+                self.bidding_start = args["biddingStart"]
+                self.bidding_duration = args["biddingEnd"] - args["biddingStart"]
+                self.reveal_duration = args["revealEnd"] - args["biddingEnd"]
+            else:
+                # The event has no start time; startAuction sets biddingEnd = biddingStart + biddingDuration
+                self.bidding_start = args["biddingEnd"] - self.bidding_duration
+            self.ended = False
+            self.winner = None
+        elif name == "BidPlaced":
+            self.deposits[args["bidder"]] = args["deposit"]
+        elif name == "BidRevealed":
+            value = args["value"]
+            self.revealed[args["bidder"]] = value
+            # Same ordering rule as reveal() in the contract
+            if value > self.highest_bid:
+                self.second_highest_bid = self.highest_bid
+                self.highest_bid = value
+                self.highest_bidder = args["bidder"]
+            elif value > self.second_highest_bid:
+                self.second_highest_bid = value
+        elif name == "AuctionClosed":
+            self.ended = True
+            self.bidding_start = 0
+            self.winner = (args["winner"], args["winningPrice"], args["energyAmount"])
+        elif name == "AuctionReset":
+            self.bidding_duration = args["newBiddingDuration"]
+            self.reveal_duration = args["newRevealDuration"]
+            self.bidding_start = 0
+            self.clear_round()
+        self.block = max(self.block or 0, block)
+
+class MultiAuctionState:
+    """
+    Local copy of every auction of EnergyVickreyAuctionMulti, keyed by auction ID. Events carry
+    the auctionId and are applied to that auction's AuctionState; closed auctions are kept
+    (up to CLOSED_AUCTIONS_KEPT) so their winners stay readable.
+    """
+    concurrent = True
+
+    def __init__(self, contract):
+        self.contract = contract
+        self.topics = event_topics(contract)
+        self.block = None
+        self.auctions = {}  # auction ID -> AuctionState
+
+    def load(self, snapshot):
+        """Replaces the open auctions with a MultiAuctionSnapshot; known closed ones are kept."""
+        self.block = snapshot.block
+        auctions = {auction_id: auction for auction_id, auction in self.auctions.items() if auction.ended}
+        for auction_id, auction_snapshot in snapshot.auctions.items():
+            auction = AuctionState(auction_id=auction_id)
+            auction.load(auction_snapshot)
+            auctions[auction_id] = auction
+        self.auctions = auctions
+
+    def read_snapshot(self, web3):
+        return read_open_auctions(web3, self.contract)
+
+    async def read_snapshot_async(self, web3):
+        return await read_open_auctions_async(web3, self.contract)
+
+    def auction(self, auction_id):
+        """AuctionState of one auction, or None if it is unknown (or long closed)."""
+        return self.auctions.get(auction_id)
+
+    def open_auction_ids(self):
+        return [auction_id for auction_id, auction in self.auctions.items() if not auction.ended]
+
+    def apply_log(self, log):
+        """Applies one raw log to its auction; returns the event name, or None for unknown topics."""
+        name = self.topics.get(bytes(log["topics"][0])) if log["topics"] else None
+        if name is None:
+            return None
+        args = self.contract.events[name]().process_log(log)["args"]
+        if "auctionId" in args:
+            auction_id = args["auctionId"]
+            if auction_id not in self.auctions:
+                self.auctions[auction_id] = AuctionState(auction_id=auction_id)
+            self.auctions[auction_id].apply_event(name, args, log["blockNumber"])
+            if name == "AuctionClosed":
+                self.forget_closed()
+        self.block = max(self.block or 0, log["blockNumber"])
+        return name
+
+    def forget_closed(self):
+        closed = sorted(auction_id for auction_id, auction in self.auctions.items() if auction.ended)
+        for auction_id in closed[:-CLOSED_AUCTIONS_KEPT]:
+            del self.auctions[auction_id]
+
+class LogFollower:
+    """
+    Keeps an auction state class (AuctionState or MultiAuctionState, mixed in after this
+    class) current from its contract's logs on a background thread.
+    """
+    def __init__(self, web3, contract, poll_interval=AUCTION_POLL_INTERVAL):
+        super().__init__(contract)
+        self.web3 = web3
+        self.poll_interval = poll_interval
+        self.filter_id = None
+        self.changed = threading.Condition()
+        self.stopped = threading.Event()
+
+    def sync(self):
+        """Reads a snapshot and follows logs from the block after it."""
+        snapshot = self.read_snapshot(self.web3)
+        self.filter_id = self.web3.eth.filter({"address": self.contract.address, "fromBlock": snapshot.block + 1}).filter_id
+        with self.changed:
+            self.load(snapshot)
+            self.changed.notify_all()
+
+    def start(self):
+        self.sync()
+        threading.Thread(target=self.follow, name="auction-mirror", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def follow(self):
+        while not self.stopped.wait(self.poll_interval):
+            try:
+                logs = self.web3.eth.get_filter_changes(self.filter_id)
+            except Exception as e:
+                # Filters vanish when the node restarts; rebuild from a fresh read
+                print(f"[AuctionMirror] Lost log filter ({e}), resyncing")
+                try:
+                    self.sync()
+                except Exception as e:
+                    print(f"[AuctionMirror] Resync failed: {e}")
+                continue
+            if logs:
+                with self.changed:
+                    for log in logs:
+                        self.apply_log(log)
+                    self.changed.notify_all()
+
+    def wait_for(self, predicate, timeout=None):
+        """Blocks until predicate(mirror) holds; returns False on timeout."""
+        with self.changed:
+            return self.changed.wait_for(lambda: predicate(self), timeout)
+
+    def wait_for_block(self, block, timeout=None):
+        """Blocks until the events of `block` (e.g. from a receipt) have been applied."""
+        return self.wait_for(lambda mirror: mirror.block is not None and mirror.block >= block, timeout)
+
+class AsyncLogFollower:
+    """LogFollower driven by an asyncio task, for agents on an AsyncWeb3 client."""
+    def __init__(self, web3, contract, poll_interval=AUCTION_POLL_INTERVAL):
+        super().__init__(contract)
+        self.web3 = web3
+        self.poll_interval = poll_interval
+        self.filter_id = None
+        self.changed = asyncio.Event()  # Replaced after every batch of applied events
+        self.task = None
+
+    async def sync(self):
+        snapshot = await self.read_snapshot_async(self.web3)
+        self.filter_id = (await self.web3.eth.filter({"address": self.contract.address, "fromBlock": snapshot.block + 1})).filter_id
+        self.load(snapshot)
+        self.notify()
+
+    async def start(self):
+        await self.sync()
+        self.task = asyncio.ensure_future(self.follow())
+        return self
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    def notify(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    async def follow(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                logs = await self.web3.eth.get_filter_changes(self.filter_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[AuctionMirror] Lost log filter ({e}), resyncing")
+                try:
+                    await self.sync()
+                except Exception as e:
+                    print(f"[AuctionMirror] Resync failed: {e}")
+                continue
+            if logs:
+                for log in logs:
+                    self.apply_log(log)
+                self.notify()
+
+    async def wait_for(self, predicate, timeout=None):
+        """Waits until predicate(mirror) holds; returns False on timeout."""
+        async def until():
+            while not predicate(self):
+                await self.changed.wait()
+        try:
+            await asyncio.wait_for(until(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def wait_for_block(self, block, timeout=None):
+        """Waits until the events of `block` (e.g. from a receipt) have been applied."""
+        return await self.wait_for(lambda mirror: mirror.block is not None and mirror.block >= block, timeout)
+
+class AuctionMirror(LogFollower, AuctionState):
+    """AuctionState kept current by a background thread, for synchronous callers (smart_grid.py)."""
+
+class MultiAuctionMirror(LogFollower, MultiAuctionState):
+    """MultiAuctionState kept current by a background thread."""
+
+class AsyncAuctionMirror(AsyncLogFollower, AuctionState):
+    """AuctionState kept current by an asyncio task."""
+
+class AsyncMultiAuctionMirror(AsyncLogFollower, MultiAuctionState):
+    """MultiAuctionState kept current by an asyncio task."""
+
+def start_mirror(web3, contract):
+    """Started mirror matching the deployed contract variant (single or multi-auction)."""
+    mirror_class = MultiAuctionMirror if has_function(contract, OPEN_AUCTIONS_FUNCTION) else AuctionMirror
+    return mirror_class(web3, contract).start()
+
+async def start_mirror_async(web3, contract):
+    mirror_class = AsyncMultiAuctionMirror if has_function(contract, OPEN_AUCTIONS_FUNCTION) else AsyncAuctionMirror
+    return await mirror_class(web3, contract).start()
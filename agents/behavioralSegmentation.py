@@ -4,16 +4,129 @@ from spade.message import Message
 import json
 import asyncio
 import os
-import joblib
-import lightgbm as lgb
+from collections import OrderedDict
+import numpy as np
+from agents.codec import decode_array, pack_array
+from agents.inference import get_model_server
+
+# Bucket width per ranker feature [power_consumption, temperature, duration, holiday]; appliances
+# falling in the same buckets share one memoised priority. A width of 0 keys on the exact value.
+# The default "splits" buckets on the ranker's own split thresholds when the compiled NumPy
+# ranker is loaded (exact: a bucket can never straddle a split), otherwise on FALLBACK_BUCKETS.
+PRIORITY_BUCKETS = os.getenv("PRIORITY_BUCKETS", "splits")
+FALLBACK_BUCKETS = (0.1, 0.5, 5, 1)
+PRIORITY_MEMO_SIZE = int(os.getenv("PRIORITY_MEMO_SIZE", "4096"))
+
+class PriorityMemo:
+    """
+    Bounded LRU map from quantized feature rows to ranker scores, used in place of the
+    model handle. With fixed widths each bucket is scored at its representative point
+    (the quantized row), so a priority does not depend on which appliance filled the
+    bucket first.
+    """
+    def __init__(self, model, buckets=PRIORITY_BUCKETS, maxsize=PRIORITY_MEMO_SIZE):
+        self.model = model
+        self.edges = None
+        self.widths = None
+        if buckets == "splits":
+            split_thresholds = getattr(getattr(model, "model", None), "split_thresholds", None)
+            self.edges = split_thresholds() if split_thresholds else None
+            if self.edges is None:
+                print(f"[BehavioralSegmentationAgent] Ranker thresholds unavailable, bucketing by widths {FALLBACK_BUCKETS}")
+                buckets = FALLBACK_BUCKETS
+        if self.edges is None:
+            if isinstance(buckets, str):
+                buckets = [float(width) for width in buckets.split(",")]
+            self.widths = np.asarray(buckets, dtype=np.float64)
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def quantize(self, features):
+        """Returns (bucket keys, rows to score on a miss)."""
+        features = np.asarray(features, dtype=np.float64)
+        if self.edges is not None:
+            # Index of the threshold interval per feature; NaN scores as 0.0 in the ranker
+            clean = np.where(np.isnan(features), 0.0, features)
+            cells = np.column_stack([np.searchsorted(edges, clean[:, f]) for f, edges in enumerate(self.edges)])
+            return cells, features
+        scaled = np.round(features / np.where(self.widths > 0, self.widths, 1.0)) * self.widths
+        buckets = np.where(self.widths > 0, scaled, features)
+        return buckets, buckets
+
+    async def predict(self, features):
+        cells, rows_to_score = self.quantize(features)
+        keys = [row.tobytes() for row in cells]
+        scores = np.empty(len(keys), dtype=np.float64)
+        missing = {}  # key -> row indices, so a bucket repeated within the batch is scored once
+        for i, key in enumerate(keys):
+            score = self.entries.get(key)
+            if score is None:
+                missing.setdefault(key, []).append(i)
+            else:
+                self.entries.move_to_end(key)
+                scores[i] = score
+        if missing:
+            fresh = await self.model.predict(rows_to_score[[rows[0] for rows in missing.values()]])
+            for (key, rows), score in zip(missing.items(), np.asarray(fresh, dtype=np.float64)):
+                scores[rows] = score
+                self.entries[key] = score
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        misses = sum(len(rows) for rows in missing.values())
+        self.misses += misses
+        self.hits += len(keys) - misses
+        return scores
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries),
+                "hit_rate": self.hits / total if total else None}
+
+def house_features(data):
+    """Ranker rows [power_consumption, temperature, duration, holiday] for one house's appliances."""
+    return np.array([
+        [appliance["power_consumption"], data["temperature"], appliance["duration"], data["holiday"]]
+        for appliance in data["appliances"]
+    ], dtype=np.float64).reshape(-1, 4)
+
+def fleet_features(fleet):
+    """Ranker rows for every fleet appliance, house-major, with the house index of each row."""
+    power = decode_array(fleet["appliances"]["power_consumption"], np.float64)
+    duration = decode_array(fleet["appliances"]["duration"], np.float64)
+    houses, appliances = power.shape
+    temperature = np.repeat(decode_array(fleet["temperature"], np.float64), appliances)
+    holiday = np.repeat(decode_array(fleet["holiday"], np.float64), appliances)
+    features = np.column_stack((power.ravel(), temperature, duration.ravel(), holiday))
+    return features, np.repeat(np.arange(houses), appliances)
+
+def order_by_group(scores, groups):
+    """
+    Row indices sorted by group, highest score first inside each group. The sort is
+    stable, so tied appliances keep their input order like sorted(..., reverse=True).
+    Also returns bounds, where group g occupies order[bounds[g]:bounds[g + 1]].
+    """
+    order = np.lexsort((-scores, groups))
+    bounds = np.searchsorted(groups[order], np.arange(groups.max(initial=-1) + 2))
+    return order, bounds
+
+async def rank_appliances(model, features, groups):
+    """
+    Scores appliances from any number of houses in one model call and orders them per house.
+    model is anything with an async predict, a model handle or a PriorityMemo.
+    """
+    scores = np.asarray(await model.predict(features), dtype=np.float64)
+    order, bounds = order_by_group(scores, np.asarray(groups))
+    return scores, order, bounds
 
 # Behavioral Segmentation Agent: Prioritizes appliance usage
 class BehavioralSegmentationAgent(Agent):
     class SegmentationBehaviour(CyclicBehaviour):
         async def on_start(self):
-            project_dir = os.path.dirname(os.path.dirname(__file__))
-            model_filename = os.path.join(project_dir, "models", "lightgbm_ranker_model.pkl")
-            self.model = joblib.load(model_filename)
+            self.model = await get_model_server().get("lightgbm_ranker_model.pkl")
+            # Slowly changing inputs are mostly answered from memory instead of the ranker
+            self.priorities = PriorityMemo(self.model)
 
         async def run(self):
             await asyncio.sleep(5)
@@ -21,33 +134,51 @@ class BehavioralSegmentationAgent(Agent):
             msg = await self.receive(timeout=30)
             if msg:
                 try:
-                    data = json.loads(msg.body).get("house")
-                    if data is None:
+                    bundle = json.loads(msg.body)
+                    data = bundle.get("house")
+                    fleet = bundle.get("fleet") or {}
+                    if data is None and "appliances" not in fleet:
                         print("[BehavioralSegmentationAgent] No data received")
                     else:
+                        # The house (group 0) and every fleet home (groups 1..N) are ranked in one model call
+                        features, groups = [], []
+                        if data is not None:
+                            print(f"[BehavioralSegmentationAgent] Received data: {data}")
+                            features.append(house_features(data))
+                            groups.append(np.zeros(len(data["appliances"]), dtype=np.int64))
+                        if "appliances" in fleet:
+                            fleet_rows, fleet_groups = fleet_features(fleet)
+                            features.append(fleet_rows)
+                            groups.append(fleet_groups + 1)
+                            print(f"[BehavioralSegmentationAgent] Received fleet data for {len(fleet['house_ids'])} houses")
+
+                        # Scored on the shared inference pool instead of the event loop
+                        scores, order, bounds = await rank_appliances(self.priorities, np.concatenate(features), np.concatenate(groups))
+                        stats = self.priorities.stats()
+                        print(f"[BehavioralSegmentationAgent] Priority memo: {stats['hits']} hits, {stats['misses']} misses, "
+                              f"{stats['size']} buckets ({stats['hit_rate']:.0%} hit rate)")
+
+                        body = {}
+                        if data is not None:
+                            for i, _ in enumerate(data["appliances"]):
+                                data["appliances"][i]["priority"] = float(scores[i])
+                            body["prioritized_appliances"] = [data["appliances"][i] for i in order[bounds[0]:bounds[1]]]
+                        if "appliances" in fleet:
+                            # Columnar like the fleet input: row h lists house_ids[h]'s appliance indices, highest priority first
+                            offset = len(data["appliances"]) if data is not None else 0
+                            per_house = len(fleet["appliances"]["item"])
+                            fleet_order = ((order[bounds[1]:] - offset) % per_house).reshape(-1, per_house)
+                            body["fleet_prioritized_appliances"] = {
+                                "house_ids": fleet["house_ids"],
+                                "item": fleet["appliances"]["item"],
+                                "order": fleet_order.tolist(),
+                                "priority": pack_array(scores[offset:].reshape(fleet_order.shape))
+                            }
 
-                        print(f"[BehavioralSegmentationAgent] Received data: {data}")
-                        
-                        dataset = [
-                            [
-                                appliance["power_consumption"], 
-                                data["temperature"], 
-                                appliance["duration"], 
-                                data["holiday"]
-                            ] 
-                            for appliance in data["appliances"]
-                        ]
-                        
-                        priorities = self.model.predict(dataset)
-                        for i, _ in enumerate(data["appliances"]):
-                            data["appliances"][i]["priority"] = priorities[i]
-
-                        prioritized_appliances = sorted(data["appliances"], key=lambda x: x["priority"], reverse=True)
-                        
                         response = Message(to="facilitating@localhost")
-                        response.body = json.dumps({"prioritized_appliances": prioritized_appliances})
+                        response.body = json.dumps(body)
                         await self.send(response)
-                        print(f"[BehavioralSegmentationAgent] Sent appliance priority list to FacilitatingAgent: {response.body}")
+                        print(f"[BehavioralSegmentationAgent] Sent appliance priority list to FacilitatingAgent ({len(response.body)} bytes)")
                 
                 except Exception as e:
                     print(f"[BehavioralSegmentationAgent] Error: {e}")
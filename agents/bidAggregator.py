@@ -0,0 +1,147 @@
+import os
+from web3.logs import DISCARD
+from agents.auctionState import has_function, create_sealed_bid
+
+# Most houses per batchBid/batchReveal transaction. A batch of n houses is sent with
+# BATCH_GAS_BASE + n * BATCH_GAS_PER_BID gas, so 40 assumes a block gas limit of about 6.1M
+# or more; BidAggregator lowers the batch size to whatever the latest block's limit allows.
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "40"))
+BATCH_GAS_BASE = int(os.getenv("BATCH_GAS_BASE", "100000"))
+BATCH_GAS_PER_BID = int(os.getenv("BATCH_GAS_PER_BID", "150000"))
+
+def max_batch_size(gas_limit):
+    """Houses per batch whose gas still fits in one block."""
+    return max(1, (gas_limit - BATCH_GAS_BASE) // BATCH_GAS_PER_BID)
+
+class BidAggregator:
+    """
+    Bids and reveals for a portfolio of houses from one operator account: one batchBid and
+    one batchReveal per BATCH_SIZE houses instead of a bid and a reveal per house. Needs the
+    batch entry points of EnergyVickreyAuctionMulti. Each bid is still placed under its
+    house's address (BidPlaced/BidRevealed name the house, and the house wins the energy);
+    the operator pays the deposits and withdraws the refunds.
+    """
+    def __init__(self, web3, contract, operator, transactions, batch_size=BATCH_SIZE):
+        self.web3 = web3
+        self.contract = contract
+        self.operator = operator
+        self.transactions = transactions
+        gas_limit = web3.eth.get_block("latest")["gasLimit"]
+        self.batch_size = min(batch_size, max_batch_size(gas_limit))
+        if self.batch_size < batch_size:
+            print(f"[BidAggregator] Block gas limit {gas_limit} fits {self.batch_size} houses per batch, not {batch_size}")
+        self.bids = {}        # auction ID -> {house: (value_wei, nonce)} until revealed
+        self.unrevealed = {}  # auction ID -> houses whose deposit needs reclaim() after the close
+
+    @staticmethod
+    def supported(contract):
+        return has_function(contract, "batchBid")
+
+    def authorize(self, houses):
+        """Has every house appoint the operator (setOperator); the houses must be unlocked node accounts."""
+        pending = {}
+        for house in houses:
+            if self.contract.functions.operatorOf(house).call() != self.operator:
+                pending[house] = self.transactions.submit(self.contract.functions.setOperator(self.operator), {
+                    "from": house,
+                    "gas": 100000
+                })
+        for house, receipt in pending.items():
+            receipt.result()
+            print(f"[BidAggregator] {house} authorized operator {self.operator}")
+
+    def add(self, auction_id, house, value_wei, nonce):
+        self.bids.setdefault(auction_id, {})[house] = (int(value_wei), str(nonce))
+
+    def batches(self, auction_id):
+        entries = list(self.bids.get(auction_id, {}).items())
+        return [entries[i:i + self.batch_size] for i in range(0, len(entries), self.batch_size)]
+
+    def params(self, count, value=0):
+        params = {"from": self.operator, "gas": BATCH_GAS_BASE + BATCH_GAS_PER_BID * count}
+        if value:
+            params["value"] = value
+        return params
+
+    def submit_bids(self, auction_id):
+        """Sends every batch back-to-back and waits for the receipts; returns {house: deposit} of the placed bids."""
+        pending = []
+        for batch in self.batches(auction_id):
+            houses = [house for house, _ in batch]
+            deposits = [value for _, (value, _) in batch]
+            sealed_bids = [create_sealed_bid(value, nonce) for _, (value, nonce) in batch]
+            try:
+                pending.append((houses, self.transactions.submit(
+                    self.contract.functions.batchBid(auction_id, houses, sealed_bids, deposits),
+                    self.params(len(batch), sum(deposits))
+                )))
+            except Exception as e:
+                print(f"[BidAggregator] Failed to submit bids for {len(houses)} houses: {e}")
+                self.drop(auction_id, houses)
+
+        placed = {}
+        for houses, receipt in pending:
+            try:
+                events = self.contract.events.BidPlaced().process_receipt(receipt.result(), errors=DISCARD)
+            except Exception as e:
+                print(f"[BidAggregator] Batch bid for {len(houses)} houses failed: {e}")
+                self.drop(auction_id, houses)
+                continue
+            for event in events:
+                placed[event["args"]["bidder"]] = event["args"]["deposit"]
+        print(f"[BidAggregator] Placed {len(placed)} bids in auction {auction_id} with {len(pending)} transactions")
+        return placed
+
+    def reveal_bids(self, auction_id):
+        """Reveals every placed bid of `auction_id` in batches; returns {house: value} of the accepted reveals."""
+        pending = []
+        for batch in self.batches(auction_id):
+            houses = [house for house, _ in batch]
+            values = [value for _, (value, _) in batch]
+            nonces = [nonce for _, (_, nonce) in batch]
+            try:
+                pending.append((houses, self.transactions.submit(
+                    self.contract.functions.batchReveal(auction_id, houses, values, nonces),
+                    self.params(len(batch))
+                )))
+            except Exception as e:
+                print(f"[BidAggregator] Failed to submit reveals for {len(houses)} houses: {e}")
+                self.unrevealed.setdefault(auction_id, []).extend(houses)
+
+        revealed = {}
+        for houses, receipt in pending:
+            try:
+                events = self.contract.events.BidRevealed().process_receipt(receipt.result(), errors=DISCARD)
+            except Exception as e:
+                print(f"[BidAggregator] Batch reveal for {len(houses)} houses failed: {e}")
+                self.unrevealed.setdefault(auction_id, []).extend(houses)
+                continue
+            batch_revealed = {event["args"]["bidder"]: event["args"]["value"] for event in events}
+            revealed.update(batch_revealed)
+            # Entries the contract skipped (RevealSkipped) keep their deposit locked until reclaimed
+            self.unrevealed.setdefault(auction_id, []).extend(house for house in houses if house not in batch_revealed)
+        self.bids.pop(auction_id, None)
+        print(f"[BidAggregator] Revealed {len(revealed)} bids in auction {auction_id} with {len(pending)} transactions")
+        return revealed
+
+    def reclaim(self, auction_id):
+        """After the close, releases the deposits of bids that were never revealed to the operator."""
+        pending = {}
+        for house in self.unrevealed.pop(auction_id, []):
+            try:
+                pending[house] = self.transactions.submit(self.contract.functions.reclaim(auction_id, house), {
+                    "from": self.operator,
+                    "gas": 100000
+                })
+            except Exception as e:
+                print(f"[BidAggregator] Failed to reclaim the deposit of {house}: {e}")
+        for house, receipt in pending.items():
+            try:
+                receipt.result()
+            except Exception as e:
+                print(f"[BidAggregator] Failed to reclaim the deposit of {house}: {e}")
+
+    def drop(self, auction_id, houses):
+        bids = self.bids.get(auction_id, {})
+        for house in houses:
+            bids.pop(house, None)
@@ -0,0 +1,22 @@
+import os
+import aiohttp
+from web3 import AsyncWeb3, AsyncHTTPProvider
+
+# Ganache JSON-RPC endpoint shared by the agents and smart_grid.py
+RPC_URL = os.getenv("RPC_URL", "http://127.0.0.1:8545")
+# Keep-alive connections kept open to the node by one async client
+RPC_POOL_SIZE = int(os.getenv("RPC_POOL_SIZE", "8"))
+RPC_TIMEOUT = float(os.getenv("RPC_TIMEOUT", "30"))
+
+async def connect_async(rpc_url=RPC_URL):
+    """
+    Returns (AsyncWeb3, aiohttp session). Every request from the client reuses the
+    session's connection pool; close the session when the agent stops.
+    """
+    session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=RPC_POOL_SIZE),
+        timeout=aiohttp.ClientTimeout(total=RPC_TIMEOUT)
+    )
+    provider = AsyncHTTPProvider(rpc_url)
+    await provider.cache_async_session(session)
+    return AsyncWeb3(provider), session
@@ -0,0 +1,39 @@
+import base64
+import os
+import numpy as np
+
+# Opt-in: set BINARY_ARRAYS=1 to ship NumPy windows as base64 raw buffers instead of nested lists.
+# Receivers always understand both forms, so senders can be switched one at a time.
+BINARY_ARRAYS = os.getenv("BINARY_ARRAYS", "0") == "1"
+
+# Marker key identifying an encoded array inside a JSON message
+ARRAY_KEY = "__ndarray__"
+
+def encode_array(array, dtype=None):
+    """
+    Encodes an array as {"__ndarray__": base64 bytes, "dtype": ..., "shape": [...]}.
+    Keeps the array's own dtype unless `dtype` asks for a conversion (e.g. np.float32 to halve the size).
+    """
+    array = np.ascontiguousarray(array, dtype=dtype)
+    return {
+        ARRAY_KEY: base64.b64encode(array.tobytes()).decode("ascii"),
+        "dtype": array.dtype.str,  # Includes byte order, e.g. '<f4'
+        "shape": list(array.shape)
+    }
+
+def decode_array(value, dtype=None):
+    """Rebuilds an array from either an encoded dict or a plain (nested) list."""
+    if isinstance(value, dict) and ARRAY_KEY in value:
+        buffer = base64.b64decode(value[ARRAY_KEY])
+        array = np.frombuffer(buffer, dtype=np.dtype(value["dtype"])).reshape(value["shape"])
+    else:
+        array = np.asarray(value)
+    if dtype is not None:
+        array = array.astype(dtype, copy=False)
+    return array
+
+def pack_array(array, dtype=None):
+    """Encodes an array for a message body using the configured wire format."""
+    if BINARY_ARRAYS:
+        return encode_array(array, dtype)
+    return np.asarray(array).tolist()
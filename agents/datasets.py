@@ -0,0 +1,64 @@
+import os
+import sys
+import numpy as np
+
+# Stores already opened in this process, so every agent shares the same mappings
+_STORES = {}
+
+def store_dir_for(npz_path):
+    """The store for models/foo.npz lives in the directory models/foo/."""
+    return os.path.splitext(npz_path)[0]
+
+def export_store(npz_path, store_dir=None):
+    """Unpacks an .npz archive into a directory of uncompressed .npy files that can be memory-mapped."""
+    store_dir = store_dir or store_dir_for(npz_path)
+    os.makedirs(store_dir, exist_ok=True)
+    with np.load(npz_path) as archive:
+        for name in archive.files:
+            np.save(os.path.join(store_dir, f"{name}.npy"), archive[name])
+    print(f"[Datasets] Exported {npz_path} -> {store_dir}")
+    return store_dir
+
+class DatasetStore:
+    """
+    Read-only view of a directory of .npy files. Arrays are mapped lazily on first
+    access with mmap_mode="r", so slices are zero-copy views backed by the OS page
+    cache and are shared between processes replaying the same files.
+    """
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.arrays = {}
+
+    @property
+    def files(self):
+        return sorted(name[:-4] for name in os.listdir(self.store_dir) if name.endswith(".npy"))
+
+    def __contains__(self, name):
+        return os.path.exists(os.path.join(self.store_dir, f"{name}.npy"))
+
+    def __getitem__(self, name):
+        if name not in self.arrays:
+            path = os.path.join(self.store_dir, f"{name}.npy")
+            if not os.path.exists(path):
+                raise KeyError(f"{name} is not in dataset store {self.store_dir}")
+            self.arrays[name] = np.load(path, mmap_mode="r")
+        return self.arrays[name]
+
+def open_dataset(npz_path):
+    """
+    Opens the memory-mapped store next to an .npz archive if one has been exported,
+    otherwise falls back to loading the archive itself.
+    """
+    store_dir = store_dir_for(npz_path)
+    if os.path.isdir(store_dir):
+        if store_dir not in _STORES:
+            _STORES[store_dir] = DatasetStore(store_dir)
+        return _STORES[store_dir]
+    print(f"[Datasets] No store at {store_dir}, loading {npz_path} into memory "
+          f"(run 'python -m agents.datasets {npz_path}' to export one)")
+    return np.load(npz_path)
+
+if __name__ == "__main__":
+    # Usage: python -m agents.datasets models/energy_X_test_demand_set.npz [more.npz ...]
+    for path in sys.argv[1:]:
+        export_store(path)
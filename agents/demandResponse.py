@@ -6,8 +6,10 @@ from datetime import datetime
 import time
 import asyncio
 import os
-import tensorflow as tf
 import numpy as np
+from agents.codec import decode_array
+from agents.streaming import WindowRing
+from agents.gridForecast import GridForecaster
 
 
 # Function to determine the current energy rate based on timestamp
@@ -40,11 +42,38 @@ class DemandResponseAgent(Agent):
     class DRBehaviour(CyclicBehaviour):
         async def on_start(self):
             # Load the trained LSTM model when the agent starts
-            project_dir = os.path.dirname(os.path.dirname(__file__))
-            model_path_demand = os.path.join(project_dir, "models", "lstm_cnn_demand_predictor.keras")
-            model_path_supply = os.path.join(project_dir, "models", "lstm_cnn_supply_predictor.keras")
-            self.model_demand = tf.keras.models.load_model(model_path_demand)
-            self.model_supply = tf.keras.models.load_model(model_path_supply)
+            # Demand and supply models from the shared model server, run together with stored scalers
+            self.forecaster = await GridForecaster.load()
+            # Grid windows rebuilt from delta messages (see GRID_DELTA in agents/grid.py)
+            self.supply_ring = WindowRing()
+            self.demand_ring = WindowRing()
+            # Set from the first gap until a full window arrives; later deltas gap too and must not ask again
+            self.resync_pending = False
+
+        async def request_resync(self):
+            if self.resync_pending:
+                return
+            self.resync_pending = True
+            response = Message(to="grid@localhost")
+            response.body = json.dumps({"resync": True})
+            await self.send(response)
+            print("[DemandResponseAgent] Sequence gap in grid stream, requested full resync")
+
+        def grid_windows(self, data):
+            """Returns (supply, demand) windows from a full or delta grid message, or None on a gap."""
+            if "delta_supply" in data:
+                if not (self.supply_ring.push(data["seq"], decode_array(data["delta_supply"]))
+                        and self.demand_ring.push(data["seq"], decode_array(data["delta_demand"]))):
+                    return None
+                return self.supply_ring.window(), self.demand_ring.window()
+
+            test_sample_supply = decode_array(data["test_sample_supply"])
+            test_sample_demand = decode_array(data["test_sample_demand"])
+            if "seq" in data:
+                self.supply_ring.load(data["seq"], test_sample_supply)
+                self.demand_ring.load(data["seq"], test_sample_demand)
+                self.resync_pending = False
+            return test_sample_supply, test_sample_demand
         
         async def run(self):
             print("[DemandResponseAgent] Waiting for grid data...")
@@ -58,14 +87,20 @@ class DemandResponseAgent(Agent):
                         print("[DemandResponseAgent] No grid data received")
                     else:
                         print(f"[DemandResponseAgent] Received grid data")
-                        test_sample_supply = np.array(data["test_sample_supply"])
-                        test_sample_demand = np.array(data["test_sample_demand"])
+                        windows = self.grid_windows(data)
+                        if windows is None:
+                            await self.request_resync()
+                            return
+                        test_sample_supply, test_sample_demand = windows
 
-                        predicted_demand = self.model_demand.predict(test_sample_demand)[0][0]
-                        predicted_supply = self.model_supply.predict(test_sample_supply)[0][0]
-                        
-                        predicted_demand = predicted_demand * 4924.1 + 13673.1
-                        predicted_supply = predicted_supply * 20667
+                        # Only the first window of the tick is reported, so only it is forecast.
+                        # Served from the precomputed table / memo when possible, otherwise both models
+                        # run together off the event loop and are de-normalized in one step.
+                        forecast, source = await self.forecaster.forecast_window(
+                            test_sample_demand[0], test_sample_supply[0], data.get("position")
+                        )
+                        predicted_demand, predicted_supply = forecast
+                        print(f"[DemandResponseAgent] Forecast served from {source}")
 
                         timestamp = time.mktime(datetime.now().timetuple())
                         energy_rate = get_energy_rate(timestamp) * 10
@@ -81,7 +116,7 @@ class DemandResponseAgent(Agent):
                             "predicted_demand": float(predicted_demand),
                             "predicted_supply": float(predicted_supply),
                             "market_value" : market_value,
-                            "curtailment": curtailment,
+                            "curtailment": float(curtailment),
                             "energy_rate": energy_rate,
                             "recommended_appliance_behaviour": [
                                 "Reduce air conditioning usage", "Delay dishwasher cycle", "Limit electric heating between peak hours"
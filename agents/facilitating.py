@@ -6,8 +6,78 @@ from spade.agent import Agent
 from spade.behaviour import CyclicBehaviour
 from spade.message import Message
 
+# Upper bound on messages pulled from the mailbox in a single drain cycle
+MAX_DRAIN = 100
+
+# Log label for each sender when its message is accepted
+RECEIVED_LABELS = {
+    "prediction": "Prediction",
+    "demandresponse": "Demand response",
+    "negotiation": "Negotiation message",
+    "behavioralsegmentation": "Behavioral segmentation message",
+    "house": "House status",
+    "grid": "Grid status",
+    "gui": "GUI strategy",
+    "fleet": "Fleet status",
+}
+
+# Producers whose bodies are too large to echo in the log
+LARGE_PAYLOADS = {"grid", "fleet"}
+
+# Producers whose messages only make sense in sequence (the grid's delta stream, see GRID_DELTA
+# in agents/grid.py). Every one of their messages is forwarded in arrival order; all other
+# producers send full snapshots, so only their newest message matters.
+ORDERED_PRODUCERS = {"grid"}
+
+def time_from_now(message_timing):
+    return (datetime.now() - message_timing["time"]).total_seconds()
+
+def producer_of(msg):
+    return str(msg.sender).split("@")[0]
+
+def coalesce(messages):
+    """Drops every message superseded by a newer one from the same snapshot producer; keeps arrival order."""
+    newest = {str(msg.sender): index for index, msg in enumerate(messages)}
+    return [
+        msg for index, msg in enumerate(messages)
+        if producer_of(msg) in ORDERED_PRODUCERS or newest[str(msg.sender)] == index
+    ]
+
+class PayloadCache:
+    """Keeps each producer's raw JSON body and splices dependency bundles from it."""
+    def __init__(self):
+        self.raw = {}      # producer -> encoded body as received
+        self.bundles = {}  # dependency tuple -> (version key, encoded bundle)
+
+    @staticmethod
+    def looks_like_json(body):
+        # Cheap shape check instead of a full decode; producers always send a JSON object
+        body = body.strip()
+        return body.startswith("{") and body.endswith("}")
+
+    def store(self, producer, body):
+        self.raw[producer] = body
+
+    def bundle(self, dependencies, versions):
+        """Returns the encoded bundle for these dependencies, rebuilding it only when a version changed."""
+        dependencies = tuple(dependencies)
+        version_key = tuple(versions[dependency] for dependency in dependencies)
+        cached = self.bundles.get(dependencies)
+        if cached is not None and cached[0] == version_key:
+            return cached[1]
+        body = "{" + ", ".join(
+            f"{json.dumps(dependency)}: {self.raw.get(dependency, 'null')}" for dependency in dependencies
+        ) + "}"
+        self.bundles[dependencies] = (version_key, body)
+        return body
+
 # Define the FacilitatingAgent class as before
 class FacilitatingAgent(Agent):
+    def __init__(self, *args, drain_mailbox=True, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Pull every pending message per cycle and keep only the newest one per snapshot producer
+        self.drain_mailbox = drain_mailbox
+
     class MultiAgentHandler(CyclicBehaviour):
         async def on_start(self):
             self.dependencies = {
@@ -17,95 +87,121 @@ class FacilitatingAgent(Agent):
                 "negotiation": ["house", "prediction", "demandresponse", "gui"],
                 "behavioralsegmentation": ["house", "demandresponse"],
                 "grid" : [],
-                "house" : []
+                "house" : [],
+                "fleet" : []
+            }
+            # Forwarded when available but never waited on (the fleet simulator is optional)
+            self.optional_dependencies = {
+                "prediction": ["fleet"],
+                "behavioralsegmentation": ["fleet"]
             }
-            self.last_message = {agent: {"time": datetime.now(), "msg": None} for agent in self.dependencies}
+            self.last_message = {agent: {"time": datetime.now()} for agent in self.dependencies}
+            # Raw producer bodies are forwarded as-is, never decoded and re-encoded
+            self.payloads = PayloadCache()
+            # Version counter per producer, bumped every time a new message is accepted
+            self.versions = {agent: 0 for agent in self.dependencies}
+            # Reverse index: which consumers need to hear about an update from a producer
+            self.consumers = {agent: [] for agent in self.dependencies}
+            for agent in self.dependencies:
+                for dependency in self.bundle_dependencies(agent):
+                    self.consumers[dependency].append(agent)
+            # Consumers with at least one input newer than what they were last sent
+            self.pending = set()
+            # Pending consumers whose new input is an ordered producer's message
+            self.ordered_pending = set()
             self.startup = True
 
         async def run(self):
-            def time_from_now(message_timing):
-                return (datetime.now() - message_timing["time"]).total_seconds()
-            
             # Wait for messages from any agent
             msg = await self.receive(timeout=60)  # Timeout in seconds
             if msg:
-                sender = str(msg.sender)  # Sender's JID
-                if sender != "grid@localhost":
-                    print(f"[FacilitatingAgent] Received message from {sender}: {msg.body}")
-                else:
-                    print(f"[FacilitatingAgent] Recieved message from grid@localhost: [Data too large]")
-                # Example: Handle based on sender
-                if sender == "prediction@localhost" and time_from_now(self.last_message["prediction"]) > 5:
-                    print("[FacilitatingAgent] Prediction received.")
-                    self.last_message["prediction"]["time"] = datetime.now()
-                    self.last_message["prediction"]["msg"] = json.loads(msg.body)
-
-                elif sender == "demandresponse@localhost" and time_from_now(self.last_message["demandresponse"]) > 5:
-                    print("[FacilitatingAgent] Demand response received.")
-                    self.last_message["demandresponse"]["time"] = datetime.now()
-                    self.last_message["demandresponse"]["msg"] = json.loads(msg.body)
-
-                elif sender == "negotiation@localhost" and time_from_now(self.last_message["negotiation"]) > 5:
-                    print("[FacilitatingAgent] Negotiation message received.")
-                    self.last_message["negotiation"]["time"] = datetime.now()
-                    self.last_message["negotiation"]["msg"] = json.loads(msg.body)
-
-                elif sender == "behavioralsegmentation@localhost" and time_from_now(self.last_message["behavioralsegmentation"]) > 5:
-                    print("[FacilitatingAgent] Behavioral segmentation message received.")
-                    self.last_message["behavioralsegmentation"]["time"] = datetime.now()
-                    self.last_message["behavioralsegmentation"]["msg"] = json.loads(msg.body)
-
-                elif sender == "house@localhost" and time_from_now(self.last_message["house"]) > 5:
-                    print("[FacilitatingAgent] House status received.")
-                    self.last_message["house"]["time"] = datetime.now()
-                    self.last_message["house"]["msg"] = json.loads(msg.body)
-
-                elif sender == "grid@localhost" and time_from_now(self.last_message["grid"]) > 5:
-                    print("[FacilitatingAgent] Grid status received.")
-                    self.last_message["grid"]["time"] = datetime.now()
-                    self.last_message["grid"]["msg"] = json.loads(msg.body)
-                
-                elif sender == "gui@localhost" and time_from_now(self.last_message["gui"]) > 5:
-                    print("[FacilitatingAgent] Grid status received.")
-                    self.last_message["gui"]["time"] = datetime.now()
-                    self.last_message["gui"]["msg"] = json.loads(msg.body)
+                batch = [msg]
+                if self.agent.drain_mailbox:
+                    drained = 0
+                    while drained < MAX_DRAIN and self.mailbox_size() > 0:
+                        queued = await self.receive()  # Non-blocking when no timeout is given
+                        if queued is None:
+                            break
+                        batch.append(queued)
+                        drained += 1
+                    if drained:
+                        print(f"[FacilitatingAgent] Drained {drained} queued messages, "
+                              f"{len({str(queued.sender) for queued in batch})} distinct senders.")
 
-                else:
-                    print(f"[FacilitatingAgent] !!Timeout: {sender}!!")
+                for queued in coalesce(batch):
+                    self.handle_message(queued)
+                    if producer_of(queued) in ORDERED_PRODUCERS:
+                        # Forward it before the producer's next message replaces the stored body
+                        await self.dispatch()
 
             else:
                 print("[FacilitatingAgent] No message received.")
 
-            # Update dependencies and send responses if needed
-            for agent in self.dependencies:
-                
+            await self.dispatch()
+
+        async def dispatch(self):
+            """Sends a bundle to every pending consumer whose dependencies are all fresh."""
+            # Only consumers with a newer input version are considered for dispatch
+            for agent in [agent for agent in self.dependencies if agent in self.pending]:
+
                 unresolved_dependencies = []
                 for dependency in self.dependencies[agent]:
                     if time_from_now(self.last_message[dependency]) > 30:
                         unresolved_dependencies.append(dependency)
 
-                if len(self.dependencies[agent]) != 0:
-                    if len(unresolved_dependencies) == 0:
+                # An ordered producer's message is not held back by stale snapshot inputs: its next
+                # message would replace the stored body and leave the consumer a gap to resync from
+                if len(unresolved_dependencies) == 0 or agent in self.ordered_pending:
+                    if unresolved_dependencies:
+                        print(f"[FacilitatingAgent] Forwarding ordered update to {agent} despite stale {unresolved_dependencies}")
+                    else:
                         print(f"[FacilitatingAgent] Dependencies resolved for {agent}, sending message...")
 
-                        agent_address = f"{agent}@localhost"
-                        dict = {}
-                        for dependency in self.dependencies[agent]:
-                            dict[dependency] = self.last_message[dependency]["msg"]
-
-                        try:
-                            json_dump = json.dumps(dict)
-                            response = Message(to=agent_address, body=json_dump)
-                            await self.send(response)
-                            print(f"[FacilitatingAgent] Sent message to {agent}")
-                        except json.JSONDecodeError:
-                            print(f"[FacilitatingAgent] Invalid message format: {msg.body}")
-                    else:
-                        print(f"[FacilitatingAgent] Awaiting dependencies for agent {agent}:")
-                        for dependency in unresolved_dependencies:
-                            print(dependency)
+                    agent_address = f"{agent}@localhost"
+                    response = Message(to=agent_address, body=self.payloads.bundle(self.bundle_dependencies(agent), self.versions))
+                    await self.send(response)
+                    self.pending.discard(agent)
+                    self.ordered_pending.discard(agent)
+                    print(f"[FacilitatingAgent] Sent message to {agent}")
                 else:
-                    print(f"[FacilitatingAgent] {agent} has no dependencies.")
+                    print(f"[FacilitatingAgent] Awaiting dependencies for agent {agent}:")
+                    for dependency in unresolved_dependencies:
+                        print(dependency)
+
+        def bundle_dependencies(self, agent):
+            """Required dependencies followed by optional ones, in bundle order."""
+            return self.dependencies[agent] + self.optional_dependencies.get(agent, [])
+
+        def handle_message(self, msg):
+            """Stores an incoming message as the latest output of its sender."""
+            sender = str(msg.sender)  # Sender's JID
+            agent = sender.split("@")[0]
+            if agent not in LARGE_PAYLOADS:
+                print(f"[FacilitatingAgent] Received message from {sender}: {msg.body}")
+            else:
+                print(f"[FacilitatingAgent] Recieved message from {sender}: [Data too large]")
+
+            # The 5s per-sender throttle only applies to snapshot producers: a skipped message
+            # of an ordered stream would leave a gap the receiver has to resync from
+            known = sender == f"{agent}@localhost" and agent in self.last_message
+            if known and (agent in ORDERED_PRODUCERS or time_from_now(self.last_message[agent]) > 5):
+                if not PayloadCache.looks_like_json(msg.body):
+                    print(f"[FacilitatingAgent] Invalid message format from {sender}")
+                    return
+                print(f"[FacilitatingAgent] {RECEIVED_LABELS.get(agent, agent)} received.")
+                self.last_message[agent]["time"] = datetime.now()
+                self.payloads.store(agent, msg.body)
+                self.mark_updated(agent)
+            else:
+                print(f"[FacilitatingAgent] !!Timeout: {sender}!!")
+
+        def mark_updated(self, producer):
+            """Bumps a producer's version and queues every consumer that depends on it."""
+            self.versions[producer] += 1
+            for agent in self.consumers[producer]:
+                self.pending.add(agent)
+                if producer in ORDERED_PRODUCERS:
+                    self.ordered_pending.add(agent)
 
     async def setup(self):
         print("[FacilitatingAgent] Started")
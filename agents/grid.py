@@ -5,6 +5,13 @@ import json
 import numpy as np
 import asyncio
 import os
+from agents.codec import pack_array
+from agents.datasets import open_dataset
+
+# Delta mode: send only the newest window plus a sequence number instead of all 24 each tick
+DELTA_MODE = os.getenv("GRID_DELTA", "0") == "1"
+# Send a full window at least this often even without a resync request
+FULL_SYNC_EVERY = 96
 
 # Negotiation Agent: Facilitates peer-to-peer energy trading
 class Grid(Agent):
@@ -15,36 +22,63 @@ class Grid(Agent):
             project_dir = os.path.dirname(os.path.dirname(__file__))
             data_path_demand = os.path.join(project_dir,"models", "energy_X_test_demand_set.npz")
             data_path_supply = os.path.join(project_dir,"models", "energy_X_test_supply_set.npz")
-            data_demand = np.load(data_path_demand)
-            data_supply = np.load(data_path_supply)
+            # Memory-mapped when an exported store exists, so windows below are zero-copy slices
+            data_demand = open_dataset(data_path_demand)
+            data_supply = open_dataset(data_path_supply)
             self.X_test_supply = data_supply["X_test"]
             self.Y_test_supply = data_supply["y_test"]
             self.X_test_demand = data_demand["X_test"]
             self.Y_test_demand = data_demand["y_test"]    
+            self.seq = 0
+            self.last_full_seq = None  # None forces a full sync on the first tick
 
         async def run(self):
             await asyncio.sleep(5)
             print("[Grid] Sending Grid Demand and Supply Data")
             msg = await self.receive(timeout=5)
+            if msg:
+                # Delta receivers ask for a full window when they detect a sequence gap
+                try:
+                    if json.loads(msg.body).get("resync"):
+                        print(f"[Grid] Resync requested by {msg.sender}")
+                        self.last_full_seq = None
+                except (json.JSONDecodeError, AttributeError):
+                    print(f"[Grid] Ignoring unexpected message from {msg.sender}")
             
             test_sample_supply = self.X_test_supply[self.idx-24:self.idx]
             test_sample_demand = self.X_test_demand[self.idx-24:self.idx]
             
             actual_supply = self.Y_test_supply[self.idx]
             actual_demand = self.Y_test_demand[self.idx]
+            position = self.idx - 24  # Dataset index of the first window in this tick
             
             # Ensure index stays between 24 and the length of the array
             self.idx = (self.idx + 1) % len(self.X_test_supply)
             if self.idx < 24:
                 self.idx = 24
-            
-            response = Message(to="facilitating@localhost")
-            response.body = json.dumps({
+                # Wrapping around breaks the one-row shift between windows
+                self.last_full_seq = None
+
+            self.seq += 1
+            body = {
+                "seq": self.seq,
+                "position": position,
                 "grid_demand": actual_demand.tolist(),
-                "grid_supply": actual_supply.tolist(),
-                "test_sample_supply": test_sample_supply.tolist(),
-                "test_sample_demand": test_sample_demand.tolist()
-            })
+                "grid_supply": actual_supply.tolist()
+            }
+            send_full = (not DELTA_MODE or self.last_full_seq is None
+                         or self.seq - self.last_full_seq >= FULL_SYNC_EVERY)
+            if send_full:
+                body["test_sample_supply"] = pack_array(test_sample_supply)
+                body["test_sample_demand"] = pack_array(test_sample_demand)
+                self.last_full_seq = self.seq
+            else:
+                # Only the newest window is new, everything else shifted by one
+                body["delta_supply"] = pack_array(test_sample_supply[-1])
+                body["delta_demand"] = pack_array(test_sample_demand[-1])
+
+            response = Message(to="facilitating@localhost")
+            response.body = json.dumps(body)
             
             await self.send(response)
             print("[Grid] Sent grid demand data to FacilitatingAgent")
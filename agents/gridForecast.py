@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+import numpy as np
+from agents.datasets import open_dataset
+from agents.inference import MODEL_DIR, get_model_server
+
+DEMAND_MODEL = "lstm_cnn_demand_predictor.keras"
+SUPPLY_MODEL = "lstm_cnn_supply_predictor.keras"
+# De-normalization parameters (value * scale + offset) stored next to the model artifacts
+SCALER_FILE = "lstm_cnn_scalers.json"
+# Offline forecasts for every window of the replay datasets (built by `python -m agents.gridForecast`)
+TABLE_FILE = "grid_forecast_table.npz"
+DEMAND_DATASET = "energy_X_test_demand_set.npz"
+SUPPLY_DATASET = "energy_X_test_supply_set.npz"
+# Live windows that miss the table are memoised by content hash
+MEMO_SIZE = 1024
+
+def window_key(demand_window, supply_window):
+    """Content hash of one demand/supply window pair (float32, so list and binary messages agree)."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(demand_window, dtype=np.float32).tobytes())
+    digest.update(np.ascontiguousarray(supply_window, dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+def load_scalers(model_dir=MODEL_DIR):
+    """Returns (scale, offset) arrays ordered [demand, supply]."""
+    with open(os.path.join(model_dir, SCALER_FILE), "r") as scaler_file:
+        scalers = json.load(scaler_file)
+    scale = np.array([scalers[DEMAND_MODEL]["scale"], scalers[SUPPLY_MODEL]["scale"]], dtype=np.float64)
+    offset = np.array([scalers[DEMAND_MODEL]["offset"], scalers[SUPPLY_MODEL]["offset"]], dtype=np.float64)
+    return scale, offset
+
+class GridForecaster:
+    """
+    Runs the demand and supply LSTM-CNN models together on batches of grid windows.
+    Row r of the result is [predicted_demand, predicted_supply] for region/window r,
+    already de-normalized to MW.
+    """
+    def __init__(self, model_demand, model_supply, scale, offset, table=None):
+        self.model_demand = model_demand
+        self.model_supply = model_supply
+        self.scale = scale
+        self.offset = offset
+        self.table = table  # ForecastTable or None
+        self.memo = ForecastMemo(MEMO_SIZE)
+
+    @classmethod
+    async def load(cls, model_server=None):
+        model_server = model_server or get_model_server()
+        model_demand, model_supply = await asyncio.gather(
+            model_server.get(DEMAND_MODEL), model_server.get(SUPPLY_MODEL)
+        )
+        scale, offset = load_scalers(model_server.model_dir)
+        return cls(model_demand, model_supply, scale, offset, ForecastTable.load(model_server.model_dir))
+
+    def denormalize(self, raw):
+        return raw * self.scale + self.offset
+
+    async def predict(self, demand_windows, supply_windows):
+        """
+        :param demand_windows: (regions, 24, 8) demand feature windows
+        :param supply_windows: (regions, 24, 2) supply feature windows
+        :return: (regions, 2) array of [demand, supply]
+        """
+        # Both models run at the same time on the inference pool
+        raw_demand, raw_supply = await asyncio.gather(
+            self.model_demand.predict(demand_windows), self.model_supply.predict(supply_windows)
+        )
+        raw = np.column_stack((np.asarray(raw_demand)[:, 0], np.asarray(raw_supply)[:, 0]))
+        return self.denormalize(raw)
+
+    async def forecast_window(self, demand_window, supply_window, position=None):
+        """
+        Forecast for a single window pair, served from the precomputed table when the
+        position and content match, then from the memo, and only then by inference.
+        :return: ([demand, supply], source) where source is "table", "memo" or "model"
+        """
+        key = window_key(demand_window, supply_window)
+        if self.table is not None:
+            forecast = self.table.lookup(position, key)
+            if forecast is not None:
+                return forecast, "table"
+        forecast = self.memo.get(key)
+        if forecast is not None:
+            return forecast, "memo"
+        forecast = (await self.predict(demand_window[None], supply_window[None]))[0]
+        self.memo.put(key, forecast)
+        return forecast, "model"
+
+class ForecastMemo:
+    """Bounded LRU map from window content hash to a de-normalized forecast."""
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        forecast = self.entries.get(key)
+        if forecast is not None:
+            self.entries.move_to_end(key)
+        return forecast
+
+    def put(self, key, forecast):
+        self.entries[key] = forecast
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+class ForecastTable:
+    """Forecasts for every window of the replay datasets, indexed by dataset position."""
+    def __init__(self, keys, forecasts):
+        self.keys = keys            # (windows,) hex content hashes
+        self.forecasts = forecasts  # (windows, 2) de-normalized [demand, supply]
+
+    @classmethod
+    def load(cls, model_dir=MODEL_DIR):
+        path = os.path.join(model_dir, TABLE_FILE)
+        if not os.path.exists(path):
+            print(f"[GridForecaster] No forecast table at {path}, every window goes through the models")
+            return None
+        with np.load(path) as table:
+            print(f"[GridForecaster] Loaded forecast table with {len(table['keys'])} windows")
+            return cls(table["keys"], table["forecasts"])
+
+    def lookup(self, position, key):
+        # The stored hash guards against a table built from a different dataset
+        if position is None or not 0 <= position < len(self.keys) or self.keys[position] != key:
+            return None
+        return self.forecasts[position]
+
+async def build_forecast_table(model_dir=MODEL_DIR, batch_size=256):
+    """Runs both models once over every replay window and saves the predictions by position."""
+    demand_windows = open_dataset(os.path.join(model_dir, DEMAND_DATASET))["X_test"]
+    supply_windows = open_dataset(os.path.join(model_dir, SUPPLY_DATASET))["X_test"]
+    forecaster = await GridForecaster.load()
+    forecasts = []
+    for start in range(0, len(demand_windows), batch_size):
+        forecasts.append(await forecaster.predict(
+            np.asarray(demand_windows[start:start + batch_size]), np.asarray(supply_windows[start:start + batch_size])
+        ))
+    keys = np.array([window_key(demand, supply) for demand, supply in zip(demand_windows, supply_windows)])
+    path = os.path.join(model_dir, TABLE_FILE)
+    np.savez(path, keys=keys, forecasts=np.concatenate(forecasts))
+    print(f"[GridForecaster] Saved forecasts for {len(keys)} windows to {path}")
+
+if __name__ == "__main__":
+    # Offline build step for the forecast table used by DemandResponseAgent
+    asyncio.run(build_forecast_table())
@@ -0,0 +1,73 @@
+import os
+import sys
+import numpy as np
+from agents.numpyBackend import export_keras_model
+
+# Offline builder for PredictionAgent's multi-step forecaster. energy_lstm forecasts one step;
+# build_horizon_model keeps its LSTM stack and replaces the final Dense(2) with a Dense(2 * steps)
+# head trained on the next `steps` targets of consecutive house windows, so one forward pass
+# yields every step. Needs Keras once, offline; the agent runs the NumPy export.
+
+HORIZON_STEPS = int(os.getenv("PREDICTION_HORIZON", "6")) # Future steps the head is trained for
+HORIZON_MODEL = "energy_lstm_horizon.keras"
+HORIZON_EPOCHS = int(os.getenv("PREDICTION_HORIZON_EPOCHS", "20"))
+
+def window_shift_error(X):
+    """Largest difference between each window and the previous one shifted by a step; 0 for consecutive windows."""
+    X = np.asarray(X, dtype=np.float64).reshape(len(X), -1)
+    return float(np.max(np.abs(X[1:, :-1] - X[:-1, 1:]), initial=0.0))
+
+def horizon_targets(X, y, steps):
+    """
+    Training pairs for the head: window t and targets y[t], ..., y[t + steps - 1] flattened
+    step-major. Only valid when the rows of X are consecutive windows of one series.
+    """
+    X, y = np.asarray(X), np.asarray(y).reshape(len(X), -1)
+    if window_shift_error(X) > 1e-6:
+        raise ValueError("Windows are not consecutive steps of one series; cannot build horizon targets")
+    count = len(X) - steps + 1
+    if count < 1:
+        raise ValueError(f"Need at least {steps} windows, got {len(X)}")
+    targets = np.stack([y[step:step + count] for step in range(steps)], axis=1)
+    return X[:count], targets.reshape(count, -1)
+
+def build_horizon_model(base, steps):
+    """
+    Copy of `base` whose last Dense layer predicts `steps` steps. Every step starts from the
+    base layer's weights, so before training each step reproduces the one-step forecast;
+    the rest of the network is frozen.
+    """
+    import keras
+    model = keras.models.clone_model(base)
+    model.set_weights(base.get_weights())
+    output = model.layers[-1]
+    kernel, bias = output.get_weights()
+    model.pop()
+    for layer in model.layers:
+        layer.trainable = False
+    head = keras.layers.Dense(steps * kernel.shape[1], activation=output.get_config()["activation"])
+    model.add(head)
+    head.set_weights([np.tile(kernel, (1, steps)), np.tile(bias, steps)])
+    model.compile(optimizer="adam", loss="mean_squared_error")
+    return model
+
+def train_horizon_model(base_path, data_path, steps=HORIZON_STEPS, out_path=None, epochs=HORIZON_EPOCHS):
+    """Trains the head on the dataset's X_test/y_test, saves the .keras model and its NumPy export."""
+    import keras
+    out_path = out_path or os.path.join(os.path.dirname(base_path), HORIZON_MODEL)
+    with np.load(data_path) as data:
+        X, targets = horizon_targets(data["X_test"], data["y_test"], steps)
+    base = keras.models.load_model(base_path)
+    model = build_horizon_model(base, steps)
+    X = X.reshape(len(X), *base.input_shape[1:])
+    model.fit(X, targets, epochs=epochs, batch_size=32, validation_split=0.2, verbose=0)
+    error = float(np.mean((model.predict(X, verbose=0) - targets) ** 2))
+    model.save(out_path)
+    print(f"[HorizonHead] Trained {steps}-step head on {len(X)} windows -> {out_path} (mse {error:.4f})")
+    export_keras_model(out_path)
+    return out_path
+
+if __name__ == "__main__":
+    # Usage: python -m agents.horizonHead models/energy_lstm.keras models/energy_test_set.npz [steps]
+    base_path, data_path = sys.argv[1:3]
+    train_horizon_model(base_path, data_path, int(sys.argv[3]) if len(sys.argv) > 3 else HORIZON_STEPS)
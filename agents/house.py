@@ -7,6 +7,8 @@ import asyncio
 import numpy as np
 import random
 import math
+from agents.codec import pack_array
+from agents.datasets import open_dataset
 
 # Function to create pretend temperature
 def temperature_model(time_step: int):
@@ -30,6 +32,26 @@ def temperature_model(time_step: int):
 def holiday_model(time_step: int):
     return time_step % 4
 
+# Vectorized versions of the models above, one value per house
+def temperature_model_batch(time_steps: np.ndarray, rng: np.random.Generator):
+    """
+    Same day/night cycle as temperature_model for an array of time steps.
+    :param time_steps: Integer array with one time step per house
+    :param rng: NumPy random generator used for the per-house noise
+    :return: Array of simulated temperature values.
+    """
+    base_temp = 20
+    amplitude = 10
+    period = 24
+    temp_variation = amplitude * np.sin((2 * np.pi * time_steps) / period)
+    noise = rng.uniform(-2, 2, size=time_steps.shape)
+    return base_temp + temp_variation + noise
+
+def holiday_model_batch(time_steps: np.ndarray):
+    return time_steps % 4
+
+APPLIANCES = ["Blender", "Game System", "TV", "Heater", "Washing Machine"]
+
 # Negotiation Agent: Facilitates peer-to-peer energy trading
 class House(Agent):
     class HouseStatus(CyclicBehaviour):
@@ -37,7 +59,7 @@ class House(Agent):
             self.idx = 0
             project_dir = os.path.dirname(os.path.dirname(__file__))
             data_path = os.path.join(project_dir,"models", "energy_test_set.npz")
-            data = np.load(data_path)
+            data = open_dataset(data_path)  # Memory-mapped store if exported, else the .npz
             self.X_test = data["X_test"]
             self.Y_test = data["y_test"]
 
@@ -65,7 +87,7 @@ class House(Agent):
                     "current_production": current_production,
                     "temperature" : temperature,
                     "holiday" : holiday,
-                    "test_sample": test_sample.tolist(),  # Convert NumPy array to a Python list
+                    "test_sample": pack_array(test_sample),  # List or base64 buffer, see agents/codec.py
                     "appliances": [
                         {"item": "Blender", 
                          "duration":random.randint(0, 200), 
@@ -91,3 +113,65 @@ class House(Agent):
         print("[House] Started")
         self.add_behaviour(self.HouseStatus())
         self.web.start(hostname="localhost", port="9091")
+
+# Fleet mode: simulates many homes per tick as NumPy arrays and publishes them in one message
+class HouseFleet(Agent):
+    def __init__(self, jid, password, size=100, seed=None):
+        super().__init__(jid, password)
+        self.size = size
+        self.seed = seed
+
+    class FleetStatus(CyclicBehaviour):
+        async def on_start(self):
+            self.tick = 0
+            self.rng = np.random.default_rng(self.agent.seed)
+            project_dir = os.path.dirname(os.path.dirname(__file__))
+            data_path = os.path.join(project_dir,"models", "energy_test_set.npz")
+            data = open_dataset(data_path)
+            self.X_test = data["X_test"]
+            self.Y_test = data["y_test"]
+            # Each house replays the dataset from its own offset so homes are not in lockstep
+            self.house_ids = [f"house{i}" for i in range(self.agent.size)]
+            self.offsets = self.rng.integers(0, len(self.X_test), size=self.agent.size)
+
+        async def run(self):
+            await asyncio.sleep(5)
+            print(f"[HouseFleet] Sending data for {len(self.house_ids)} houses...")
+            msg = await self.receive(timeout=5)
+
+            rows = (self.offsets + self.tick) % len(self.X_test)
+            test_samples = self.X_test[rows].reshape(len(rows), self.X_test.shape[1], 1)
+            actual_values = self.Y_test[rows]
+
+            current_production = actual_values[:, 0]
+            current_demand = actual_values[:, 1]
+
+            temperature = temperature_model_batch(rows, self.rng)
+            holiday = holiday_model_batch(rows)
+            durations = self.rng.integers(0, 201, size=(len(rows), len(APPLIANCES)))
+            power_per_device = np.repeat((current_demand / len(APPLIANCES))[:, None], len(APPLIANCES), axis=1)
+
+            self.tick += 1
+
+            # Columnar layout: row i of every array belongs to house_ids[i]
+            response = Message(to="facilitating@localhost")
+            response.body = json.dumps({
+                    "house_ids": self.house_ids,
+                    "current_demand": pack_array(current_demand),
+                    "current_production": pack_array(current_production),
+                    "temperature": pack_array(temperature),
+                    "holiday": pack_array(holiday),
+                    "test_sample": pack_array(test_samples),
+                    "appliances": {
+                        "item": APPLIANCES,
+                        "duration": pack_array(durations),
+                        "power_consumption": pack_array(power_per_device)
+                    }
+                })
+            await self.send(response)
+            print(f"[HouseFleet] Sent fleet data to FacilitatingAgent ({len(response.body)} bytes)")
+
+    async def setup(self):
+        print(f"[HouseFleet] Started with {self.size} houses")
+        self.add_behaviour(self.FleetStatus())
+        self.web.start(hostname="localhost", port="9097")
@@ -0,0 +1,288 @@
+import asyncio
+import functools
+import importlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from agents.numpyBackend import NumpySequential, exported_path
+from agents.treeEnsemble import TreeEnsemble
+
+# Threads shared by every agent in the process for model loading and predict calls.
+# TensorFlow and LightGBM release the GIL inside their kernels, so the asyncio loop
+# (and every other SPADE behaviour on it) keeps running while a model computes.
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+
+_EXECUTOR = None
+
+def get_executor():
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="inference")
+    return _EXECUTOR
+
+async def run_inference(fn, *args, **kwargs):
+    """Runs a blocking model call on the shared inference pool and awaits its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(fn, *args, **kwargs))
+
+# --- Shared model server ---
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+# TensorFlow thread pools, pinned once for every model in the process
+INTRA_OP_THREADS = int(os.getenv("MODEL_INTRA_OP_THREADS", "2"))
+INTER_OP_THREADS = int(os.getenv("MODEL_INTER_OP_THREADS", "1"))
+# Print the per-model report after this many predict calls across all models (0 disables)
+REPORT_EVERY = int(os.getenv("MODEL_REPORT_EVERY", "100"))
+# "keras" runs .keras models through TensorFlow and .pkl models through joblib; "numpy" uses the
+# exported <name>.numpy.npz files (agents/numpyBackend.py, agents/treeEnsemble.py) and imports neither
+# TensorFlow nor LightGBM
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "keras")
+
+def resident_memory_bytes():
+    """Current resident set size on Linux, None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+class ModelHandle:
+    """A loaded model shared between agents, with latency bookkeeping."""
+    def __init__(self, server, name, model, weight_bytes, rss_delta_bytes, backend):
+        self.server = server
+        self.name = name
+        self.model = model
+        self.backend = backend
+        self.weight_bytes = weight_bytes
+        self.rss_delta_bytes = rss_delta_bytes
+        self.calls = 0
+        self.samples = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def predict_sync(self, inputs):
+        """Blocking predict; call from the inference pool (run_inference / MicroBatcher)."""
+        start = time.perf_counter()
+        if self.backend == "keras":
+            outputs = self.model.predict(inputs, verbose=0)
+        else:
+            outputs = self.model.predict(inputs)
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.calls += 1
+            self.samples += len(inputs)
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+        self.server.record_call()
+        return outputs
+
+    async def predict(self, inputs):
+        return await run_inference(self.predict_sync, inputs)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "backend": self.backend,
+                "weight_bytes": self.weight_bytes,
+                "rss_delta_bytes": self.rss_delta_bytes,
+                "calls": self.calls,
+                "samples": self.samples,
+                "mean_latency_ms": 1000 * self.total_seconds / self.calls if self.calls else None,
+                "max_latency_ms": 1000 * self.max_seconds
+            }
+
+class ModelServer:
+    """
+    Loads each model artifact in models/ once per process and hands out shared
+    handles, so agents living in the same process do not hold duplicate copies.
+    """
+    def __init__(self, model_dir=MODEL_DIR):
+        self.model_dir = model_dir
+        self.handles = {}
+        self.loading = {}  # name -> task, so concurrent requests share one load
+        self.load_lock = threading.Lock()  # Serializes loads so RSS deltas are attributable
+        self.stats_lock = threading.Lock()  # Call counter only; never held across a load
+        self.threads_configured = False
+        self.runtime_rss_bytes = {}  # Backend runtime -> RSS growth from importing it
+        self.total_calls = 0
+
+    async def get(self, name):
+        """Returns the handle for models/<name>, loading it on first use."""
+        if name in self.handles:
+            return self.handles[name]
+        if name not in self.loading:
+            self.loading[name] = asyncio.ensure_future(run_inference(self.load, name))
+        try:
+            return await self.loading[name]
+        finally:
+            self.loading.pop(name, None)
+
+    def import_runtime(self, runtime, *modules):
+        """Imports a backend's runtime once, recording its memory apart from any model's."""
+        if runtime not in self.runtime_rss_bytes:
+            rss_before = resident_memory_bytes()
+            for module in modules:
+                importlib.import_module(module)
+            rss_after = resident_memory_bytes()
+            self.runtime_rss_bytes[runtime] = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+            if self.runtime_rss_bytes[runtime] is not None:
+                print(f"[ModelServer] {runtime} runtime loaded ({self.runtime_rss_bytes[runtime] / 2**20:.1f} MiB)")
+
+    def configure_threads(self):
+        self.import_runtime("TensorFlow", "tensorflow")
+        import tensorflow as tf
+        if self.threads_configured:
+            return tf
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(INTRA_OP_THREADS)
+            tf.config.threading.set_inter_op_parallelism_threads(INTER_OP_THREADS)
+        except RuntimeError as e:
+            # Only possible before TensorFlow initializes its runtime
+            print(f"[ModelServer] Could not pin TensorFlow thread pools: {e}")
+        self.threads_configured = True
+        return tf
+
+    def load(self, name):
+        with self.load_lock:
+            if name in self.handles:
+                return self.handles[name]
+            path = os.path.join(self.model_dir, name)
+            numpy_export = INFERENCE_BACKEND == "numpy" and os.path.exists(exported_path(path))
+            # Runtimes are imported (and measured) before the baseline, so rss_at_load is the model's own
+            if not numpy_export and name.endswith(".keras"):
+                tf = self.configure_threads()
+            elif not numpy_export:
+                # Unpickling the ranker imports LightGBM
+                self.import_runtime("LightGBM", "joblib", "lightgbm")
+            rss_before = resident_memory_bytes()
+            if numpy_export:
+                # LSTM exports run on NumpySequential, the LightGBM ranker on TreeEnsemble
+                model = (NumpySequential if name.endswith(".keras") else TreeEnsemble).load(exported_path(path))
+                weight_bytes = int(sum(weight.nbytes for layer in model.weights for weight in layer))
+                backend = "numpy"
+            elif name.endswith(".keras"):
+                if INFERENCE_BACKEND == "numpy":
+                    print(f"[ModelServer] No NumPy export for {name}, falling back to Keras "
+                          f"(run 'python -m agents.numpyBackend --verify {path}')")
+                model = tf.keras.models.load_model(path)
+                weight_bytes = int(sum(np.asarray(weight).nbytes for weight in model.get_weights()))
+                backend = "keras"
+            else:
+                if INFERENCE_BACKEND == "numpy":
+                    print(f"[ModelServer] No NumPy export for {name}, falling back to joblib "
+                          f"(run 'python -m agents.treeEnsemble --verify {path}')")
+                import joblib
+                model = joblib.load(path)
+                weight_bytes = os.path.getsize(path)
+                backend = "joblib"
+            rss_after = resident_memory_bytes()
+            rss_delta = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+            handle = ModelHandle(self, name, model, weight_bytes, rss_delta, backend)
+            self.handles[name] = handle
+            print(f"[ModelServer] Loaded {name} with the {backend} backend ({weight_bytes / 1024:.0f} KiB of weights)")
+            return handle
+
+    def record_call(self):
+        with self.stats_lock:
+            self.total_calls += 1
+            due = REPORT_EVERY and self.total_calls % REPORT_EVERY == 0
+        if due:
+            self.log_report()
+
+    def report(self):
+        return {name: handle.stats() for name, handle in self.handles.items()}
+
+    def log_report(self):
+        for runtime, rss_bytes in self.runtime_rss_bytes.items():
+            if rss_bytes is not None:
+                print(f"[ModelServer] {runtime} runtime: rss_at_import={rss_bytes / 2**20:.1f} MiB")
+        for name, stats in self.report().items():
+            mean = f"{stats['mean_latency_ms']:.2f}" if stats["mean_latency_ms"] is not None else "-"
+            rss = f"{stats['rss_delta_bytes'] / 2**20:.1f} MiB" if stats["rss_delta_bytes"] is not None else "n/a"
+            print(f"[ModelServer] {name}: weights={stats['weight_bytes'] / 2**20:.2f} MiB, rss_at_load={rss}, "
+                  f"calls={stats['calls']}, samples={stats['samples']}, mean={mean} ms, max={stats['max_latency_ms']:.2f} ms")
+
+_SERVER = None
+
+def get_model_server():
+    """The process-wide model server shared by every agent."""
+    global _SERVER
+    if _SERVER is None:
+        _SERVER = ModelServer()
+    return _SERVER
+
+class MicroBatcher:
+    """
+    Collects prediction requests and runs them through the model in one forward pass.
+    A caller handing over all of its rows at once (predict_many) is flushed on the next
+    event-loop iteration, together with whatever other callers queued in the meantime.
+    Single samples (submit) wait up to max_wait seconds for company. A batch is also
+    flushed as soon as it reaches max_batch_size.
+    """
+    def __init__(self, predict_fn, max_batch_size=64, max_wait=0.05):
+        self.predict_fn = predict_fn  # Takes a stacked (batch, ...) array, returns one row per sample
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = []  # (sample, future) pairs waiting for the next flush
+        self.flush_handle = None
+        self.flush_soon = False  # Whether flush_handle already fires on the next iteration
+        self.running = set()  # Batch tasks in flight; the loop only keeps weak references to tasks
+
+    def enqueue(self, sample):
+        future = asyncio.get_running_loop().create_future()
+        self.queue.append((sample, future))
+        if len(self.queue) >= self.max_batch_size:
+            self.flush()
+        return future
+
+    def schedule_flush(self, soon):
+        if not self.queue or self.flush_soon or (self.flush_handle is not None and not soon):
+            return  # A flush at least this early is already scheduled
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+        loop = asyncio.get_running_loop()
+        self.flush_handle = loop.call_soon(self.flush) if soon else loop.call_later(self.max_wait, self.flush)
+        self.flush_soon = soon
+
+    async def submit(self, sample):
+        """Queues one sample and waits for its row of the batched prediction."""
+        future = self.enqueue(sample)
+        self.schedule_flush(soon=False)
+        return await future
+
+    async def predict_many(self, samples):
+        """Queues a caller's complete set of samples and waits for their rows, in order."""
+        futures = [self.enqueue(sample) for sample in samples]
+        # Nothing more is coming from this caller, so waiting out max_wait would only add latency
+        self.schedule_flush(soon=True)
+        return await asyncio.gather(*futures)
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+            self.flush_soon = False
+        batch, self.queue = self.queue, []
+        if batch:
+            task = asyncio.ensure_future(self.run_batch(batch))
+            self.running.add(task)
+            task.add_done_callback(self.batch_done)
+
+    def batch_done(self, task):
+        self.running.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[MicroBatcher] Batch of predictions failed: {task.exception()!r}")
+
+    async def run_batch(self, batch):
+        try:
+            outputs = await run_inference(self.predict_fn, np.stack([sample for sample, _ in batch]))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), output in zip(batch, outputs):
+            if not future.done():
+                future.set_result(output)
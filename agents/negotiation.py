@@ -3,7 +3,9 @@ from spade.behaviour import CyclicBehaviour
 from spade.behaviour import PeriodicBehaviour
 from spade.template import Template
 from spade.message import Message
-from web3 import Web3
+from agents.chain import connect_async
+from agents.auctionState import start_mirror_async, auction_args, ZERO_ADDRESS, has_function, create_sealed_bid
+from agents.transactions import AsyncTransactionManager
 import json
 import os
 from dotenv import load_dotenv # pip install python-dotenv
@@ -15,6 +17,9 @@ from datetime import datetime, timedelta
 # --- Database Configuration ---
 DB_NAME = "energy_data.db" # Use the same DB name
 SUMMARY_LOG_INTERVAL = 45 # Log summary every 45 seconds
+# Seconds after biddingEnd / revealEnd before the reveal / close transaction is sent. The contract
+# accepts them once block.timestamp >= the deadline, so this only covers clock skew with Ganache
+PHASE_MARGIN = float(os.getenv("PHASE_MARGIN", "0.5"))
 
 # --- Helper Function for DB Logging ---
 def log_blockchain_event(db_name, timestamp, agent_account, event_type, energy_kwh, price_eth, balance_eth, counterparty=None, status="Success", auction_id=None):
@@ -104,14 +109,15 @@ class NegotiationAgent(Agent):
             initialize_trade_summary_table(self.db_name) # Create the trade summary table
             # --- End Database Init ---
 
-            # Connect to local blockchain (Ganache)
-            self.web3 = Web3(Web3.HTTPProvider("http://127.0.0.1:8545"))
-            if not self.web3.is_connected():
+            # Connect to local blockchain (Ganache) with an async client, so RPC round trips
+            # never block the event loop the other agents run on
+            self.web3, self.rpc_session = await connect_async()
+            if not await self.web3.is_connected():
                  print("[NegotiationAgent] ERROR: Failed to connect to the blockchain")
                  # Optionally stop the agent or handle the error robustly
                  await self.agent.stop()
                  return
-            print(f"[NegotiationAgent] Ganache connected: {self.web3.is_connected()}")
+            print("[NegotiationAgent] Ganache connected: True")
 
 
             # Load environment variables from the .env file
@@ -130,7 +136,7 @@ class NegotiationAgent(Agent):
 
             # Ensure the contract is deployed
             try:
-                code = self.web3.eth.get_code(contract_address)
+                code = await self.web3.eth.get_code(contract_address)
                 if code == b'0x' or code == b'':
                      print(f"[NegotiationAgent] ERROR: Contract address {contract_address} is invalid or contract not deployed.")
                      await self.agent.stop()
@@ -141,8 +147,10 @@ class NegotiationAgent(Agent):
                  return
 
 
-            # Load the contract ABI dynamically
-            contract_path = os.path.join(project_dir, "blockchain", "build", "contracts", "EnergyVickreyAuction.json")
+            # Load the contract ABI dynamically (CONTRACT_NAME is written by the migration, e.g.
+            # EnergyVickreyAuctionPull for withdraw refunds or EnergyVickreyAuctionMulti for auction IDs)
+            contract_name = os.getenv("CONTRACT_NAME", "EnergyVickreyAuction")
+            contract_path = os.path.join(project_dir, "blockchain", "build", "contracts", f"{contract_name}.json")
             if not os.path.exists(contract_path):
                 print(f"[NegotiationAgent] ERROR: Contract ABI file not found at {contract_path}")
                 await self.agent.stop()
@@ -167,9 +175,14 @@ class NegotiationAgent(Agent):
 
             # Initialize the contract
             self.auction_contract = self.web3.eth.contract(address=contract_address, abi=contract_abi)
+            # Auction state is read from a local mirror that follows the contract's events. On the
+            # multi-auction contract it holds every open auction; auction IDs are None otherwise
+            self.auction = await start_mirror_async(self.web3, self.auction_contract)
+            # Assigns nonces locally and tracks receipts, so submitting never waits on mining
+            self.transactions = AsyncTransactionManager(self.web3)
 
             # Define bidder accounts (from Ganache)
-            self.accounts = self.web3.eth.accounts
+            self.accounts = await self.web3.eth.accounts
             if not self.accounts:
                  print("[NegotiationAgent] ERROR: No accounts found in Ganache. Is it running?")
                  await self.agent.stop()
@@ -179,16 +192,35 @@ class NegotiationAgent(Agent):
 
             self.bid_amount = 0 # In Wei for contract calls
             self.nonce = "mainhouse" # Make sure this nonce is unique if multiple bidders use same value
+            self.open_bids = {} # auction ID -> (bid amount in Wei, biddingEnd of its round), until revealed
+
+            # Reveal and close run on each auction's own deadlines, independent of incoming messages
+            self.phase_tasks = {} # (auction ID, biddingEnd) -> run_phases task
+            self.scheduler = asyncio.ensure_future(self.schedule_phases())
 
             # --- Initial Balance Log ---
             await self.log_current_balance("Init")
             # --- End Initial Balance Log ---
 
+        async def on_end(self):
+            if getattr(self, "scheduler", None) is not None:
+                self.scheduler.cancel()
+                for task in self.phase_tasks.values():
+                    task.cancel()
+            if getattr(self, "auction", None) is not None:
+                self.auction.stop()
+            session = getattr(self, "rpc_session", None)
+            if session is not None:
+                await session.close()
+
+        async def balance_eth(self):
+            """Current balance of this agent's account in ETH."""
+            return float(self.web3.from_wei(await self.web3.eth.get_balance(self.account), "ether"))
 
         async def log_current_balance(self, event_suffix="Update"):
             """Queries and logs the agent's current ETH balance."""
             try:
-                balance_wei = self.web3.eth.get_balance(self.account)
+                balance_wei = await self.web3.eth.get_balance(self.account)
                 balance_eth = self.web3.from_wei(balance_wei, "ether")
                 log_blockchain_event(
                     db_name=self.db_name,
@@ -221,21 +253,34 @@ class NegotiationAgent(Agent):
         def set_bid_amount(self, price_wei): # Expect Wei
             self.bid_amount = price_wei
 
-        async def create_sealed_bid(self, value_wei, nonce): # Expect Wei
-            # Change to match contract's keccak256(abi.encodePacked()) format
-            encoded = Web3.solidity_keccak(['uint256', 'string'], [value_wei, nonce])
-            return encoded
-
-        async def get_auction_timings(self):
-            # Add error handling
-            try:
-                bidding_start = self.auction_contract.functions.biddingStart().call()
-                reveal_start = self.auction_contract.functions.biddingEnd().call() # This is biddingEnd in contract
-                reveal_end = self.auction_contract.functions.revealEnd().call()
-                return bidding_start, reveal_start, reveal_end
-            except Exception as e:
-                print(f"[NegotiationAgent] Error getting auction timings: {e}")
-                return 0, 0, 0 # Return defaults indicating no active auction / error
+        async def get_auction_timings(self, auction_id=None):
+            # Served from the event mirror, no RPC; reveal start is biddingEnd in the contract
+            return self.timings_of(auction_id)
+
+        def timings_of(self, auction_id):
+            auction = self.auction.auction(auction_id)
+            return auction.timings() if auction is not None else (0, 0, 0)
+
+        def biddable_auctions(self):
+            """IDs of auctions in their bidding phase that this agent has not bid in, closing soonest first."""
+            now = time.time()
+            auction_ids = []
+            for auction_id in self.auction.open_auction_ids():
+                auction = self.auction.auction(auction_id)
+                if not auction.bidding_start <= now < auction.bidding_end:
+                    continue
+                if self.open_bids.get(auction_id, (0, None))[1] == auction.bidding_end:
+                    continue # Already bid in this round
+                if self.auction.concurrent and auction.seller == self.account:
+                    continue # Our own auction
+                auction_ids.append(auction_id)
+            return sorted(auction_ids, key=lambda auction_id: self.auction.auction(auction_id).bidding_end)
+
+        def can_start_auction(self):
+            """Single-auction contract: nothing running. Multi-auction: none of our own still open."""
+            if not self.auction.concurrent:
+                return self.auction.bidding_start == 0
+            return all(self.auction.auction(auction_id).seller != self.account for auction_id in self.auction.open_auction_ids())
 
         async def wait_until(self, target_timestamp):
             # Simplified wait logic
@@ -259,11 +304,10 @@ class NegotiationAgent(Agent):
             print(f"[NegotiationAgent] Attempting to start auction for {energy_amount_kwh} kWh...")
             # It seems your contract takes energy amount directly? Assuming it does.
             # If it expects Wei value instead, you'll need conversion logic.
+            auction_id = None
             try:
-                # Check if an auction is already running (based on biddingStart time)
-                current_bidding_start, _, current_reveal_end = await self.get_auction_timings()
-                now = time.time()
-                if current_bidding_start != 0 and now < current_reveal_end:
+                # Check if an auction is already running (ours, on the multi-auction contract)
+                if not self.can_start_auction():
                      print("[NegotiationAgent] Cannot start new auction, another is in progress.")
                      # Maybe log this state?
                      return # Don't start if one is active
@@ -272,13 +316,17 @@ class NegotiationAgent(Agent):
                 # Convert energy_amount_kwh to the unit expected by the contract if necessary
                 contract_energy_unit = int(energy_amount_kwh) # Assuming contract takes integer kWh for now
 
-                tx = self.auction_contract.functions.startAuction(contract_energy_unit).transact({
+                receipt = await self.transactions.transact(self.auction_contract.functions.startAuction(contract_energy_unit), {
                     'from': self.account,
                     'gas': 3000000,
                     'gasPrice': self.web3.to_wei('20', 'gwei') # Adjust gas as needed
                 })
-                receipt = self.web3.eth.wait_for_transaction_receipt(tx)
-                print(f"[NegotiationAgent] Auction started successfully! Tx: {receipt.transactionHash.hex()}")
+                if self.auction.concurrent:
+                    auction_id = self.auction_contract.events.AuctionStarted().process_receipt(receipt)[0]["args"]["auctionId"]
+                    print(f"[NegotiationAgent] Auction #{auction_id} started successfully! Tx: {receipt.transactionHash.hex()}")
+                    self.track(auction_id)
+                else:
+                    print(f"[NegotiationAgent] Auction started successfully! Tx: {receipt.transactionHash.hex()}")
 
                 # Log Auction Start event
                 await self.log_current_balance("Post-AuctionStart") # Log balance after TX cost
@@ -289,9 +337,10 @@ class NegotiationAgent(Agent):
                     event_type="Auction Start",
                     energy_kwh=energy_amount_kwh,
                     price_eth=None,
-                    balance_eth=float(self.web3.from_wei(self.web3.eth.get_balance(self.account), "ether")),
+                    balance_eth=await self.balance_eth(),
                     counterparty=None,
-                    status="Success"
+                    status="Success",
+                    auction_id=auction_id
                 )
                 return True # Indicate success
 
@@ -306,24 +355,25 @@ class NegotiationAgent(Agent):
                     event_type="Auction Start",
                     energy_kwh=energy_amount_kwh,
                     price_eth=None,
-                    balance_eth=float(self.web3.from_wei(self.web3.eth.get_balance(self.account), "ether")), # Log balance even on fail
+                    balance_eth=await self.balance_eth(), # Log balance even on fail
                     status="Failed"
                 )
                 return False # Indicate failure
 
 
-        async def bid(self, price_wei): # Expect Wei
+        async def bid(self, price_wei, auction_id=None): # Expect Wei
             self.set_bid_amount(price_wei) # Store the bid amount (in Wei)
             print(f"[NegotiationAgent] Attempting to bid {self.web3.from_wei(price_wei, 'ether')} ETH...")
             try:
-                sealed_bid = await self.create_sealed_bid(self.bid_amount, self.nonce)
-                tx = self.auction_contract.functions.bid(sealed_bid).transact({
+                sealed_bid = create_sealed_bid(self.bid_amount, self.nonce)
+                receipt = await self.transactions.transact(self.auction_contract.functions.bid(*auction_args(auction_id), sealed_bid), {
                     "from": self.account,
                     "value": self.bid_amount, # The actual value sent with the bid (for deposit)
                     "gas": 3000000 # Adjust gas
                 })
-                receipt = self.web3.eth.wait_for_transaction_receipt(tx)
                 print(f"[NegotiationAgent] Bid placed successfully by {self.account}. Tx: {receipt.transactionHash.hex()}")
+                self.open_bids[auction_id] = (self.bid_amount, self.timings_of(auction_id)[1])
+                self.track(auction_id)
 
                 # Log Bid event (balance will decrease due to gas + value sent)
                 await self.log_current_balance("Post-Bid")
@@ -334,8 +384,9 @@ class NegotiationAgent(Agent):
                     event_type="Bid",
                     energy_kwh=None, # Energy amount not relevant for bid itself
                     price_eth=float(self.web3.from_wei(self.bid_amount, "ether")), # Log the bid price
-                    balance_eth=float(self.web3.from_wei(self.web3.eth.get_balance(self.account), "ether")),
-                    status="Success"
+                    balance_eth=await self.balance_eth(),
+                    status="Success",
+                    auction_id=auction_id
                 )
 
             except Exception as e:
@@ -349,19 +400,20 @@ class NegotiationAgent(Agent):
                     event_type="Bid",
                     energy_kwh=None,
                     price_eth=float(self.web3.from_wei(self.bid_amount, "ether")),
-                    balance_eth=float(self.web3.from_wei(self.web3.eth.get_balance(self.account), "ether")),
-                    status="Failed"
+                    balance_eth=await self.balance_eth(),
+                    status="Failed",
+                    auction_id=auction_id
                 )
 
 
-        async def reveal(self):
-            print(f"[NegotiationAgent] Attempting to reveal bid: {self.web3.from_wei(self.bid_amount, 'ether')} ETH, Nonce: {self.nonce}")
+        async def reveal(self, auction_id=None):
+            bid_amount, _ = self.open_bids[auction_id]
+            print(f"[NegotiationAgent] Attempting to reveal bid: {self.web3.from_wei(bid_amount, 'ether')} ETH, Nonce: {self.nonce}")
             try:
-                tx = self.auction_contract.functions.reveal(self.bid_amount, self.nonce).transact({
+                receipt = await self.transactions.transact(self.auction_contract.functions.reveal(*auction_args(auction_id), bid_amount, self.nonce), {
                     'from': self.account,
                     "gas": 3000000 # Adjust gas
                 })
-                receipt = self.web3.eth.wait_for_transaction_receipt(tx)
                 print(f"[NegotiationAgent] Bid revealed successfully by {self.account}! Tx: {receipt.transactionHash.hex()}")
 
                 # Log Reveal event (balance changes due to gas, maybe refund if overbid?)
@@ -372,10 +424,12 @@ class NegotiationAgent(Agent):
                     agent_account=self.account,
                     event_type="Reveal",
                     energy_kwh=None,
-                    price_eth=float(self.web3.from_wei(self.bid_amount, "ether")), # Log revealed amount
-                    balance_eth=float(self.web3.from_wei(self.web3.eth.get_balance(self.account), "ether")),
-                    status="Success"
+                    price_eth=float(self.web3.from_wei(bid_amount, "ether")), # Log revealed amount
+                    balance_eth=await self.balance_eth(),
+                    status="Success",
+                    auction_id=auction_id
                 )
+                return True
 
             except Exception as e:
                 print(f"[NegotiationAgent] Failed to reveal bid for {self.account}: {e}")
@@ -387,30 +441,66 @@ class NegotiationAgent(Agent):
                     agent_account=self.account,
                     event_type="Reveal",
                     energy_kwh=None,
-                    price_eth=float(self.web3.from_wei(self.bid_amount, "ether")),
-                    balance_eth=float(self.web3.from_wei(self.web3.eth.get_balance(self.account), "ether")),
-                    status="Failed"
+                    price_eth=float(self.web3.from_wei(bid_amount, "ether")),
+                    balance_eth=await self.balance_eth(),
+                    status="Failed",
+                    auction_id=auction_id
+                )
+                return False
+
+        async def claim_refunds(self, auction_id=None):
+            """
+            Withdraws refunds and seller proceeds owed to this account. Only contracts with
+            pull-based refunds (withdraw()) need this; the original contract pays out in closeAuction.
+            """
+            unrevealed = self.open_bids.pop(auction_id, None)
+            if not has_function(self.auction_contract, "withdraw"):
+                return
+            try:
+                if unrevealed is not None and has_function(self.auction_contract, "reclaim"):
+                    # Multi-auction deposits of unrevealed bids have to be released per auction
+                    await self.transactions.transact(self.auction_contract.functions.reclaim(auction_id, self.account), {
+                        "from": self.account,
+                        "gas": 3000000
+                    })
+                amount_wei = await self.auction_contract.functions.refundableAmount(self.account).call()
+                if amount_wei == 0:
+                    return
+                receipt = await self.transactions.transact(self.auction_contract.functions.withdraw(), {
+                    "from": self.account,
+                    "gas": 3000000
+                })
+                print(f"[NegotiationAgent] Withdrew {self.web3.from_wei(amount_wei, 'ether')} ETH. Tx: {receipt.transactionHash.hex()}")
+                log_blockchain_event(
+                    db_name=self.db_name,
+                    timestamp=time.time(),
+                    agent_account=self.account,
+                    event_type="Refund",
+                    energy_kwh=None,
+                    price_eth=float(self.web3.from_wei(amount_wei, "ether")),
+                    balance_eth=await self.balance_eth(),
+                    status="Success",
+                    auction_id=auction_id
                 )
+            except Exception as e:
+                print(f"[NegotiationAgent] Failed to withdraw refund for {self.account}: {e}")
 
-        async def close(self):
+        async def close(self, auction_id=None):
             # Close the auction and log the outcome
             print("[NegotiationAgent] Attempting to close auction...")
             try:
-                tx = self.auction_contract.functions.closeAuction().transact({
+                receipt = await self.transactions.transact(self.auction_contract.functions.closeAuction(*auction_args(auction_id)), {
                     "from": self.account, # Usually only auctioneer or anyone can close? Check contract logic.
                     "gas": 3000000 # Adjust gas
                 })
-                receipt = self.web3.eth.wait_for_transaction_receipt(tx)
                 print(f"[NegotiationAgent] closeAuction transaction successful. Tx: {receipt.transactionHash.hex()}")
 
-                # --- Query Results AFTER closing ---
-                # It might take a block for state changes like winner/price to finalize
-                await asyncio.sleep(2) # Small delay to allow state update
-
-                winner = self.auction_contract.functions.highestBidder().call()
-                final_price_wei = self.auction_contract.functions.secondHighestBid().call() # Vickrey price
+                # --- Results from the AuctionClosed event ---
+                closed = lambda mirror: mirror.auction(auction_id) is not None and mirror.auction(auction_id).winner is not None
+                if not await self.auction.wait_for(closed, timeout=10):
+                    raise TimeoutError("AuctionClosed event not seen")
+                winner, final_price_wei, energy_kwh = self.auction.auction(auction_id).winner # Price is the Vickrey (2nd highest) bid
                 final_price_eth = self.web3.from_wei(final_price_wei, "ether")
-                energy_kwh = self.auction_contract.functions.energyAmount().call() # Assuming this returns kWh
 
                 print(f"[NegotiationAgent] Auction Closed Results:")
                 print(f"  - Winner: {winner}")
@@ -419,7 +509,7 @@ class NegotiationAgent(Agent):
 
                 # --- Log Auction Outcome ---
                 await self.log_current_balance("Post-Close") # Log balance after potential payout/refund + gas
-                current_balance_eth = float(self.web3.from_wei(self.web3.eth.get_balance(self.account), "ether"))
+                current_balance_eth = await self.balance_eth()
 
                 event_type = "Auction End" # Generic end event
                 log_energy = energy_kwh
@@ -432,7 +522,7 @@ class NegotiationAgent(Agent):
                 # Or, more realistically, check if winner == self.account
                 if winner == self.account:
                     event_type = "Auction Buy" # This agent won the auction (bought energy)
-                elif winner != "0x0000000000000000000000000000000000000000": # Check if there *was* a winner (other than null address)
+                elif winner != ZERO_ADDRESS: # Check if there *was* a winner (other than null address)
                     # Assume this agent was the seller if it called close() and didn't win
                     # This assumption might be flawed depending on contract logic (who can call closeAuction)
                     event_type = "Auction Sell"
@@ -450,7 +540,8 @@ class NegotiationAgent(Agent):
                     price_eth=log_price,
                     balance_eth=current_balance_eth,
                     counterparty=log_counterparty if event_type == "Auction Sell" else None, # Log winner only if selling
-                    status="Success"
+                    status="Success",
+                    auction_id=auction_id
                 )
                 print(f"[NegotiationAgent] Logged auction outcome: {event_type}")
 
@@ -466,8 +557,9 @@ class NegotiationAgent(Agent):
                         agent_account=self.account,
                         event_type="Auction End", # Generic failure event
                         energy_kwh=None, price_eth=None,
-                        balance_eth=float(self.web3.from_wei(self.web3.eth.get_balance(self.account), "ether")),
-                        status="Failed"
+                        balance_eth=await self.balance_eth(),
+                        status="Failed",
+                        auction_id=auction_id
                     )
                 except Exception as log_e:
                      print(f"[NegotiationAgent] Also failed to log close failure: {log_e}")
@@ -494,29 +586,84 @@ class NegotiationAgent(Agent):
                 return 3
 
 
-        async def run(self):
-            print("[NegotiationAgent] Behaviour loop started. Waiting for data...")
-            await asyncio.sleep(5) # Initial wait before checking messages
-
+        async def sleep_until(self, target_timestamp, auction_id, timings):
+            """
+            Sleeps until target_timestamp; returns False early if the auction's timings change
+            first (auction restarted, reset or closed by someone else).
+            """
+            delay = target_timestamp - time.time()
+            if delay <= 0:
+                return True
+            changed = await self.auction.wait_for(lambda mirror: self.timings_of(auction_id) != timings, timeout=delay)
+            return not changed
+
+        def track(self, auction_id):
+            """Starts run_phases for the current round of an auction, once."""
+            timings = self.timings_of(auction_id)
+            key = (auction_id, timings[1])
+            if timings[0] != 0 and key not in self.phase_tasks:
+                self.phase_tasks[key] = asyncio.ensure_future(self.run_phases(auction_id, timings))
+
+        async def schedule_phases(self):
+            """
+            Tracks every open auction this agent takes part in: on the single-auction contract that
+            is every round (as before), on the multi-auction contract the ones it sells or bid in.
+            """
+            while True:
+                try:
+                    self.phase_tasks = {key: task for key, task in self.phase_tasks.items() if not task.done()}
+                    for auction_id in self.auction.open_auction_ids():
+                        if not self.auction.concurrent or auction_id in self.open_bids or self.auction.auction(auction_id).seller == self.account:
+                            self.track(auction_id)
+                    # Re-check whenever the mirror applies new events
+                    block = self.auction.block
+                    await self.auction.wait_for(lambda mirror: mirror.block != block)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"[NegotiationAgent] Phase scheduler error: {e}")
+                    await asyncio.sleep(1)
+
+        async def run_phases(self, auction_id, timings):
+            """Fires reveal at biddingEnd and close at revealEnd (plus PHASE_MARGIN) of one auction round."""
+            _, bidding_end, reveal_end = timings
+            # An auction the mirror no longer holds (forget_closed) is over as well
+            round_over = lambda mirror: (self.timings_of(auction_id) != timings
+                                         or (auction := mirror.auction(auction_id)) is None or auction.ended)
             try:
-                # Check auction status periodically regardless of messages
-                bidding_start, bidding_end, reveal_end = await self.get_auction_timings()
-                current_state = await self.current_auction_state(bidding_start, bidding_end, reveal_end)
-
-                # --- Automatic Closing Logic ---
-                if current_state == 3: # If auction is past reveal end, try to close it
+                if await self.sleep_until(bidding_end + PHASE_MARGIN, auction_id, timings):
+                    # Retry a failed reveal while the reveal window is still open
+                    while self.open_bids.get(auction_id, (0, None))[1] == bidding_end and time.time() < reveal_end:
+                        if await self.reveal(auction_id):
+                            del self.open_bids[auction_id]
+                        elif not await self.sleep_until(min(time.time() + 1, reveal_end), auction_id, timings):
+                            break
+
+                if await self.sleep_until(reveal_end + PHASE_MARGIN, auction_id, timings) and not round_over(self.auction):
                     print("[NegotiationAgent] Auction period ended, attempting to close...")
-                    await self.close()
-                    # After closing, timings should reset (bidding_start becomes 0),
-                    # so the state will become -1 in the next loop iteration.
-                    await asyncio.sleep(10) # Wait a bit after closing before next loop
-                    return # End current run cycle after closing attempt
+                    await self.close(auction_id)
+                # Refunds can be claimed once the close (ours or anyone's) has been seen
+                if await self.auction.wait_for(round_over, timeout=10):
+                    await self.claim_refunds(auction_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[NegotiationAgent] Phase scheduler error: {e}")
 
+        async def run(self):
+            try:
                 # --- Receive Message and React ---
-                msg = await self.receive(timeout=15) # Shorter timeout to allow periodic checks
+                # Phase deadlines are handled by schedule_phases; this loop only reacts to data
+                msg = await self.receive(timeout=15)
 
                 if msg:
                     print(f"[NegotiationAgent] Received message from {msg.sender}")
+                    # Phase as of this message, read from the event mirror
+                    if self.auction.concurrent:
+                        print(f"[NegotiationAgent] Open auctions: {self.auction.open_auction_ids()}")
+                    else:
+                        bidding_start, bidding_end, reveal_end = await self.get_auction_timings()
+                        await self.current_auction_state(bidding_start, bidding_end, reveal_end)
                     data = json.loads(msg.body)
                     house_data = data.get("house") # Example: {"current_production": 1.5, "current_demand": 0.8}
                     prediction_data = data.get("prediction") # Example: {"predicted_demand": 0.9, "predicted_production": 1.2}
@@ -570,8 +717,10 @@ class NegotiationAgent(Agent):
                             print("[NegotiationAgent] Energy deficit detected. Looking to buy.")
                             amount_to_buy_kwh = abs(energy_delta_kwh) # Try to buy the deficit
 
-                            if current_state == 1: # Only bid if currently in bidding phase
-                                print("[NegotiationAgent] In bidding phase. Calculating bid...")
+                            biddable = self.biddable_auctions()
+                            if biddable: # Only bid in an auction that is in its bidding phase
+                                auction_id = biddable[0]
+                                print(f"[NegotiationAgent] In bidding phase{'' if auction_id is None else f' of auction #{auction_id}'}. Calculating bid...")
                                 bid_price_eth_per_kwh = market_price_eth_per_kwh
                                 if strategy == "aggressive":
                                     bid_price_eth_per_kwh *= 1.05 # Bid 5% above market
@@ -593,24 +742,16 @@ class NegotiationAgent(Agent):
                                 # Assuming reveal() takes total value bid:
                                 total_value_bid_wei = self.web3.to_wei(bid_price_eth_per_kwh * amount_to_buy_kwh + 0.1, "ether")
                                 self.total_energy_bought += total_bid_value_eth
-                                await self.bid(total_value_bid_wei) # Pass total WEI value you are bidding
-
-                            elif current_state == 2: # Reveal phase
-                                print("[NegotiationAgent] In reveal phase. Attempting to reveal previous bid...")
-                                # Need to ensure self.bid_amount was set correctly in the bidding phase run
-                                if self.bid_amount > 0:
-                                    await self.reveal()
-                                else:
-                                    print("[NegotiationAgent] No bid amount stored from bidding phase to reveal.")
+                                await self.bid(total_value_bid_wei, auction_id) # Pass total WEI value you are bidding
 
                             else:
-                                print(f"[NegotiationAgent] Not in Bidding or Reveal phase (State: {current_state}). Cannot act.")
+                                print("[NegotiationAgent] No auction in its bidding phase. Cannot bid.")
 
 
                         elif energy_delta_kwh > 0.1: # Have surplus to sell (added threshold)
                             print("[NegotiationAgent] Energy surplus detected. Considering selling.")
 
-                            if current_state == -1: # Only start auction if none is active
+                            if self.can_start_auction(): # Only start auction if none is active
                                 print("[NegotiationAgent] No active auction. Calculating sell amount...")
                                 sell_fraction = 0.5 # Neutral default
                                 if strategy == "aggressive":
@@ -625,17 +766,13 @@ class NegotiationAgent(Agent):
                                 else:
                                     print("[NegotiationAgent] Surplus too small to auction.")
                             else:
-                                print(f"[NegotiationAgent] Cannot start auction, one is already in progress (State: {current_state}).")
+                                print("[NegotiationAgent] Cannot start auction, one is already in progress.")
 
                         else: # Close to balanced
                             print("[NegotiationAgent] Energy nearly balanced. No buy/sell action needed.")
 
                 else:
                     print("[NegotiationAgent] No message received in this cycle.")
-                    # Agent can still perform actions based on time/state even without messages
-                    if current_state == 2 and self.bid_amount > 0:
-                        print("[NegotiationAgent] In reveal phase (no message). Attempting reveal.")
-                        await self.reveal()
                 
                 await self.call_trade_summary()
 
@@ -652,9 +789,6 @@ class NegotiationAgent(Agent):
                 # Log error to DB?
                 await asyncio.sleep(10) # Wait after error before next loop
 
-            # Wait before the next loop iteration regardless of messages/actions
-            await asyncio.sleep(5)
-
 
     async def setup(self):
         print("[NegotiationAgent] Started")
@@ -0,0 +1,186 @@
+import json
+import os
+import sys
+import zipfile
+import numpy as np
+
+# Lean CPU backend for the Sequential LSTM / LSTM-CNN models in models/.
+# export_keras_model reads a .keras archive directly (config.json + model.weights.h5, needs h5py
+# but not TensorFlow) and writes <name>.numpy.npz; NumpySequential runs that file with NumPy only.
+
+EXPORT_SUFFIX = ".numpy.npz"
+
+# Weight group prefix Keras uses for each supported layer class inside model.weights.h5
+WEIGHT_PREFIXES = {
+    "Conv1D": "conv1d",
+    "MaxPooling1D": "max_pooling1d",
+    "LSTM": "lstm",
+    "Dropout": "dropout",
+    "Dense": "dense"
+}
+
+def exported_path(keras_path):
+    return os.path.splitext(keras_path)[0] + EXPORT_SUFFIX
+
+def sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "tanh": np.tanh,
+    "sigmoid": sigmoid
+}
+
+def layer_spec(layer):
+    """Keeps only the config fields the executor needs."""
+    cfg = layer["config"]
+    spec = {"class_name": layer["class_name"]}
+    if layer["class_name"] == "Conv1D":
+        if cfg["padding"] != "valid" or cfg["strides"] != [1] or cfg["dilation_rate"] != [1]:
+            raise ValueError("Only valid, stride-1, undilated Conv1D layers are supported")
+        spec["activation"] = cfg["activation"]
+    elif layer["class_name"] == "MaxPooling1D":
+        if cfg["padding"] != "valid":
+            raise ValueError("Only valid MaxPooling1D layers are supported")
+        spec["pool_size"] = cfg["pool_size"][0]
+        spec["strides"] = cfg["strides"][0]
+    elif layer["class_name"] == "LSTM":
+        if cfg["activation"] != "tanh" or cfg["recurrent_activation"] != "sigmoid" or cfg["go_backwards"]:
+            raise ValueError("Only standard tanh/sigmoid forward LSTM layers are supported")
+        spec["return_sequences"] = cfg["return_sequences"]
+    elif layer["class_name"] == "Dense":
+        spec["activation"] = cfg["activation"]
+    elif layer["class_name"] != "Dropout":
+        raise ValueError(f"Unsupported layer type {layer['class_name']}")
+    return spec
+
+def export_keras_model(keras_path, out_path=None):
+    """Converts a Sequential .keras archive into a NumPy weight file for NumpySequential."""
+    import h5py  # Only needed for the offline export
+    out_path = out_path or exported_path(keras_path)
+    with zipfile.ZipFile(keras_path) as archive:
+        config = json.loads(archive.read("config.json"))
+        weights_file = archive.extract("model.weights.h5", os.path.dirname(out_path) or ".")
+    if config["class_name"] != "Sequential":
+        raise ValueError("Only Sequential models are supported")
+
+    specs = []
+    arrays = {}
+    seen = {}
+    try:
+        with h5py.File(weights_file, "r") as weights:
+            for layer in config["config"]["layers"]:
+                if layer["class_name"] == "InputLayer":
+                    continue
+                spec = layer_spec(layer)
+                # Keras names weight groups by class, numbered in order of appearance: lstm, lstm_1, ...
+                prefix = WEIGHT_PREFIXES[layer["class_name"]]
+                count = seen.get(prefix, 0)
+                seen[prefix] = count + 1
+                group = weights["layers"][prefix if count == 0 else f"{prefix}_{count}"]
+                variables = group["cell"]["vars"] if layer["class_name"] == "LSTM" else group["vars"]
+                spec["weights"] = len(variables)
+                for index in range(len(variables)):
+                    arrays[f"layer{len(specs)}_{index}"] = np.asarray(variables[str(index)], dtype=np.float32)
+                specs.append(spec)
+    finally:
+        os.remove(weights_file)
+
+    np.savez(out_path, config=np.array(json.dumps(specs)), **arrays)
+    print(f"[NumpyBackend] Exported {keras_path} -> {out_path} ({len(specs)} layers)")
+    return out_path
+
+class NumpySequential:
+    """Runs an exported Sequential model with NumPy (float32, inference mode)."""
+    def __init__(self, specs, weights):
+        self.specs = specs
+        self.weights = weights  # One list of arrays per layer
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as exported:
+            specs = json.loads(str(exported["config"]))
+            weights = [
+                [exported[f"layer{layer}_{index}"] for index in range(spec["weights"])]
+                for layer, spec in enumerate(specs)
+            ]
+        return cls(specs, weights)
+
+    def predict(self, inputs):
+        x = np.asarray(inputs, dtype=np.float32)
+        for spec, weights in zip(self.specs, self.weights):
+            x = getattr(self, spec["class_name"].lower())(x, spec, weights)
+        return x
+
+    @staticmethod
+    def conv1d(x, spec, weights):
+        kernel, bias = weights  # (kernel_size, in_channels, filters), (filters,)
+        steps = x.shape[1] - kernel.shape[0] + 1
+        out = np.broadcast_to(bias, (x.shape[0], steps, kernel.shape[2])).copy()
+        for k in range(kernel.shape[0]):
+            out += x[:, k:k + steps] @ kernel[k]
+        return ACTIVATIONS[spec["activation"]](out)
+
+    @staticmethod
+    def max_pooling1d(x, spec, weights):
+        pool, stride = spec["pool_size"], spec["strides"]
+        steps = (x.shape[1] - pool) // stride + 1
+        return np.max(np.stack([x[:, k:k + stride * steps:stride] for k in range(pool)]), axis=0)
+
+    # getattr(self, "maxpooling1d") for class name MaxPooling1D
+    maxpooling1d = max_pooling1d
+
+    @staticmethod
+    def lstm(x, spec, weights):
+        kernel, recurrent, bias = weights  # Gates packed as [input, forget, cell, output]
+        units = recurrent.shape[0]
+        batch, steps = x.shape[0], x.shape[1]
+        projected = x @ kernel + bias  # Input contribution for every step at once
+        h = np.zeros((batch, units), dtype=np.float32)
+        c = np.zeros((batch, units), dtype=np.float32)
+        outputs = []
+        for t in range(steps):
+            z = projected[:, t] + h @ recurrent
+            i = sigmoid(z[:, :units])
+            f = sigmoid(z[:, units:2 * units])
+            g = np.tanh(z[:, 2 * units:3 * units])
+            o = sigmoid(z[:, 3 * units:])
+            c = f * c + i * g
+            h = o * np.tanh(c)
+            if spec["return_sequences"]:
+                outputs.append(h)
+        return np.stack(outputs, axis=1) if spec["return_sequences"] else h
+
+    @staticmethod
+    def dropout(x, spec, weights):
+        return x  # Inference mode
+
+    @staticmethod
+    def dense(x, spec, weights):
+        kernel, bias = weights
+        return ACTIVATIONS[spec["activation"]](x @ kernel + bias)
+
+def verify_against_keras(keras_path, samples, atol=1e-4):
+    """Numerical-equivalence check of the exported model against Keras on the given inputs."""
+    try:
+        import keras
+    except ImportError:
+        from tensorflow import keras
+    reference = keras.models.load_model(keras_path).predict(samples, verbose=0)
+    lean = NumpySequential.load(exported_path(keras_path)).predict(samples)
+    max_error = float(np.max(np.abs(reference - lean)))
+    print(f"[NumpyBackend] {os.path.basename(keras_path)}: max abs difference {max_error:.2e} over {len(samples)} samples")
+    return max_error <= atol
+
+if __name__ == "__main__":
+    # Usage: python -m agents.numpyBackend [--verify] models/energy_lstm.keras [...]
+    args = [arg for arg in sys.argv[1:] if arg != "--verify"]
+    for path in args:
+        export_keras_model(path)
+        if "--verify" in sys.argv:
+            config = json.loads(zipfile.ZipFile(path).read("config.json"))
+            input_shape = config["config"]["layers"][0]["config"]["batch_shape"][1:]
+            samples = np.random.default_rng(0).random((64, *input_shape), dtype=np.float32)
+            if not verify_against_keras(path, samples):
+                sys.exit(f"[NumpyBackend] {path} does not match Keras")
@@ -5,13 +5,26 @@ import json
 import time
 import asyncio
 import os
-import tensorflow as tf
 import numpy as np
 import sqlite3 # Import sqlite3
+import hashlib
+from agents.codec import decode_array
+from agents.inference import MicroBatcher, get_model_server
+from agents.horizonHead import HORIZON_MODEL
 
 # --- Database Configuration ---
 DB_NAME = "energy_data.db" # Use the same DB name as other agents
 
+# --- Micro-batching Configuration ---
+MAX_BATCH_SIZE = 256 # Upper bound on windows per forward pass
+MAX_BATCH_WAIT = 0.05 # Seconds a single submitted window waits for others; predict_many flushes right away
+
+# --- Multi-horizon Configuration ---
+# The horizon model (built by 'python -m agents.horizonHead') predicts every future step in one
+# forward pass, [demand, production] per step; without it energy_lstm forecasts a single step
+HORIZON_MODEL_NAME = os.getenv("PREDICTION_HORIZON_MODEL", HORIZON_MODEL)
+HORIZON_STEP_SECONDS = float(os.getenv("PREDICTION_STEP_SECONDS", "10")) # Validity span of each step
+
 def initialize_predictions_table(db_name):
     """Creates the predictions table if it doesn't exist."""
     try:
@@ -46,6 +59,73 @@ def log_prediction(db_name, timestamp, demand, production):
         print(f"[PredictionAgent] ERROR logging prediction to database: {e}")
 
 
+def forecast_model_name(model_dir):
+    """The horizon model once it has been built, otherwise the one-step energy_lstm."""
+    if os.path.exists(os.path.join(model_dir, HORIZON_MODEL_NAME)):
+        return HORIZON_MODEL_NAME
+    return "energy_lstm.keras"
+
+def split_horizon(outputs):
+    """(houses, 2 * steps) model outputs -> (houses, steps, 2) rows of [demand, production]."""
+    outputs = np.asarray(outputs)
+    return outputs.reshape(len(outputs), -1, 2)
+
+def window_hash(window):
+    return hashlib.blake2b(np.ascontiguousarray(window, dtype=np.float32).tobytes(), digest_size=16).hexdigest()
+
+class HorizonCache:
+    """
+    Latest multi-step forecast per house. An entry answers requests until the house
+    sends a different input window or the last step's validity has run out.
+    """
+    def __init__(self):
+        self.entries = {}  # house key -> {"window": hash, "steps": (K, 2) array, "valid_from": [...], "valid_until": [...]}
+
+    @staticmethod
+    def current_step(entry, now):
+        """Index of the step whose validity span contains `now` (the last one once all have passed)."""
+        for step, valid_until in enumerate(entry["valid_until"]):
+            if now < valid_until:
+                return step
+        return len(entry["valid_until"]) - 1
+
+    def get(self, key, window_key, now):
+        entry = self.entries.get(key)
+        if entry is None or entry["window"] != window_key or now >= entry["valid_until"][-1]:
+            return None
+        return entry
+
+    def put(self, key, window_key, steps, now):
+        valid_from = [now + step * HORIZON_STEP_SECONDS for step in range(len(steps))]
+        entry = {
+            "window": window_key,
+            "steps": steps,
+            "valid_from": valid_from,
+            "valid_until": [start + HORIZON_STEP_SECONDS for start in valid_from]
+        }
+        self.entries[key] = entry
+        return entry
+
+def horizon_payload(entry, now):
+    """Message form of a cached forecast: the step valid at `now` at the top level plus the full horizon."""
+    current = entry["steps"][HorizonCache.current_step(entry, now)]
+    payload = {
+        "predicted_demand": float(current[0]),
+        "predicted_production": float(current[1])
+    }
+    if len(entry["steps"]) > 1:
+        payload["horizon"] = [
+            {
+                "step": step + 1,
+                "predicted_demand": float(demand),
+                "predicted_production": float(production),
+                "valid_from": entry["valid_from"][step],
+                "valid_until": entry["valid_until"][step]
+            }
+            for step, (demand, production) in enumerate(entry["steps"])
+        ]
+    return payload
+
 # Prediction Agent: Forecasts energy demand and production
 class PredictionAgent(Agent):
     class PredictBehaviour(CyclicBehaviour):
@@ -53,18 +133,50 @@ class PredictionAgent(Agent):
             # Load the trained LSTM model when the agent starts
             try:
                 project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-                model_path = os.path.join(project_dir, "models", "energy_lstm.keras")
+                model_name = forecast_model_name(os.path.join(project_dir, "models"))
+                model_path = os.path.join(project_dir, "models", model_name)
                 if not os.path.exists(model_path):
                      print(f"[PredictionAgent] ERROR: Model file not found at {model_path}")
                      # Consider stopping the agent or preventing behavior start
                      # await self.agent.stop() # Example: Stop agent if model missing
                      return
-                self.model = tf.keras.models.load_model(model_path)
-                print("[PredictionAgent] LSTM Model loaded successfully.")
+                # Shared handle from the process-wide model server (loaded once, off the event loop)
+                self.model = await get_model_server().get(model_name)
+                # Windows from the house and every fleet home share one forward pass
+                self.batcher = MicroBatcher(self.model.predict_sync,
+                                            max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_BATCH_WAIT)
+                self.horizons = HorizonCache()
+                print(f"[PredictionAgent] LSTM Model {model_name} loaded successfully.")
             except Exception as e:
                  print(f"[PredictionAgent] ERROR loading LSTM model: {e}")
                  # Handle error appropriately - maybe agent shouldn't run?
 
+        def collect_samples(self, data, fleet):
+            """Returns {house key: (18, 1) window} for the single house and every fleet home."""
+            samples = {}
+            if "test_sample" in data:
+                # test_sample is either a nested list shaped (1, 18, 1) or a binary-encoded array
+                test_sample_np = decode_array(data["test_sample"], np.float32) # Ensure float type
+                if test_sample_np.size == 18: # Check length explicitly
+                    samples["house"] = test_sample_np.reshape(18, 1)
+                else:
+                    print(f"[PredictionAgent] Invalid house window length ({test_sample_np.size} != 18).")
+            if "test_sample" in fleet:
+                fleet_samples = decode_array(fleet["test_sample"], np.float32)
+                if fleet_samples.size == 18 * len(fleet["house_ids"]):
+                    fleet_samples = fleet_samples.reshape(len(fleet["house_ids"]), 18, 1)
+                    samples.update(zip(fleet["house_ids"], fleet_samples))
+                else:
+                    print(f"[PredictionAgent] Fleet windows do not match {len(fleet['house_ids'])} houses of 18 steps.")
+            return samples
+
+        async def forecast_horizon(self, windows):
+            """
+            Forecasts every window in one batched pass. Returns an array shaped (houses, steps, 2),
+            with as many steps as the loaded model predicts.
+            """
+            return split_horizon(await self.batcher.predict_many(list(windows)))
+
         async def run(self):
             if not hasattr(self, 'model'):
                  print("[PredictionAgent] Model not loaded, skipping prediction cycle.")
@@ -77,67 +189,65 @@ class PredictionAgent(Agent):
             msg = await self.receive(timeout=15) # Slightly shorter timeout?
             if msg:
                 try:
-                    # Assuming message body structure: {"house": {"test_sample": [...]}}
-                    data = json.loads(msg.body).get("house", {})
+                    # Message body structure: {"house": {"test_sample": [...]}, "fleet": {"house_ids": [...], "test_sample": ...}}
+                    bundle = json.loads(msg.body)
                 except json.JSONDecodeError as e:
                     print(f"[PredictionAgent] JSON decode error: {e}")
                     return # Skip this cycle on bad message format
 
-                if not data or "test_sample" not in data:
+                data = bundle.get("house") or {}
+                fleet = bundle.get("fleet") or {}
+                if "test_sample" not in data and "test_sample" not in fleet:
                     # Adjusted condition to check specifically for test_sample
                     print("[PredictionAgent] No valid 'test_sample' data received in message.")
                 else:
                     print(f"[PredictionAgent] Received data containing 'test_sample'")
                     try:
-                        # Extract the 'test_sample' from the data
-                        raw_test_sample = data.get("test_sample")
-
                         # --- Data Validation and Processing ---
-                        # Assuming test_sample is like [[[val1], [val2], ...]] based on previous code
-                        if isinstance(raw_test_sample, list) and raw_test_sample and isinstance(raw_test_sample[0], list):
-                            # Flatten the inner list structure: [[[v1],[v2]]] -> [v1, v2]
-                             extracted_data = [item[0] for item in raw_test_sample[0] if isinstance(item, list) and len(item)>0]
-                        else:
-                            extracted_data = []
-                            print("[PredictionAgent] 'test_sample' is improperly formatted or empty.")
-
-                        if not extracted_data or len(extracted_data) != 18: # Check length explicitly
-                            print(f"[PredictionAgent] Invalid data extracted or incorrect length ({len(extracted_data)} != 18). Skipping prediction.")
+                        samples = self.collect_samples(data, fleet)
+                        if not samples:
+                            print("[PredictionAgent] No window with the expected 18 steps. Skipping prediction.")
                             return
 
-                        # Convert and reshape for the model
-                        test_sample_np = np.array(extracted_data).astype(np.float32) # Ensure float type
-                        # Reshape directly to model input shape (1 batch, 18 timesteps, 1 feature)
-                        test_sample_input = test_sample_np.reshape(1, 18, 1)
-
                         # --- Make Prediction ---
-                        prediction_result = self.model.predict(test_sample_input)
-                        # Assuming model output is [[predicted_demand, predicted_production]]
-                        predicted_demand = prediction_result[0][0]
-                        predicted_production = prediction_result[0][1]
-                        print(f"[PredictionAgent] Prediction successful: Demand={predicted_demand:.4f}, Production={predicted_production:.4f}")
-
+                        # Houses whose window is unchanged are answered from the horizon cache;
+                        # the rest share batched forward passes. Output rows are [predicted_demand, predicted_production]
+                        now = time.time()
+                        window_keys = {key: window_hash(sample) for key, sample in samples.items()}
+                        entries = {key: self.horizons.get(key, window_keys[key], now) for key in samples}
+                        missing = [key for key, entry in entries.items() if entry is None]
+                        if missing:
+                            forecasts = await self.forecast_horizon([samples[key] for key in missing])
+                            for key, steps in zip(missing, forecasts):
+                                entries[key] = self.horizons.put(key, window_keys[key], steps, now)
+                        print(f"[PredictionAgent] Prediction successful for {len(entries)} house(s), "
+                              f"{len(entries) - len(missing)} served from cache")
+                        predictions = {key: horizon_payload(entry, now) for key, entry in entries.items()}
 
-                        # --- Log Prediction to Database ---
-                        current_timestamp = time.time()
-                        log_prediction(DB_NAME, current_timestamp, predicted_demand, predicted_production)
-                        print("[PredictionAgent] Prediction logged to database.")
+                        body = {}
+                        if "house" in predictions:
+                            predicted_demand = predictions["house"]["predicted_demand"]
+                            predicted_production = predictions["house"]["predicted_production"]
+                            print(f"[PredictionAgent] House prediction: Demand={predicted_demand:.4f}, Production={predicted_production:.4f}")
 
+                            # --- Log Prediction to Database ---
+                            if "house" in missing: # Cached answers were logged when first computed
+                                log_prediction(DB_NAME, now, predicted_demand, predicted_production)
+                                print("[PredictionAgent] Prediction logged to database.")
+                            body.update(predictions.pop("house"))
+                        if predictions:
+                            # Remaining entries are fleet homes, keyed by house ID
+                            body["fleet_predictions"] = predictions
 
                         # --- Send Prediction Message (to FacilitatingAgent) ---
                         response = Message(to="facilitating@localhost")
-                        response.body = json.dumps({
-                            "predicted_demand": float(predicted_demand),
-                            "predicted_production": float(predicted_production)
-                        })
+                        response.body = json.dumps(body)
                         await self.send(response)
-                        print(f"[PredictionAgent] Sent prediction data to FacilitatingAgent: {response.body}")
+                        print(f"[PredictionAgent] Sent prediction data to FacilitatingAgent ({len(response.body)} bytes)")
 
                     except ValueError as ve:
                         # Catch specific errors like reshape issues
                         print(f"[PredictionAgent] Data Processing Error: {ve}")
-                        # Log relevant info if helpful
-                        print(f"[PredictionAgent] Raw Sample causing error: {raw_test_sample}")
                     except Exception as e:
                         # Handle other prediction or data processing errors
                         print(f"[PredictionAgent] Prediction/Processing Error: {e}")
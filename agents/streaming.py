@@ -0,0 +1,40 @@
+import numpy as np
+
+class WindowRing:
+    """
+    Rebuilds a sliding window from per-tick rows sent by a delta stream.
+    A full sync loads the whole window; each delta overwrites the oldest row.
+    push() returns False when a sequence number was skipped, meaning the
+    receiver has to ask the sender for a full resync.
+    """
+    def __init__(self):
+        self.buffer = None
+        self.head = 0    # Index of the oldest row in the buffer
+        self.seq = None  # Sequence number of the newest row
+
+    @property
+    def ready(self):
+        return self.buffer is not None
+
+    def load(self, seq, window):
+        self.buffer = np.array(window, copy=True)
+        self.head = 0
+        self.seq = seq
+
+    def push(self, seq, row):
+        if not self.ready:
+            return False
+        if seq <= self.seq:
+            return True  # Already applied (same bundle forwarded twice)
+        if seq != self.seq + 1:
+            return False
+        self.buffer[self.head] = row
+        self.head = (self.head + 1) % len(self.buffer)
+        self.seq = seq
+        return True
+
+    def window(self):
+        """Returns the rows ordered oldest to newest."""
+        if self.head == 0:
+            return self.buffer
+        return np.concatenate((self.buffer[self.head:], self.buffer[:self.head]))
@@ -0,0 +1,144 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future
+from web3.exceptions import TransactionNotFound
+
+# Seconds between receipt polls for in-flight transactions
+RECEIPT_POLL_INTERVAL = float(os.getenv("RECEIPT_POLL_INTERVAL", "0.1"))
+RECEIPT_TIMEOUT = float(os.getenv("RECEIPT_TIMEOUT", "120"))
+
+class TransactionFailed(Exception):
+    """Raised through a transaction's future when it was mined but reverted (status 0)."""
+    def __init__(self, receipt):
+        super().__init__(f"Transaction {receipt['transactionHash'].hex()} reverted")
+        self.receipt = receipt
+
+class TransactionManager:
+    """
+    Submits transactions back-to-back with locally assigned nonces and tracks their
+    receipts on one background thread. submit() returns as soon as the node has
+    accepted the transaction, with a Future that resolves to its receipt.
+    """
+    def __init__(self, web3, poll_interval=RECEIPT_POLL_INTERVAL, timeout=RECEIPT_TIMEOUT):
+        self.web3 = web3
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.nonces = {}   # account -> next nonce to use
+        self.pending = {}  # tx hash -> (future, submitted at)
+        self.lock = threading.Lock()
+        self.poller = None
+
+    def submit(self, function, params):
+        """Sends contract `function` with tx `params` (must include "from"); returns a receipt Future."""
+        account = params["from"]
+        with self.lock:
+            if account not in self.nonces:
+                self.nonces[account] = self.web3.eth.get_transaction_count(account, "pending")
+            nonce = self.nonces[account]
+            try:
+                tx_hash = function.transact(dict(params, nonce=nonce))
+            except Exception:
+                # Re-read the nonce next time in case the node's view differs from ours
+                self.nonces.pop(account, None)
+                raise
+            self.nonces[account] = nonce + 1
+            future = Future()
+            self.pending[tx_hash] = (future, time.time())
+            if self.poller is None or not self.poller.is_alive():
+                self.poller = threading.Thread(target=self.poll_receipts, name="tx-receipts", daemon=True)
+                self.poller.start()
+        return future
+
+    def transact(self, function, params):
+        """submit() and wait for the receipt."""
+        return self.submit(function, params).result()
+
+    def poll_receipts(self):
+        while True:
+            with self.lock:
+                if not self.pending:
+                    self.poller = None
+                    return
+                in_flight = list(self.pending.items())
+            for tx_hash, (future, submitted) in in_flight:
+                try:
+                    receipt = self.web3.eth.get_transaction_receipt(tx_hash)
+                except TransactionNotFound:
+                    if time.time() - submitted > self.timeout:
+                        self.resolve(tx_hash, error=TimeoutError(f"No receipt for {tx_hash.hex()} after {self.timeout}s"))
+                    continue
+                except Exception as e:
+                    self.resolve(tx_hash, error=e)
+                    continue
+                self.resolve(tx_hash, receipt=receipt)
+            time.sleep(self.poll_interval)
+
+    def resolve(self, tx_hash, receipt=None, error=None):
+        with self.lock:
+            future, _ = self.pending.pop(tx_hash)
+        if error is None and receipt["status"] == 0:
+            error = TransactionFailed(receipt)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(receipt)
+
+class AsyncTransactionManager:
+    """TransactionManager for an AsyncWeb3 client; receipts are tracked by one asyncio task."""
+    def __init__(self, web3, poll_interval=RECEIPT_POLL_INTERVAL, timeout=RECEIPT_TIMEOUT):
+        self.web3 = web3
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.nonces = {}
+        self.pending = {}
+        self.lock = asyncio.Lock()  # Keeps nonce assignment and submission in order
+        self.poller = None
+
+    async def submit(self, function, params):
+        account = params["from"]
+        async with self.lock:
+            if account not in self.nonces:
+                self.nonces[account] = await self.web3.eth.get_transaction_count(account, "pending")
+            nonce = self.nonces[account]
+            try:
+                tx_hash = await function.transact(dict(params, nonce=nonce))
+            except Exception:
+                self.nonces.pop(account, None)
+                raise
+            self.nonces[account] = nonce + 1
+            future = asyncio.get_running_loop().create_future()
+            self.pending[tx_hash] = (future, time.time())
+            if self.poller is None or self.poller.done():
+                self.poller = asyncio.ensure_future(self.poll_receipts())
+        return future
+
+    async def transact(self, function, params):
+        return await (await self.submit(function, params))
+
+    async def poll_receipts(self):
+        while self.pending:
+            for tx_hash, (future, submitted) in list(self.pending.items()):
+                try:
+                    receipt = await self.web3.eth.get_transaction_receipt(tx_hash)
+                except TransactionNotFound:
+                    if time.time() - submitted > self.timeout:
+                        self.resolve(tx_hash, error=TimeoutError(f"No receipt for {tx_hash.hex()} after {self.timeout}s"))
+                    continue
+                except Exception as e:
+                    self.resolve(tx_hash, error=e)
+                    continue
+                self.resolve(tx_hash, receipt=receipt)
+            await asyncio.sleep(self.poll_interval)
+
+    def resolve(self, tx_hash, receipt=None, error=None):
+        future, _ = self.pending.pop(tx_hash)
+        if future.done():
+            return
+        if error is None and receipt["status"] == 0:
+            error = TransactionFailed(receipt)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(receipt)
@@ -0,0 +1,195 @@
+import csv
+import json
+import os
+import sys
+import numpy as np
+from agents.numpyBackend import exported_path
+
+# NumPy evaluator for the LightGBM priority ranker. compile_booster flattens the booster's
+# dump_model() output into node arrays (needs lightgbm once, offline); TreeEnsemble scores whole
+# batches from that file without importing lightgbm, with the same double-precision arithmetic.
+
+# LightGBM missing_type values
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+MISSING_TYPES = {"None": MISSING_NONE, "Zero": MISSING_ZERO, "NaN": MISSING_NAN}
+# Features with |value| <= kZeroThreshold count as zero for missing_type Zero
+ZERO_THRESHOLD = 1e-35
+
+def load_booster(model_path):
+    import joblib  # Only needed for the offline compile
+    model = joblib.load(model_path)
+    return getattr(model, "booster_", model)  # LGBMRanker or a bare Booster
+
+def compile_booster(model_path, out_path=None):
+    """
+    Flattens every tree into shared node arrays. Children >= 0 index nodes,
+    children < 0 are ~leaf_index, the same encoding LightGBM uses internally.
+    """
+    out_path = out_path or exported_path(model_path)
+    dump = load_booster(model_path).dump_model()
+    if dump["num_tree_per_iteration"] != 1 or dump.get("average_output"):
+        raise ValueError("Only single-output, non-averaged boosters are supported")
+
+    nodes = {"feature": [], "threshold": [], "left": [], "right": [], "default_left": [], "missing_type": []}
+    leaf_values = []
+    roots = []
+
+    def add(node):
+        """Appends a subtree and returns its encoded child reference."""
+        if "leaf_value" in node:
+            leaf_values.append(node["leaf_value"])
+            return ~(len(leaf_values) - 1)
+        if node["decision_type"] != "<=":
+            raise ValueError("Categorical splits are not supported")
+        index = len(nodes["feature"])
+        nodes["feature"].append(node["split_feature"])
+        nodes["threshold"].append(node["threshold"])
+        nodes["default_left"].append(node["default_left"])
+        nodes["missing_type"].append(MISSING_TYPES[node["missing_type"]])
+        nodes["left"].append(None)
+        nodes["right"].append(None)
+        nodes["left"][index] = add(node["left_child"])
+        nodes["right"][index] = add(node["right_child"])
+        return index
+
+    for tree in dump["tree_info"]:
+        roots.append(add(tree["tree_structure"]))
+
+    np.savez(
+        out_path,
+        num_features=np.int32(dump["max_feature_idx"] + 1),
+        feature_names=np.array(dump["feature_names"]),
+        roots=np.array(roots, dtype=np.int32),
+        feature=np.array(nodes["feature"], dtype=np.int32),
+        threshold=np.array(nodes["threshold"], dtype=np.float64),
+        left=np.array(nodes["left"], dtype=np.int32),
+        right=np.array(nodes["right"], dtype=np.int32),
+        default_left=np.array(nodes["default_left"], dtype=bool),
+        missing_type=np.array(nodes["missing_type"], dtype=np.int8),
+        leaf_values=np.array(leaf_values, dtype=np.float64)
+    )
+    print(f"[TreeEnsemble] Compiled {model_path} -> {out_path} "
+          f"({len(roots)} trees, {len(nodes['feature'])} splits, {len(leaf_values)} leaves)")
+    return out_path
+
+class TreeEnsemble:
+    """
+    Scores a batch of rows against every tree at once. Leaves are appended after the
+    split nodes as self-loops, so all (row, tree) pairs advance together for a fixed
+    number of steps (the deepest tree's depth) with no per-step masking.
+    """
+    def __init__(self, num_features, feature_names, roots, feature, threshold, left, right,
+                 default_left, missing_type, leaf_values):
+        self.num_features = int(num_features)
+        self.feature_names = [str(name) for name in feature_names]
+        self.leaf_values = leaf_values
+        splits, leaves = len(feature), len(leaf_values)
+        self.first_leaf = splits
+        to_node = lambda child: np.where(child < 0, splits + ~child, child).astype(np.int32)
+        self.roots = to_node(roots)
+        self.feature = np.concatenate((feature, np.zeros(leaves, dtype=np.int32)))
+        self.threshold = np.concatenate((threshold, np.full(leaves, np.inf)))  # Leaves always "go left"...
+        self.left = np.concatenate((to_node(left), np.arange(splits, splits + leaves, dtype=np.int32)))  # ...to themselves
+        self.right = np.concatenate((to_node(right), np.arange(splits, splits + leaves, dtype=np.int32)))
+        self.default_left = np.concatenate((default_left, np.ones(leaves, dtype=bool)))
+        self.missing_type = np.concatenate((missing_type, np.zeros(leaves, dtype=np.int8)))
+        # With only missing_type None splits, NaN handling reduces to NaN -> 0.0 up front
+        self.plain = not np.any(missing_type != MISSING_NONE)
+        self.depth = self.max_depth()
+
+    def max_depth(self):
+        depth, frontier = 0, self.roots
+        while np.any(frontier < self.first_leaf):
+            frontier = np.concatenate((self.left[frontier], self.right[frontier]))
+            frontier = np.unique(frontier[frontier < self.first_leaf])
+            depth += 1
+        return depth
+
+    def split_thresholds(self):
+        """
+        Sorted distinct thresholds per feature, or None when a split routes NaN or zero
+        specially. Rows whose features fall between the same thresholds get identical scores.
+        """
+        if not self.plain:
+            return None
+        splits = slice(0, self.first_leaf)
+        return [np.unique(self.threshold[splits][self.feature[splits] == f]) for f in range(self.num_features)]
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as compiled:
+            return cls(**{name: compiled[name] for name in compiled.files})
+
+    @property
+    def weights(self):
+        # Matches NumpySequential's layout for ModelServer's weight accounting
+        return [[self.feature, self.threshold, self.left, self.right, self.default_left, self.missing_type, self.leaf_values]]
+
+    def predict(self, inputs):
+        x = np.asarray(inputs, dtype=np.float64)
+        if x.ndim == 1:
+            x = x[None]
+        if x.shape[1] != self.num_features:
+            raise ValueError(f"Expected {self.num_features} features, got {x.shape[1]}")
+        is_nan = np.isnan(x)
+        # Like LightGBM, NaN is treated as 0.0 unless the split tracks NaN explicitly
+        clean = np.where(is_nan, 0.0, x)
+        rows = np.arange(len(x))[:, None]
+        position = np.broadcast_to(self.roots, (len(x), len(self.roots)))
+        for _ in range(self.depth):
+            feature = self.feature[position]
+            go_left = clean[rows, feature] <= self.threshold[position]
+            if not self.plain:
+                missing_type = self.missing_type[position]
+                use_default = ((missing_type == MISSING_ZERO) & (np.abs(clean[rows, feature]) <= ZERO_THRESHOLD)) | \
+                              ((missing_type == MISSING_NAN) & is_nan[rows, feature])
+                go_left = np.where(use_default, self.default_left[position], go_left)
+            position = np.where(go_left, self.left[position], self.right[position])
+        leaves = self.leaf_values[position - self.first_leaf]
+        # Accumulate in tree order so the float64 sum matches LightGBM's exactly
+        scores = np.zeros(len(x), dtype=np.float64)
+        for tree in range(leaves.shape[1]):
+            scores += leaves[:, tree]
+        return scores
+
+def verification_rows(model, rng, samples=4096):
+    """
+    Rows that exercise every split: random values over each feature's training range,
+    every threshold and its float neighbours, NaNs, and the appliance readings in
+    datasets/behavioral_agent_data.csv.
+    """
+    thresholds = model.threshold[:model.first_leaf]
+    features = model.feature[:model.first_leaf]
+    boundary = np.concatenate((thresholds, np.nextafter(thresholds, -np.inf), np.nextafter(thresholds, np.inf), [0.0, np.nan]))
+    low = np.array([np.min(thresholds[features == f], initial=0.0) for f in range(model.num_features)]) - 1
+    high = np.array([np.max(thresholds[features == f], initial=0.0) for f in range(model.num_features)]) + 1
+    rows = rng.uniform(low, high, size=(samples, model.num_features))
+    picks = rng.integers(0, len(boundary), size=(samples, model.num_features))
+    mask = rng.random((samples, model.num_features)) < 0.5
+    rows[mask] = boundary[picks[mask]]
+    data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "datasets", "behavioral_agent_data.csv")
+    if os.path.exists(data_path):
+        with open(data_path, newline="") as data_file:
+            consumption = np.array([float(row["Appliance_Consumption_kWh"]) for row in csv.DictReader(data_file)])
+        shipped = rng.uniform(low, high, size=(len(consumption), model.num_features))
+        shipped[:, 0] = consumption
+        rows = np.concatenate((rows, shipped))
+    return rows
+
+def verify_against_lightgbm(model_path, rows):
+    """Bit-for-bit check of the compiled ensemble against Booster.predict."""
+    reference = load_booster(model_path).predict(rows)
+    compiled = TreeEnsemble.load(exported_path(model_path)).predict(rows)
+    mismatches = int(np.count_nonzero(reference != compiled))
+    print(f"[TreeEnsemble] {os.path.basename(model_path)}: {mismatches} of {len(rows)} scores differ from LightGBM")
+    return mismatches == 0
+
+if __name__ == "__main__":
+    # Usage: python -m agents.treeEnsemble [--verify] models/lightgbm_ranker_model.pkl
+    args = [arg for arg in sys.argv[1:] if arg != "--verify"]
+    for path in args:
+        compile_booster(path)
+        if "--verify" in sys.argv:
+            compiled = TreeEnsemble.load(exported_path(path))
+            if not verify_against_lightgbm(path, verification_rows(compiled, np.random.default_rng(0))):
+                sys.exit(f"[TreeEnsemble] {path} does not match LightGBM")
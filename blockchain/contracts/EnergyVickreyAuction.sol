@@ -25,6 +25,24 @@ contract EnergyVickreyAuction {
 
     uint256 public energyAmount; // Amount of energy being auctioned in the current/last round
 
+    // Everything the off-chain agents track, returned by getAuctionSnapshot in one call
+    struct AuctionSnapshot {
+        uint256 blockNumber; // Block the snapshot was read at
+        address seller;
+        uint256 biddingStart;
+        uint256 biddingEnd;
+        uint256 revealEnd;
+        bool ended;
+        uint256 biddingDuration;
+        uint256 revealDuration;
+        uint256 energyAmount;
+        address highestBidder;
+        uint256 highestBid;
+        uint256 secondHighestBid;
+        address[] bidders;
+        uint256[] deposits;
+    }
+
     // --- Events ---
     event AuctionStarted(address indexed seller, uint256 energyAmount, uint256 biddingEnd, uint256 revealEnd);
     event BidPlaced(address indexed bidder, uint256 deposit);
@@ -87,6 +105,26 @@ contract EnergyVickreyAuction {
         return (bidders, deposits);
     }
 
+    function getAuctionSnapshot() external view returns (AuctionSnapshot memory snapshot) {
+        snapshot.blockNumber = block.number;
+        snapshot.seller = seller;
+        snapshot.biddingStart = biddingStart;
+        snapshot.biddingEnd = biddingEnd;
+        snapshot.revealEnd = revealEnd;
+        snapshot.ended = ended;
+        snapshot.biddingDuration = biddingDuration;
+        snapshot.revealDuration = revealDuration;
+        snapshot.energyAmount = energyAmount;
+        snapshot.highestBidder = highestBidder;
+        snapshot.highestBid = highestBid;
+        snapshot.secondHighestBid = secondHighestBid;
+        snapshot.bidders = bidders;
+        snapshot.deposits = new uint256[](bidders.length);
+        for (uint256 i = 0; i < bidders.length; i++) {
+            snapshot.deposits[i] = bids[bidders[i]].deposit;
+        }
+    }
+
     // --- State Changing Functions ---
 
     // Start a new auction round (can only be called after closeAuction or resetAuction)
@@ -0,0 +1,365 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.13;
+
+// Vickrey auctions keyed by auction ID: any account can start an auction at any time,
+// each with its own seller, energy amount and timings, and many run concurrently.
+// Refunds and seller proceeds use the withdraw pattern of EnergyVickreyAuctionPull.
+// An operator authorized by several houses can bid and reveal for all of them in one
+// transaction (batchBid/batchReveal); each bid is still attributed to its house.
+contract EnergyVickreyAuctionMulti {
+    struct Bid {
+        bytes32 sealedBid;
+        uint256 deposit; // Amount sent with the bid transaction, until revealed/settled
+        address payer;   // Account that sent the deposit (the house, or its operator); refunds go here
+    }
+
+    struct Auction {
+        address seller;
+        uint256 biddingStart;
+        uint256 biddingEnd;
+        uint256 revealEnd;
+        bool ended; // Set by closeAuction
+        uint256 energyAmount;
+        address highestBidder;
+        uint256 highestBid;     // Highest revealed value
+        uint256 secondHighestBid; // Second highest revealed value
+        address[] bidders;
+    }
+
+    // One auction as returned by the read functions
+    struct AuctionView {
+        uint256 auctionId;
+        address seller;
+        uint256 biddingStart;
+        uint256 biddingEnd;
+        uint256 revealEnd;
+        bool ended;
+        uint256 energyAmount;
+        address highestBidder;
+        uint256 highestBid;
+        uint256 secondHighestBid;
+        address[] bidders;
+        uint256[] deposits;
+    }
+
+    address public owner;
+    uint256 public biddingDuration; // Used by auctions started after the last setDurations
+    uint256 public revealDuration;
+
+    uint256 public auctionCount; // Auction IDs start at 1
+    mapping(uint256 => Auction) private auctions;
+    mapping(uint256 => mapping(address => Bid)) public bids; // auction ID -> bidder -> bid
+    mapping(address => uint256) public pendingReturns;       // Refunds and seller proceeds, claimed by withdraw()
+
+    uint256[] private openAuctionIds;               // Auctions not yet closed
+    mapping(uint256 => uint256) private openIndex;  // Auction ID -> position in openAuctionIds + 1
+
+    mapping(address => address) public operatorOf; // House -> account allowed to batch bids for it
+
+    // --- Events ---
+    event AuctionStarted(uint256 indexed auctionId, address indexed seller, uint256 energyAmount, uint256 biddingStart, uint256 biddingEnd, uint256 revealEnd);
+    event BidPlaced(uint256 indexed auctionId, address indexed bidder, uint256 deposit);
+    event BidRevealed(uint256 indexed auctionId, address indexed bidder, uint256 value);
+    event AuctionClosed(uint256 indexed auctionId, address winner, uint256 winningPrice, uint256 energyAmount);
+    event DurationsChanged(uint256 newBiddingDuration, uint256 newRevealDuration);
+    event Withdrawal(address indexed account, uint256 amount);
+    event OperatorSet(address indexed house, address indexed operator);
+    event BatchBid(uint256 indexed auctionId, address indexed operator, uint256 count, uint256 totalDeposit);
+    event BatchReveal(uint256 indexed auctionId, address indexed operator, uint256 revealed, uint256 skipped);
+    event RevealSkipped(uint256 indexed auctionId, address indexed bidder); // Batch entry that did not match its bid
+
+    // --- Modifiers ---
+    modifier onlyBefore(uint256 _time) {
+        require(block.timestamp < _time, "Auction phase has ended");
+        _;
+    }
+
+    modifier onlyAfter(uint256 _time) {
+        require(block.timestamp >= _time, "Auction phase has not started yet");
+        _;
+    }
+
+    modifier auctionExists(uint256 _auctionId) {
+        require(_auctionId != 0 && _auctionId <= auctionCount, "Unknown auction");
+        _;
+    }
+
+    modifier auctionNotClosed(uint256 _auctionId) {
+        require(!auctions[_auctionId].ended, "Auction already closed");
+        _;
+    }
+
+    modifier auctionIsClosed(uint256 _auctionId) {
+        require(auctions[_auctionId].ended, "Auction must be closed first");
+        _;
+    }
+
+    // --- Constructor ---
+    constructor(uint256 _biddingDuration, uint256 _revealDuration) {
+        owner = msg.sender;
+        biddingDuration = _biddingDuration;
+        revealDuration = _revealDuration;
+    }
+
+    // --- Read Functions ---
+    function getAuction(uint256 _auctionId) external view auctionExists(_auctionId) returns (AuctionView memory) {
+        return _view(_auctionId);
+    }
+
+    // Every auction that has not been closed yet, read in one call
+    function getOpenAuctions() external view returns (uint256 blockNumber, AuctionView[] memory views) {
+        blockNumber = block.number;
+        views = new AuctionView[](openAuctionIds.length);
+        for (uint256 i = 0; i < openAuctionIds.length; i++) {
+            views[i] = _view(openAuctionIds[i]);
+        }
+    }
+
+    function getOpenAuctionIds() external view returns (uint256[] memory) {
+        return openAuctionIds;
+    }
+
+    // Amount withdraw() would pay `_account` right now
+    function refundableAmount(address _account) external view returns (uint256) {
+        return pendingReturns[_account];
+    }
+
+    // --- Internal Helpers ---
+    function _view(uint256 _auctionId) internal view returns (AuctionView memory v) {
+        Auction storage a = auctions[_auctionId];
+        v.auctionId = _auctionId;
+        v.seller = a.seller;
+        v.biddingStart = a.biddingStart;
+        v.biddingEnd = a.biddingEnd;
+        v.revealEnd = a.revealEnd;
+        v.ended = a.ended;
+        v.energyAmount = a.energyAmount;
+        v.highestBidder = a.highestBidder;
+        v.highestBid = a.highestBid;
+        v.secondHighestBid = a.secondHighestBid;
+        v.bidders = a.bidders;
+        v.deposits = new uint256[](a.bidders.length);
+        for (uint256 i = 0; i < a.bidders.length; i++) {
+            v.deposits[i] = bids[_auctionId][a.bidders[i]].deposit;
+        }
+    }
+
+    function _placeBid(uint256 _auctionId, address _bidder, address _payer, bytes32 _sealedBid, uint256 _deposit) internal {
+        Bid storage existing = bids[_auctionId][_bidder];
+        require(existing.sealedBid == bytes32(0) && existing.deposit == 0, "Bidder has already placed a bid in this auction");
+        require(_deposit > 0, "Deposit must be greater than 0");
+
+        bids[_auctionId][_bidder] = Bid({
+            sealedBid: _sealedBid,
+            deposit: _deposit,
+            payer: _payer
+        });
+        auctions[_auctionId].bidders.push(_bidder);
+
+        emit BidPlaced(_auctionId, _bidder, _deposit);
+    }
+
+    // Whether `_value`/`_nonce` opens `_bidder`'s sealed bid and is covered by its deposit
+    function _revealMatches(uint256 _auctionId, address _bidder, uint256 _value, string calldata _nonce) internal view returns (bool) {
+        Bid storage b = bids[_auctionId][_bidder];
+        return b.sealedBid != bytes32(0)
+            && b.sealedBid == keccak256(abi.encodePacked(_value, _nonce))
+            && b.deposit >= _value;
+    }
+
+    function _applyReveal(uint256 _auctionId, address _bidder, uint256 _value) internal {
+        Auction storage a = auctions[_auctionId];
+        Bid storage bidToCheck = bids[_auctionId][_bidder];
+
+        // Mark bid as revealed by clearing sealedBid (prevents double reveal)
+        bidToCheck.sealedBid = bytes32(0);
+
+        if (_value > a.highestBid) {
+            // The previous leader can no longer win; release their deposit
+            if (a.highestBidder != address(0)) {
+                Bid storage outbid = bids[_auctionId][a.highestBidder];
+                pendingReturns[outbid.payer] += outbid.deposit;
+                outbid.deposit = 0;
+            }
+            a.secondHighestBid = a.highestBid;
+            a.highestBid = _value;
+            a.highestBidder = _bidder;
+        } else {
+            if (_value > a.secondHighestBid) {
+                a.secondHighestBid = _value;
+            }
+            // A losing bid is refundable straight away
+            pendingReturns[bidToCheck.payer] += bidToCheck.deposit;
+            bidToCheck.deposit = 0;
+        }
+
+        emit BidRevealed(_auctionId, _bidder, _value);
+    }
+
+    // Swap-and-pop removal from openAuctionIds
+    function _removeOpen(uint256 _auctionId) internal {
+        uint256 index = openIndex[_auctionId] - 1;
+        uint256 lastId = openAuctionIds[openAuctionIds.length - 1];
+        openAuctionIds[index] = lastId;
+        openIndex[lastId] = index + 1;
+        openAuctionIds.pop();
+        delete openIndex[_auctionId];
+    }
+
+    // --- State Changing Functions ---
+
+    // Start a new auction; the caller is its seller. Returns the new auction's ID.
+    function startAuction(uint256 _energyAmount) external returns (uint256 auctionId) {
+        auctionId = ++auctionCount;
+        Auction storage a = auctions[auctionId];
+        a.seller = msg.sender;
+        a.energyAmount = _energyAmount;
+        a.biddingStart = block.timestamp;
+        a.biddingEnd = a.biddingStart + biddingDuration;
+        a.revealEnd = a.biddingEnd + revealDuration;
+
+        openAuctionIds.push(auctionId);
+        openIndex[auctionId] = openAuctionIds.length;
+
+        emit AuctionStarted(auctionId, msg.sender, _energyAmount, a.biddingStart, a.biddingEnd, a.revealEnd);
+    }
+
+    // Place a sealed bid during an auction's bidding phase
+    function bid(uint256 _auctionId, bytes32 _sealedBid)
+        external
+        payable
+        auctionExists(_auctionId)
+        onlyAfter(auctions[_auctionId].biddingStart)
+        onlyBefore(auctions[_auctionId].biddingEnd)
+        auctionNotClosed(_auctionId)
+    {
+        _placeBid(_auctionId, msg.sender, msg.sender, _sealedBid, msg.value);
+    }
+
+    // Let `_operator` bid and reveal for the caller (address(0) revokes)
+    function setOperator(address _operator) external {
+        operatorOf[msg.sender] = _operator;
+        emit OperatorSet(msg.sender, _operator);
+    }
+
+    // Place sealed bids for several houses that authorized the caller; msg.value covers all deposits
+    function batchBid(uint256 _auctionId, address[] calldata _bidders, bytes32[] calldata _sealedBids, uint256[] calldata _deposits)
+        external
+        payable
+        auctionExists(_auctionId)
+        onlyAfter(auctions[_auctionId].biddingStart)
+        onlyBefore(auctions[_auctionId].biddingEnd)
+        auctionNotClosed(_auctionId)
+    {
+        require(_bidders.length == _sealedBids.length && _bidders.length == _deposits.length, "Batch arrays differ in length");
+        uint256 total = 0;
+        for (uint256 i = 0; i < _bidders.length; i++) {
+            require(operatorOf[_bidders[i]] == msg.sender, "Caller is not the operator of this bidder");
+            _placeBid(_auctionId, _bidders[i], msg.sender, _sealedBids[i], _deposits[i]);
+            total += _deposits[i];
+        }
+        require(total == msg.value, "Sent value does not match the sum of deposits");
+
+        emit BatchBid(_auctionId, msg.sender, _bidders.length, total);
+    }
+
+    // Reveal the actual bid value during an auction's reveal phase
+    function reveal(uint256 _auctionId, uint256 _value, string calldata _nonce)
+        external
+        auctionExists(_auctionId)
+        onlyAfter(auctions[_auctionId].biddingEnd)
+        onlyBefore(auctions[_auctionId].revealEnd)
+        auctionNotClosed(_auctionId)
+    {
+        Bid storage bidToCheck = bids[_auctionId][msg.sender];
+        require(bidToCheck.sealedBid != bytes32(0), "No unrevealed bid found for this address");
+
+        require(
+            bidToCheck.sealedBid == keccak256(abi.encodePacked(_value, _nonce)),
+            "Invalid bid reveal: Hash mismatch"
+        );
+        require(bidToCheck.deposit >= _value, "Deposit is less than revealed bid value");
+
+        _applyReveal(_auctionId, msg.sender, _value);
+    }
+
+    // Reveal bids placed through batchBid. Entries that do not open their bid are skipped
+    // (RevealSkipped) rather than reverting, so one bad entry cannot lose the whole batch.
+    function batchReveal(uint256 _auctionId, address[] calldata _bidders, uint256[] calldata _values, string[] calldata _nonces)
+        external
+        auctionExists(_auctionId)
+        onlyAfter(auctions[_auctionId].biddingEnd)
+        onlyBefore(auctions[_auctionId].revealEnd)
+        auctionNotClosed(_auctionId)
+    {
+        require(_bidders.length == _values.length && _bidders.length == _nonces.length, "Batch arrays differ in length");
+        uint256 revealed = 0;
+        for (uint256 i = 0; i < _bidders.length; i++) {
+            if (bids[_auctionId][_bidders[i]].payer == msg.sender && _revealMatches(_auctionId, _bidders[i], _values[i], _nonces[i])) {
+                _applyReveal(_auctionId, _bidders[i], _values[i]);
+                revealed++;
+            } else {
+                emit RevealSkipped(_auctionId, _bidders[i]);
+            }
+        }
+
+        emit BatchReveal(_auctionId, msg.sender, revealed, _bidders.length - revealed);
+    }
+
+    // Finalize an auction after its reveal phase ends; constant work in the number of bidders
+    function closeAuction(uint256 _auctionId)
+        external
+        auctionExists(_auctionId)
+        onlyAfter(auctions[_auctionId].revealEnd)
+        auctionNotClosed(_auctionId)
+    {
+        Auction storage a = auctions[_auctionId];
+        a.ended = true;
+        _removeOpen(_auctionId);
+
+        address winner = a.highestBidder;
+        uint256 winningPrice = a.secondHighestBid;
+
+        if (winner != address(0)) {
+            // Seller is owed the second price; the rest of the winner's deposit goes back to them
+            Bid storage winningBid = bids[_auctionId][winner];
+            uint256 winnerDeposit = winningBid.deposit;
+            winningBid.deposit = 0;
+            pendingReturns[a.seller] += winningPrice;
+            pendingReturns[winningBid.payer] += winnerDeposit - winningPrice;
+        } else {
+            winningPrice = 0;
+        }
+
+        emit AuctionClosed(_auctionId, winner, winningPrice, a.energyAmount);
+    }
+
+    // Move `_bidder`'s unrevealed deposit of a closed auction to whoever paid it; anyone may call
+    function reclaim(uint256 _auctionId, address _bidder) external auctionExists(_auctionId) auctionIsClosed(_auctionId) {
+        Bid storage unrevealed = bids[_auctionId][_bidder];
+        uint256 amount = unrevealed.deposit;
+        require(amount > 0, "Nothing to reclaim in this auction");
+        unrevealed.deposit = 0;
+        pendingReturns[unrevealed.payer] += amount;
+    }
+
+    // Pay out everything owed to the caller across all auctions
+    function withdraw() external returns (uint256 amount) {
+        amount = pendingReturns[msg.sender];
+        if (amount > 0) {
+            // Zero before sending (Checks-Effects-Interactions pattern)
+            pendingReturns[msg.sender] = 0;
+            (bool success, ) = payable(msg.sender).call{value: amount}("");
+            require(success, "Withdrawal failed");
+            emit Withdrawal(msg.sender, amount);
+        }
+    }
+
+    // Change the durations used by auctions started from now on
+    function setDurations(uint256 _newBiddingDuration, uint256 _newRevealDuration) external {
+        require(msg.sender == owner, "Only the owner can change durations");
+        biddingDuration = _newBiddingDuration;
+        revealDuration = _newRevealDuration;
+        emit DurationsChanged(_newBiddingDuration, _newRevealDuration);
+    }
+}
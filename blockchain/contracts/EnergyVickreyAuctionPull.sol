@@ -0,0 +1,296 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.13;
+
+// Vickrey auction with the same interface as EnergyVickreyAuction, but with O(1)
+// bidder bookkeeping and withdraw-pattern refunds: closeAuction never loops over
+// bidders, and a bidder that cannot receive ETH only blocks its own withdrawal.
+contract EnergyVickreyAuctionPull {
+    struct Bid {
+        bytes32 sealedBid;
+        uint256 deposit; // Amount sent with the bid transaction, until revealed/settled
+        uint256 round;   // Round the bid was placed in; membership test for the current round
+    }
+
+    address public seller;
+    uint256 public biddingStart;
+    uint256 public biddingEnd;
+    uint256 public revealEnd;
+    bool public ended; // Tracks if the auction has been finalized by closeAuction
+    uint256 public biddingDuration; // Can be updated by resetAuction
+    uint256 public revealDuration;  // Can be updated by resetAuction
+
+    uint256 public round; // Incremented by startAuction; bids from older rounds are settled lazily
+    mapping(address => Bid) public bids;
+    mapping(uint256 => address[]) private roundBidders; // Bidders per round, for the read functions only
+    mapping(address => uint256) public pendingReturns;  // Refunds and seller proceeds, claimed by withdraw()
+
+    address public highestBidder;
+    uint256 public highestBid;     // Highest revealed value
+    uint256 public secondHighestBid; // Second highest revealed value
+
+    uint256 public energyAmount; // Amount of energy being auctioned in the current/last round
+
+    // Everything the off-chain agents track, returned by getAuctionSnapshot in one call
+    struct AuctionSnapshot {
+        uint256 blockNumber; // Block the snapshot was read at
+        address seller;
+        uint256 biddingStart;
+        uint256 biddingEnd;
+        uint256 revealEnd;
+        bool ended;
+        uint256 biddingDuration;
+        uint256 revealDuration;
+        uint256 energyAmount;
+        address highestBidder;
+        uint256 highestBid;
+        uint256 secondHighestBid;
+        address[] bidders;
+        uint256[] deposits;
+    }
+
+    // --- Events ---
+    event AuctionStarted(address indexed seller, uint256 energyAmount, uint256 biddingEnd, uint256 revealEnd);
+    event BidPlaced(address indexed bidder, uint256 deposit);
+    event BidRevealed(address indexed bidder, uint256 value);
+    event AuctionClosed(address winner, uint256 winningPrice, uint256 energyAmount);
+    event AuctionReset(uint256 newBiddingDuration, uint256 newRevealDuration);
+    event Withdrawal(address indexed account, uint256 amount);
+
+    // --- Modifiers ---
+    modifier onlyBefore(uint256 _time) {
+        require(block.timestamp < _time, "Auction phase has ended");
+        _;
+    }
+
+    modifier onlyAfter(uint256 _time) {
+        require(block.timestamp >= _time, "Auction phase has not started yet");
+        _;
+    }
+
+    modifier auctionNotClosed() {
+        require(!ended, "Auction already closed");
+        _;
+    }
+
+    modifier auctionIsClosed() {
+        require(ended, "Auction must be closed first");
+        _;
+    }
+
+    modifier onlySeller() {
+        require(msg.sender == seller, "Only the current seller can perform this action");
+        _;
+    }
+
+    // --- Constructor ---
+    constructor(uint256 _biddingDuration, uint256 _revealDuration) {
+        seller = msg.sender; // Initial seller is deployer
+        biddingDuration = _biddingDuration;
+        revealDuration = _revealDuration;
+        biddingStart = 0; // No auction active initially
+        ended = true; // Start in an ended state, requiring startAuction
+    }
+
+    // --- Read Functions ---
+    function getBidders() external view returns (address[] memory) {
+        return roundBidders[round];
+    }
+
+    function getBidDeposits() external view returns (address[] memory, uint256[] memory) {
+        address[] memory bidders = roundBidders[round];
+        uint256[] memory deposits = new uint256[](bidders.length);
+        for (uint256 i = 0; i < bidders.length; i++) {
+            deposits[i] = bids[bidders[i]].deposit;
+        }
+        return (bidders, deposits);
+    }
+
+    function getAuctionSnapshot() external view returns (AuctionSnapshot memory snapshot) {
+        snapshot.blockNumber = block.number;
+        snapshot.seller = seller;
+        snapshot.biddingStart = biddingStart;
+        snapshot.biddingEnd = biddingEnd;
+        snapshot.revealEnd = revealEnd;
+        snapshot.ended = ended;
+        snapshot.biddingDuration = biddingDuration;
+        snapshot.revealDuration = revealDuration;
+        snapshot.energyAmount = energyAmount;
+        snapshot.highestBidder = highestBidder;
+        snapshot.highestBid = highestBid;
+        snapshot.secondHighestBid = secondHighestBid;
+        snapshot.bidders = roundBidders[round];
+        snapshot.deposits = new uint256[](snapshot.bidders.length);
+        for (uint256 i = 0; i < snapshot.bidders.length; i++) {
+            snapshot.deposits[i] = bids[snapshot.bidders[i]].deposit;
+        }
+    }
+
+    // Amount withdraw() would pay `_account` right now
+    function refundableAmount(address _account) external view returns (uint256) {
+        return pendingReturns[_account] + _settledDeposit(_account);
+    }
+
+    // --- Internal Helpers ---
+
+    // Deposit of a bid whose round is over and that was never revealed (or was
+    // outbid after revealing it is already in pendingReturns). The current highest
+    // bidder's deposit stays locked until closeAuction settles it.
+    function _settledDeposit(address _bidder) internal view returns (uint256) {
+        Bid storage b = bids[_bidder];
+        if (b.deposit == 0 || (b.round == round && !ended)) {
+            return 0;
+        }
+        return b.deposit;
+    }
+
+    function _settle(address _bidder) internal {
+        uint256 amount = _settledDeposit(_bidder);
+        if (amount > 0) {
+            bids[_bidder].deposit = 0;
+            pendingReturns[_bidder] += amount;
+        }
+    }
+
+    // --- State Changing Functions ---
+
+    // Start a new auction round (can only be called after closeAuction)
+    function startAuction(uint256 _energyAmount) external auctionIsClosed {
+        // A new round number invalidates every earlier bid without touching them
+        round += 1;
+        highestBidder = address(0);
+        highestBid = 0;
+        secondHighestBid = 0;
+
+        // Set new auction parameters
+        seller = msg.sender; // The caller of startAuction becomes the seller for this round
+        energyAmount = _energyAmount;
+        biddingStart = block.timestamp;
+        biddingEnd = biddingStart + biddingDuration;
+        revealEnd = biddingEnd + revealDuration;
+        ended = false;
+
+        emit AuctionStarted(seller, energyAmount, biddingEnd, revealEnd);
+    }
+
+    // Place a sealed bid during the bidding phase
+    function bid(bytes32 _sealedBid)
+        external
+        payable
+        onlyAfter(biddingStart)
+        onlyBefore(biddingEnd)
+        auctionNotClosed
+    {
+        require(bids[msg.sender].round != round, "Bidder has already placed a bid this round");
+        require(msg.value > 0, "Deposit must be greater than 0");
+
+        // Move an unclaimed deposit from an earlier round to pendingReturns before overwriting it
+        _settle(msg.sender);
+
+        bids[msg.sender] = Bid({
+            sealedBid: _sealedBid,
+            deposit: msg.value,
+            round: round
+        });
+        roundBidders[round].push(msg.sender);
+
+        emit BidPlaced(msg.sender, msg.value);
+    }
+
+    // Reveal the actual bid value during the reveal phase
+    function reveal(uint256 _value, string calldata _nonce)
+        external
+        onlyAfter(biddingEnd)
+        onlyBefore(revealEnd)
+        auctionNotClosed
+    {
+        Bid storage bidToCheck = bids[msg.sender];
+        require(bidToCheck.round == round && bidToCheck.sealedBid != bytes32(0), "No unrevealed bid found for this address");
+
+        require(
+            bidToCheck.sealedBid == keccak256(abi.encodePacked(_value, _nonce)),
+            "Invalid bid reveal: Hash mismatch"
+        );
+        require(bidToCheck.deposit >= _value, "Deposit is less than revealed bid value");
+
+        // Mark bid as revealed by clearing sealedBid (prevents double reveal)
+        bidToCheck.sealedBid = bytes32(0);
+
+        if (_value > highestBid) {
+            // The previous leader can no longer win; release their deposit
+            if (highestBidder != address(0)) {
+                pendingReturns[highestBidder] += bids[highestBidder].deposit;
+                bids[highestBidder].deposit = 0;
+            }
+            secondHighestBid = highestBid;
+            highestBid = _value;
+            highestBidder = msg.sender;
+        } else {
+            if (_value > secondHighestBid) {
+                secondHighestBid = _value;
+            }
+            // A losing bid is refundable straight away
+            pendingReturns[msg.sender] += bidToCheck.deposit;
+            bidToCheck.deposit = 0;
+        }
+
+        emit BidRevealed(msg.sender, _value);
+    }
+
+    // Finalize the auction after the reveal phase ends; constant work in the number of bidders
+    function closeAuction()
+        external
+        onlyAfter(revealEnd)
+        auctionNotClosed
+    {
+        ended = true;
+
+        address winner = highestBidder;
+        uint256 winningPrice = secondHighestBid;
+
+        if (winner != address(0)) {
+            // Seller is owed the second price; the rest of the winner's deposit goes back to them
+            uint256 winnerDeposit = bids[winner].deposit;
+            bids[winner].deposit = 0;
+            pendingReturns[seller] += winningPrice;
+            pendingReturns[winner] += winnerDeposit - winningPrice;
+        } else {
+            winningPrice = 0;
+        }
+        // Unrevealed deposits are claimed by their owners through withdraw()
+
+        emit AuctionClosed(winner, winningPrice, energyAmount);
+
+        biddingStart = 0;
+    }
+
+    // Pay out everything owed to the caller: refunds, seller proceeds and unrevealed deposits
+    function withdraw() external returns (uint256 amount) {
+        _settle(msg.sender);
+        amount = pendingReturns[msg.sender];
+        if (amount > 0) {
+            // Zero before sending (Checks-Effects-Interactions pattern)
+            pendingReturns[msg.sender] = 0;
+            (bool success, ) = payable(msg.sender).call{value: amount}("");
+            require(success, "Withdrawal failed");
+            emit Withdrawal(msg.sender, amount);
+        }
+    }
+
+    // Reset auction parameters (can be called only by the seller of the *last* round)
+    function resetAuction(uint256 _newBiddingDuration, uint256 _newRevealDuration)
+        external
+        onlySeller
+        auctionIsClosed
+    {
+        biddingDuration = _newBiddingDuration;
+        revealDuration = _newRevealDuration;
+        biddingStart = 0;
+
+        highestBidder = address(0);
+        highestBid = 0;
+        secondHighestBid = 0;
+        // Bids of the closed round stay until their owners withdraw or bid again
+
+        emit AuctionReset(_newBiddingDuration, _newRevealDuration);
+    }
+}
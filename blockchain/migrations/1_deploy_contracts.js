@@ -1,6 +1,9 @@
 const fs = require('fs');
 const path = require('path');
-const EnergyVickreyAuction = artifacts.require("EnergyVickreyAuction");
+// Set AUCTION_CONTRACT=EnergyVickreyAuctionPull (withdraw refunds) or
+// EnergyVickreyAuctionMulti (concurrent auctions keyed by ID) to deploy a variant
+const contractName = process.env.AUCTION_CONTRACT || "EnergyVickreyAuction";
+const EnergyVickreyAuction = artifacts.require(contractName);
 
 module.exports = async function (deployer, network, accounts) {
     // --- Configuration ---
@@ -9,7 +12,7 @@ module.exports = async function (deployer, network, accounts) {
     const nextRoundDelay = 2; // Time in seconds
     //const deployGas = 6000000; // Gas limit for deployment
 
-    console.log(`Deploying EnergyVickreyAuction with biddingTime=${biddingTime}, revealTime=${revealTime}...`);
+    console.log(`Deploying ${contractName} with biddingTime=${biddingTime}, revealTime=${revealTime}...`);
 
     try {
         // --- Deployment ---
@@ -21,7 +24,7 @@ module.exports = async function (deployer, network, accounts) {
         );
         const instance = await EnergyVickreyAuction.deployed();
         const contractAddress = instance.address;
-        console.log(`✅ EnergyVickreyAuction deployed successfully at: ${contractAddress}`);
+        console.log(`✅ ${contractName} deployed successfully at: ${contractAddress}`);
 
         // --- Overwrite .env file ---
         // Calculate path ONCE
@@ -30,6 +33,7 @@ module.exports = async function (deployer, network, accounts) {
         // Define the exact content for the new .env file
         const newEnvContent = [
             `CONTRACT_ADDRESS=${contractAddress}`,
+            `CONTRACT_NAME=${contractName}`,
             `BIDDING_TIME=${biddingTime}`,
             `REVEAL_TIME=${revealTime}`,
             `NEXT_ROUND_DELAY=${nextRoundDelay}`,
@@ -0,0 +1,103 @@
+const EnergyVickreyAuctionMulti = artifacts.require("EnergyVickreyAuctionMulti");
+
+// batchBid/batchReveal against one bid and one reveal per house: same outcome, fewer transactions.
+// Run with: truffle test test/auctionBatch.js
+const PHASE_SECONDS = 3600; // Long phases; the test moves the clock itself
+
+function rpc(method, params = []) {
+  return new Promise((resolve, reject) => {
+    web3.currentProvider.send({ jsonrpc: "2.0", method, params, id: Date.now() }, (err, res) => (err ? reject(err) : resolve(res.result)));
+  });
+}
+
+async function advanceTime(seconds) {
+  await rpc("evm_increaseTime", [seconds]);
+  await rpc("evm_mine");
+}
+
+function sealedBid(value, nonce) {
+  return web3.utils.soliditySha3({ type: "uint256", value }, { type: "string", value: nonce });
+}
+
+const sum = (values) => values.reduce((a, b) => a.add(web3.utils.toBN(b)), web3.utils.toBN(0)).toString();
+
+contract("EnergyVickreyAuctionMulti batch bids", (accounts) => {
+  const seller = accounts[0];
+  const operator = accounts[1];
+  const houses = accounts.slice(2, 7);
+  const step = web3.utils.toBN(web3.utils.toWei("0.001", "ether"));
+  const values = houses.map((_, i) => step.muln(i + 1).toString());
+  const nonces = houses.map((_, i) => `house${i}`);
+  let auction;
+
+  beforeEach(async () => {
+    auction = await EnergyVickreyAuctionMulti.new(PHASE_SECONDS, PHASE_SECONDS, { from: seller });
+  });
+
+  async function startAuction() {
+    const { logs } = await auction.startAuction(5, { from: seller });
+    return logs[0].args.auctionId;
+  }
+
+  it("rejects bids for houses that did not authorize the operator", async () => {
+    const auctionId = await startAuction();
+    try {
+      await auction.batchBid(auctionId, [houses[0]], [sealedBid(values[0], nonces[0])], [values[0]], { from: operator, value: values[0] });
+      assert.fail("batchBid accepted an unauthorized house");
+    } catch (error) {
+      assert.include(error.message, "Caller is not the operator of this bidder");
+    }
+  });
+
+  it("settles a batched auction like individual bids, with refunds to the operator", async () => {
+    await Promise.all(houses.map((house) => auction.setOperator(operator, { from: house })));
+    const auctionId = await startAuction();
+
+    const bid = await auction.batchBid(auctionId, houses, values.map((v, i) => sealedBid(v, nonces[i])), values, { from: operator, value: sum(values) });
+    assert.deepEqual(bid.logs.filter((log) => log.event === "BidPlaced").map((log) => log.args.bidder), houses);
+
+    await advanceTime(PHASE_SECONDS);
+    // A wrong nonce is skipped without reverting the other reveals
+    const badNonces = nonces.map((nonce, i) => (i === 0 ? "wrong" : nonce));
+    const reveal = await auction.batchReveal(auctionId, houses, values, badNonces, { from: operator });
+    assert.equal(reveal.logs.filter((log) => log.event === "BidRevealed").length, houses.length - 1);
+    assert.equal(reveal.logs.find((log) => log.event === "RevealSkipped").args.bidder, houses[0]);
+
+    await advanceTime(PHASE_SECONDS);
+    const close = await auction.closeAuction(auctionId, { from: seller });
+    const closed = close.logs.find((log) => log.event === "AuctionClosed").args;
+    assert.equal(closed.winner, houses[houses.length - 1]);
+    assert.equal(closed.winningPrice.toString(), values[values.length - 2]);
+
+    await auction.reclaim(auctionId, houses[0], { from: seller });
+    // Every deposit but the second price comes back to the operator
+    const owed = web3.utils.toBN(sum(values)).sub(web3.utils.toBN(values[values.length - 2]));
+    assert.equal((await auction.refundableAmount(operator)).toString(), owed.toString());
+    for (const house of houses) {
+      assert.equal((await auction.refundableAmount(house)).toString(), "0");
+    }
+  });
+
+  it("uses less gas than one transaction per house", async () => {
+    await Promise.all(houses.map((house) => auction.setOperator(operator, { from: house })));
+    const single = await startAuction();
+    const batched = await startAuction();
+
+    const bids = await Promise.all(houses.map((house, i) =>
+      auction.bid(single, sealedBid(values[i], nonces[i]), { from: house, value: values[i] })));
+    const batchBid = await auction.batchBid(batched, houses, values.map((v, i) => sealedBid(v, nonces[i])), values, { from: operator, value: sum(values) });
+
+    await advanceTime(PHASE_SECONDS);
+    const reveals = await Promise.all(houses.map((house, i) =>
+      auction.reveal(single, values[i], nonces[i], { from: house })));
+    const batchReveal = await auction.batchReveal(batched, houses, values, nonces, { from: operator });
+
+    const total = (receipts) => receipts.reduce((gas, { receipt }) => gas + receipt.gasUsed, 0);
+    console.table([
+      { mode: "per house", transactions: bids.length + reveals.length, "bid gas": total(bids), "reveal gas": total(reveals) },
+      { mode: "batched", transactions: 2, "bid gas": batchBid.receipt.gasUsed, "reveal gas": batchReveal.receipt.gasUsed }
+    ]);
+    assert.isBelow(batchBid.receipt.gasUsed, total(bids));
+    assert.isBelow(batchReveal.receipt.gasUsed, total(reveals));
+  });
+});
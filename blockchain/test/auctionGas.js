@@ -0,0 +1,133 @@
+const EnergyVickreyAuction = artifacts.require("EnergyVickreyAuction");
+const EnergyVickreyAuctionPull = artifacts.require("EnergyVickreyAuctionPull");
+
+// Gas per bid / reveal / close / withdraw for the push-refund contract and the
+// pull-refund variant, at increasing numbers of bidders.
+// Run with: truffle test test/auctionGas.js
+const BIDDER_COUNTS = [10, 100, 500];
+const PHASE_SECONDS = 3600; // Long phases; the test moves the clock itself
+
+function rpc(method, params = []) {
+  return new Promise((resolve, reject) => {
+    web3.currentProvider.send({ jsonrpc: "2.0", method, params, id: Date.now() }, (err, res) => (err ? reject(err) : resolve(res.result)));
+  });
+}
+
+async function advanceTime(seconds) {
+  await rpc("evm_increaseTime", [seconds]);
+  await rpc("evm_mine");
+}
+
+// Fresh locally-signed accounts, funded from `funder` with enough for the largest deposit
+// plus a push-variant bid late in a 500-bidder round (over 1M gas)
+async function createBidders(count, funder) {
+  const bidders = [];
+  for (let i = 0; i < count; i++) {
+    const account = web3.eth.accounts.create();
+    web3.eth.accounts.wallet.add(account);
+    bidders.push(account.address);
+  }
+  await Promise.all(bidders.map((bidder) => web3.eth.sendTransaction({ from: funder, to: bidder, value: web3.utils.toWei("0.1", "ether") })));
+  return bidders;
+}
+
+function sealedBid(value, nonce) {
+  return web3.utils.soliditySha3({ type: "uint256", value }, { type: "string", value: nonce });
+}
+
+async function runRound(Auction, bidders, seller) {
+  const instance = await Auction.new(PHASE_SECONDS, PHASE_SECONDS, { from: seller });
+  const contract = new web3.eth.Contract(Auction.abi, instance.address);
+  await instance.startAuction(5, { from: seller });
+
+  const step = web3.utils.toBN(web3.utils.toWei("0.00005", "ether"));
+  const values = bidders.map((_, i) => step.muln(i + 1).toString());
+  const nonces = bidders.map((_, i) => `house${i}`);
+  const gas = { bid: [], failedBids: 0, reveal: [], close: null, withdraw: 0 };
+
+  // One bid at a time: the push variant's bid scans every earlier bidder, so its gas has to be
+  // estimated against the bids already mined. This also keeps gas.bid in mining order.
+  const placed = [];
+  for (const [i, bidder] of bidders.entries()) {
+    const bid = contract.methods.bid(sealedBid(values[i], nonces[i]));
+    try {
+      const estimate = await bid.estimateGas({ from: bidder, value: values[i] });
+      const receipt = await bid.send({ from: bidder, value: values[i], gas: Math.ceil(estimate * 1.2) });
+      gas.bid.push(receipt.gasUsed);
+      placed.push(i);
+    } catch (error) {
+      gas.failedBids += 1;
+      console.log(`      ${Auction.contractName}: bid ${i + 1} of ${bidders.length} failed (${error.message})`);
+    }
+  }
+
+  // Reveal gas does not depend on the number of bidders, so the reveals can go out at once
+  await advanceTime(PHASE_SECONDS);
+  const reveals = await Promise.all(placed.map((i) =>
+    contract.methods.reveal(values[i], nonces[i]).send({ from: bidders[i], gas: 500000 })));
+  gas.reveal = reveals.map((receipt) => receipt.gasUsed);
+
+  await advanceTime(PHASE_SECONDS);
+  const { gasLimit } = await web3.eth.getBlock("latest");
+  try {
+    const close = await instance.closeAuction({ from: seller, gas: gasLimit });
+    gas.close = close.receipt.gasUsed;
+  } catch (error) {
+    // The push variant refunds every bidder inside closeAuction and can outgrow the block
+    console.log(`      ${Auction.contractName}: closeAuction failed with ${bidders.length} bidders (${error.message})`);
+  }
+
+  if (Auction.abi.some((item) => item.name === "withdraw")) {
+    const withdrawals = await Promise.all([seller, ...bidders].map((account) =>
+      contract.methods.withdraw().send({ from: account, gas: 200000 })));
+    gas.withdraw = withdrawals.reduce((total, receipt) => total + receipt.gasUsed, 0);
+    assert.equal(await web3.eth.getBalance(instance.address), "0", "Deposits left in the contract after every withdrawal");
+  }
+  return gas;
+}
+
+const mean = (values) => Math.round(values.reduce((a, b) => a + b, 0) / values.length);
+
+contract("EnergyVickreyAuction gas", (accounts) => {
+  const results = {};
+
+  it("measures bid and close gas for both variants", async function () {
+    this.timeout(0);
+    const seller = accounts[0];
+    for (const count of BIDDER_COUNTS) {
+      // New bidders per contract, so both start from untouched storage, each set funded from
+      // a different account so the largest rounds do not drain one
+      for (const Auction of [EnergyVickreyAuction, EnergyVickreyAuctionPull]) {
+        const funder = accounts[1 + Object.keys(results).length];
+        const bidders = await createBidders(count, funder);
+        results[`${Auction.contractName}/${count}`] = await runRound(Auction, bidders, seller);
+      }
+    }
+
+    const rows = [];
+    for (const count of BIDDER_COUNTS) {
+      for (const Auction of [EnergyVickreyAuction, EnergyVickreyAuctionPull]) {
+        const gas = results[`${Auction.contractName}/${count}`];
+        rows.push({
+          contract: Auction.contractName,
+          bidders: count,
+          "mean bid": mean(gas.bid),
+          "last bid": gas.bid[gas.bid.length - 1],
+          "failed bids": gas.failedBids,
+          "mean reveal": mean(gas.reveal),
+          close: gas.close === null ? "failed" : gas.close,
+          "withdraw (all)": gas.withdraw
+        });
+      }
+    }
+    console.table(rows);
+  });
+
+  it("keeps bid and close gas flat in the pull variant", async () => {
+    const small = results[`EnergyVickreyAuctionPull/${BIDDER_COUNTS[0]}`];
+    const large = results[`EnergyVickreyAuctionPull/${BIDDER_COUNTS[BIDDER_COUNTS.length - 1]}`];
+    assert.equal(large.failedBids, 0, "bids failed in the pull variant");
+    assert.equal(large.close, small.close, "closeAuction gas depends on the number of bidders");
+    assert.isAtMost(Math.max(...large.bid), Math.max(...small.bid), "bid gas grows with the number of bidders");
+  });
+});
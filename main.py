@@ -9,7 +9,7 @@ from agents.negotiation import NegotiationAgent
 from agents.prediction import PredictionAgent
 from agents.gui import GUIAgent
 from agents.grid import Grid
-from agents.house import House
+from agents.house import House, HouseFleet
 
 def start_spade():
     print("🟡 Starting SPADE server in a new PowerShell window...")
@@ -101,6 +101,9 @@ async def main():
     negotiation_agent = NegotiationAgent("negotiation@localhost", "password")
     prediction_agent = PredictionAgent("prediction@localhost", "password")
     facilitating_agent = FacilitatingAgent("facilitating@localhost", "password")
+    # Optional vectorized neighbourhood, e.g. FLEET_SIZE=1000 simulates a thousand homes in one agent
+    fleet_size = int(os.getenv("FLEET_SIZE", "0"))
+    fleet = HouseFleet("fleet@localhost", "password", size=fleet_size) if fleet_size > 0 else None
 
     await gui.start()
     await house.start()
@@ -110,6 +113,8 @@ async def main():
     await negotiation_agent.start()
     await prediction_agent.start()
     await facilitating_agent.start()
+    if fleet is not None:
+        await fleet.start()
     print("✅ All agents started!")
 
 if __name__ == "__main__":
@@ -6,6 +6,9 @@ import os
 from datetime import datetime
 from dotenv import load_dotenv
 from math import sin
+from agents.auctionState import start_mirror, auction_args, has_function, create_sealed_bid
+from agents.transactions import TransactionManager
+from agents.bidAggregator import BidAggregator
 
 # Load contract address dynamically
 project_dir = os.path.dirname(os.path.dirname(__file__))  # Correct path logic
@@ -14,33 +17,28 @@ env_path = os.path.join(project_dir, "5014-Project", "blockchain", ".env")
 
 load_dotenv(env_path)  # Ensure .env is loaded from the correct location
 
-# Function to create a sealed bid hash
-def create_sealed_bid(value, nonce):
-    # Change to match contract's keccak256(abi.encodePacked()) format
-    encoded = Web3.solidity_keccak(['uint256', 'string'], [int(value), str(nonce)])
-    return encoded
-
-def start_auction(auctioneer, auction_contract, web3, energy_amount=5):
-    # Wait for the last auction to end and then start a new one
-    try: 
-        auction_started = auction_contract.functions.biddingStart().call()
-    except Exception as e:
-        print(e)
-        input("Press Enter to Exit...")
-    
-    while auction_started != 0:
-        auction_started = auction_contract.functions.biddingStart().call()
+def start_auction(auctioneer, auction_contract, web3, energy_amount=5, mirror=None, transactions=None):
+    # Returns the new auction's ID (None on the single-auction contract)
+    if not mirror.concurrent:
+        # Wait for the last auction to end and then start a new one (woken by the mirror's
+        # AuctionClosed/AuctionReset events instead of polling biddingStart)
+        mirror.wait_for(lambda auction: auction.bidding_start == 0)
     
     # Once auction_started is 0 start the auction
     bidding_duration = int(os.getenv("BIDDING_TIME")) 
     reveal_duration = int(os.getenv("REVEAL_TIME"))  
-    tx = auction_contract.functions.startAuction(int(energy_amount)).transact({
+    receipt = transactions.transact(auction_contract.functions.startAuction(int(energy_amount)), {
         'from': auctioneer,
         'gas': 3000000,
         'gasPrice': web3.to_wei('20', 'gwei')
     })
-    web3.eth.wait_for_transaction_receipt(tx)
-    print(f"Auction started with bidding duration {bidding_duration} and reveal duration {reveal_duration}!")
+    auction_id = None
+    if mirror.concurrent:
+        auction_id = auction_contract.events.AuctionStarted().process_receipt(receipt)[0]["args"]["auctionId"]
+        print(f"Auction #{auction_id} started with bidding duration {bidding_duration} and reveal duration {reveal_duration}!")
+    else:
+        print(f"Auction started with bidding duration {bidding_duration} and reveal duration {reveal_duration}!")
+    return auction_id
 
 def wait_until(end_timestamp):
     end_datetime = datetime.fromtimestamp(end_timestamp)
@@ -53,37 +51,46 @@ def wait_until(end_timestamp):
         print(f'Time Until Continue: {diff}')
         time.sleep(diff / 2)
 
-def wait_until_timeout(end_timestamp, auction_contract):
-    countdown = 3
-    while countdown > 0 and end_timestamp == 0:
-        print(f"Countdown: {countdown}")
-        if end_timestamp == 0:
-            time.sleep(3)
-            end_timestamp = auction_contract.functions.biddingStart().call()
-        countdown -= 1
-
-    if countdown == end_timestamp:
-        return True
-
-    wait_until(end_timestamp)
+def open_for_bidding(mirror, seller):
+    # IDs of auctions held by someone other than `seller` whose bidding phase is still open
+    now = time.time()
+    return [
+        auction_id for auction_id in mirror.open_auction_ids()
+        if mirror.auction(auction_id).seller != seller and mirror.auction(auction_id).bidding_end > now
+    ]
+
+def wait_until_timeout(mirror, seller, timeout=9):
+    # Give the other party up to `timeout` seconds to start an auction; returns the IDs
+    # of the auctions that are open for bidding (empty if none was started)
+    if not mirror.wait_for(lambda m: open_for_bidding(m, seller), timeout):
+        return []
+
+    auction_ids = open_for_bidding(mirror, seller)
+    wait_until(mirror.auction(auction_ids[0]).bidding_start)
     
-    return False
+    return auction_ids
     
 
 # Function to run a full auction round
-def run_auction_round(bidders, auction_contract, auctioneer, web3, auction_holder=True, energy_amount=5):
+def run_auction_round(bidders, auction_contract, auctioneer, web3, auction_holder=True, energy_amount=5, mirror=None, transactions=None, aggregator=None):
     print("Running new auction round...")
 
     if auction_holder:
         # Start the auction (if not started)
-        start_auction(auctioneer, auction_contract, web3, energy_amount)
-
-    # Step 2: Wait for the bidding phase to open
-    bidding_start = auction_contract.functions.biddingStart().call()
-    flag = wait_until_timeout(bidding_start, auction_contract)
-    if flag:
-        start_auction(auctioneer, auction_contract, web3, energy_amount)
-    print(f"Bidding phase starts at block time: {datetime.fromtimestamp(bidding_start)}")
+        auction_id = start_auction(auctioneer, auction_contract, web3, energy_amount, mirror, transactions)
+    else:
+        # Step 2: Bid in the other party's auction, or hold one if none starts in time
+        auction_ids = wait_until_timeout(mirror, auctioneer)
+        if auction_ids:
+            auction_id = auction_ids[0]
+        else:
+            auction_id = start_auction(auctioneer, auction_contract, web3, energy_amount, mirror, transactions)
+    mirror.wait_for(lambda m: m.auction(auction_id) is not None and m.auction(auction_id).bidding_start != 0)
+    # Every read below is of this one auction (the mirror itself on the single-auction contract).
+    # A resync replaces the mirror's auction objects, so it is looked up again after each wait.
+    auction = mirror.auction(auction_id)
+    bidding_start = auction.bidding_start
+    print(f"Bidding phase of auction {auction_id} starts at block time: {datetime.fromtimestamp(bidding_start)}")
 
     # Step 3: Bidders place sealed bids
     bid_values = [web3.to_wei(0.01, "ether"), web3.to_wei(0.02, "ether"), web3.to_wei(0.015, "ether"), web3.to_wei(0.025, "ether")]
@@ -91,59 +98,81 @@ def run_auction_round(bidders, auction_contract, auctioneer, web3, auction_holde
 
     sealed_bids = [create_sealed_bid(bid_values[i], nonces[i]) for i in range(len(bid_values))]
 
-    bid_delay = int(os.getenv("NEXT_ROUND_DELAY"))  # Configurable delay, default to 5 seconds
-
-    for i, bidder in enumerate(bidders):
+    # Submit every bid back-to-back, then wait for the receipts together
+    pending = {}
+    if aggregator is not None:
+        # The operator bids for all houses in one transaction per batch
+        for i, bidder in enumerate(bidders):
+            aggregator.add(auction_id, bidder, bid_values[i], nonces[i])
+        for bidder in aggregator.submit_bids(auction_id):
+            print(f"Bid placed for {bidder} by operator {aggregator.operator}")
+    else:
+        for i, bidder in enumerate(bidders):
+            try:
+                pending[bidder] = transactions.submit(auction_contract.functions.bid(*auction_args(auction_id), sealed_bids[i]), {
+                    "from": bidder,
+                    "value": bid_values[i],
+                    "gas": 3000000
+                })
+            except Exception as e:
+                print(f"Failed to place bid for {bidder}: {e}")
+
+    for bidder, receipt in pending.items():
         try:
-            tx = auction_contract.functions.bid(sealed_bids[i]).transact({
-                "from": bidder,
-                "value": bid_values[i],
-                "gas": 3000000
-            })
-            web3.eth.wait_for_transaction_receipt(tx)
+            receipt.result()
             print(f"Bid placed by {bidder}")
         except Exception as e:
             print(f"Failed to place bid for {bidder}: {e}")
 
-        # Delay between bids
-        time.sleep(bid_delay)
-
     print("Bids submitted! Moving to reveal phase...")
 
     # Step 4: Wait for the reveal phase to open
-    reveal_start = auction_contract.functions.biddingEnd().call()
+    auction = mirror.auction(auction_id)
+    reveal_start = auction.bidding_end
     print(f"Reveal phase starts at block time: {datetime.fromtimestamp(reveal_start)}")
     wait_until(reveal_start)
     time.sleep(4)  # Additional delay to ensure all bids are submitted
     
-    for i, bidder in enumerate(bidders):
+    pending = {}
+    last_block = mirror.block
+    if aggregator is not None:
+        for bidder in aggregator.reveal_bids(auction_id):
+            print(f"Bid revealed for {bidder}!")
+        last_block = web3.eth.block_number  # The batch receipts are in by now
+    else:
+        for i, bidder in enumerate(bidders):
+            try:
+                pending[bidder] = transactions.submit(auction_contract.functions.reveal(*auction_args(auction_id), bid_values[i], nonces[i]), {
+                    'from': bidder,
+                    "gas": 3000000
+                })
+            except Exception as e:
+                print(f"Failed to reveal bid for {bidder}: {e}")
+
+    for bidder, receipt in pending.items():
         try:
-            tx = auction_contract.functions.reveal(bid_values[i], nonces[i]).transact({
-                'from': bidder,
-                "gas": 3000000
-            })
-            receipt = web3.eth.wait_for_transaction_receipt(tx)
+            last_block = max(last_block, receipt.result().blockNumber)
             print(f"Bid revealed by {bidder}!")
         except Exception as e:
             print(f"Failed to reveal bid for {bidder}: {e}")
     
-    # Calculate winner to display locally
-    winner = auction_contract.functions.highestBidder().call()
-    final_price_wei = auction_contract.functions.secondHighestBid().call()
+    # Calculate winner to display locally, once the mirror has applied the reveals
+    mirror.wait_for_block(last_block, timeout=5)
+    auction = mirror.auction(auction_id)
+    winner = auction.highest_bidder
+    final_price_wei = auction.second_highest_bid
     final_price_eth = web3.from_wei(final_price_wei, "ether")
-    energy = auction_contract.functions.energyAmount().call()
+    energy = auction.energy_amount
     print("Bids revealed!")
-    reveal_end = auction_contract.functions.revealEnd().call()
+    reveal_end = auction.reveal_end
     print(f"Reveal ends at block time: {datetime.fromtimestamp(reveal_end)}")
     wait_until(reveal_end)
 
     # Fetch and display all revealed bids
     print("Fetching all revealed bids...")
-    contract_bidders = auction_contract.functions.getBidders().call()
-    for contract_bidder in contract_bidders:
-        # Access the bid information for each bidder
-        bid_info = auction_contract.functions.bids(contract_bidder).call()
-        bid_amount_wei = bid_info[1]  # Assuming the deposit is the second element in the returned tuple
+    auction = mirror.auction(auction_id)
+    for contract_bidder, bid_amount_wei in auction.deposits.items():
+        # Deposits as recorded by the BidPlaced events of this round
         bid_amount_eth = web3.from_wei(bid_amount_wei, 'ether')
         print(f"Bidder: {contract_bidder}, Bid: {bid_amount_eth} ETH")
 
@@ -152,18 +181,50 @@ def run_auction_round(bidders, auction_contract, auctioneer, web3, auction_holde
     try:
         
         time.sleep(1)  # Additional delay to ensure all bids are submitted
-        tx = auction_contract.functions.closeAuction().transact({
+        transactions.transact(auction_contract.functions.closeAuction(*auction_args(auction_id)), {
             "from": auctioneer,
             "gas": 3000000
         })
-        web3.eth.wait_for_transaction_receipt(tx)
         
         print(f"Auction Winner: {winner} \n Energy: {energy} kWh \n Price: {final_price_eth} ETH")
     except Exception as e:
         print(f"Failed to close auction: {e}")
 
+    refund_accounts = [auctioneer] + list(bidders)
+    if aggregator is not None:
+        aggregator.reclaim(auction_id)
+        refund_accounts.append(aggregator.operator)
+    claim_refunds(refund_accounts, auction_contract, web3, transactions)
+
 
-def reset_auction(auctioneer, auction_contract, web3):
+def claim_refunds(accounts, auction_contract, web3, transactions):
+    # Pull-refund contracts hold deposits and seller proceeds until each account withdraws
+    if not has_function(auction_contract, "withdraw"):
+        return
+    pending = {}
+    for account in accounts:
+        try:
+            amount_wei = auction_contract.functions.refundableAmount(account).call()
+            if amount_wei > 0:
+                pending[account] = (amount_wei, transactions.submit(auction_contract.functions.withdraw(), {
+                    "from": account,
+                    "gas": 3000000
+                }))
+        except Exception as e:
+            print(f"Failed to withdraw refund for {account}: {e}")
+
+    for account, (amount_wei, receipt) in pending.items():
+        try:
+            receipt.result()
+            print(f"Refund of {web3.from_wei(amount_wei, 'ether')} ETH withdrawn by {account}")
+        except Exception as e:
+            print(f"Failed to withdraw refund for {account}: {e}")
+
+
+def reset_auction(auctioneer, auction_contract, web3, transactions):
+    if not has_function(auction_contract, "resetAuction"):
+        # Auctions on the multi-auction contract are independent; there is nothing to reset
+        return
     print("Resetting the auction for the next round...")
 
     # Get the current time (in seconds) to print when the new auction will end
@@ -175,11 +236,10 @@ def reset_auction(auctioneer, auction_contract, web3):
 
     try:
         # Call the resetAuction function with the bidding and reveal time
-        tx_reset = auction_contract.functions.resetAuction(bidding_time, reveal_time).transact({
+        transactions.transact(auction_contract.functions.resetAuction(bidding_time, reveal_time), {
             "from": auctioneer,  # Auctioneer resets
             "gas": 3000000
         })
-        web3.eth.wait_for_transaction_receipt(tx_reset)
         print("Auction reset successfully!")
 
         # Get the new auction times after resetting
@@ -212,7 +272,8 @@ def main():
     assert code != b'0x', "Contract address is invalid or the contract is not deployed."
 
     # Load the contract ABI dynamically
-    contract_path = os.path.join(project_dir, "5014-Project", "blockchain", "build", "contracts", "EnergyVickreyAuction.json")
+    contract_name = os.getenv("CONTRACT_NAME", "EnergyVickreyAuction")
+    contract_path = os.path.join(project_dir, "5014-Project", "blockchain", "build", "contracts", f"{contract_name}.json")
 
     with open(contract_path, "r") as abi_file:
         contract_data = json.load(abi_file)
@@ -226,12 +287,22 @@ def main():
 
     # Initialize the contract
     auction_contract = web3.eth.contract(address=contract_address, abi=contract_abi)
+    # Local copy of the auction state, kept current from the contract's events
+    mirror = start_mirror(web3, auction_contract)
+    # Local nonces let every bidder's transaction go out without waiting on the previous receipt
+    transactions = TransactionManager(web3)
 
     # Define bidder accounts (from Ganache)
     accounts = web3.eth.accounts
     bidders = accounts[2:6]  # Assuming you have 4 bidders, adjust as needed
     auctioneer = accounts[1] # Make the first account for holding auctions
     auction_holder = True
+
+    # With batch entry points, one operator account bids and reveals for every house
+    aggregator = None
+    if BidAggregator.supported(auction_contract):
+        aggregator = BidAggregator(web3, auction_contract, accounts[6], transactions)
+        aggregator.authorize(bidders)
     
     A = 3
     x = 0
@@ -244,13 +315,13 @@ def main():
             x += 0.1
 
             # Run auction round
-            run_auction_round(bidders, auction_contract, auctioneer, web3, auction_holder, energy_amount)
+            run_auction_round(bidders, auction_contract, auctioneer, web3, auction_holder, energy_amount, mirror, transactions, aggregator)
             
             # Flip the status of auction holder and await the next auction.
             auction_holder = not auction_holder
 
             # Call the reset auction function
-            reset_auction(auctioneer, auction_contract, web3)
+            reset_auction(auctioneer, auction_contract, web3, transactions)
 
             # Wait for the next auction to start
             print("Waiting for the next auction round...")
@@ -0,0 +1,51 @@
+import asyncio
+import gc
+import warnings
+from types import SimpleNamespace
+from agents.auctionState import STATE_GETTERS, read_snapshot_async
+
+class Getter:
+    def __init__(self, value):
+        self.value = value
+
+    async def call(self, block_identifier=None):
+        return self.value
+
+class FailingBatch:
+    """AsyncWeb3 batch whose node rejects JSON-RPC batches; queued coroutines are never awaited."""
+    def __init__(self):
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def add(self, call):
+        self.calls.append(call)
+
+    async def async_execute(self):
+        raise ValueError("batch requests are not supported")
+
+def fake_contract():
+    values = {getter: index for index, getter in enumerate(STATE_GETTERS)}
+    values["getBidDeposits"] = (["0xhouse"], [5])
+    functions = SimpleNamespace(**{name: (lambda value=value: Getter(value)) for name, value in values.items()})
+    return SimpleNamespace(abi=[], functions=functions)
+
+async def block_number():
+    return 42
+
+def test_batch_failure_falls_back_without_leaking_coroutines():
+    web3 = SimpleNamespace(batch_requests=FailingBatch)
+    web3.eth = SimpleNamespace()
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        web3.eth.block_number = block_number()
+        snapshot = asyncio.run(read_snapshot_async(web3, fake_contract()))
+        gc.collect()
+    assert not [w for w in caught if "never awaited" in str(w.message)]
+    assert snapshot.block == 42
+    assert snapshot.highest_bid == STATE_GETTERS.index("highestBid")
+    assert snapshot.deposits == {"0xhouse": 5}
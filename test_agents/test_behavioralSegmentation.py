@@ -0,0 +1,132 @@
+import asyncio
+import numpy as np
+from agents.behavioralSegmentation import FALLBACK_BUCKETS, PriorityMemo, order_by_group, rank_appliances
+from agents.treeEnsemble import TreeEnsemble
+
+def reference_order(scores, groups):
+    """Per-house sorted(..., reverse=True), the ordering order_by_group replaces."""
+    order = []
+    for group in range(max(groups, default=-1) + 1):
+        rows = [i for i in range(len(scores)) if groups[i] == group]
+        order += sorted(rows, key=lambda i: scores[i], reverse=True)
+    return order
+
+def test_orders_each_group_by_descending_score():
+    scores = np.array([0.2, 0.9, 0.5, 0.1, 0.7, 0.3])
+    groups = np.array([0, 0, 0, 1, 1, 1])
+    order, bounds = order_by_group(scores, groups)
+    assert order.tolist() == [1, 2, 0, 4, 5, 3]
+    assert bounds.tolist() == [0, 3, 6]
+
+def test_ties_keep_input_order():
+    scores = np.array([0.5, 0.5, 0.8, 0.5, 0.8])
+    groups = np.zeros(5, dtype=int)
+    order, _ = order_by_group(scores, groups)
+    assert order.tolist() == [2, 4, 0, 1, 3] == reference_order(scores.tolist(), groups.tolist())
+
+def test_interleaved_and_empty_groups():
+    scores = np.array([0.4, 0.6, 0.6, 0.2, 0.9])
+    groups = np.array([2, 0, 2, 0, 2])  # House 1 has no appliances
+    order, bounds = order_by_group(scores, groups)
+    assert bounds.tolist() == [0, 2, 2, 5]
+    assert order[bounds[1]:bounds[2]].tolist() == []
+    assert order[bounds[2]:bounds[3]].tolist() == [4, 2, 0]
+
+def test_matches_per_group_sort_on_random_input():
+    rng = np.random.default_rng(0)
+    scores = rng.integers(0, 5, size=200).astype(np.float64)  # Few distinct values, many ties
+    groups = rng.integers(0, 12, size=200)
+    order, bounds = order_by_group(scores, groups)
+    assert order.tolist() == reference_order(scores.tolist(), groups.tolist())
+    assert np.diff(bounds).tolist() == np.bincount(groups, minlength=12).tolist()
+
+def test_no_appliances():
+    order, bounds = order_by_group(np.array([]), np.array([], dtype=int))
+    assert order.tolist() == [] and bounds.tolist() == [0]
+
+def test_rank_appliances_scores_once():
+    class Model:
+        calls = 0
+        async def predict(self, features):
+            Model.calls += 1
+            return features[:, 0]
+    features = np.array([[3.0], [1.0], [2.0], [5.0]])
+    scores, order, bounds = asyncio.run(rank_appliances(Model(), features, [0, 0, 1, 1]))
+    assert Model.calls == 1
+    assert scores.tolist() == [3.0, 1.0, 2.0, 5.0]
+    assert order.tolist() == [0, 1, 3, 2] and bounds.tolist() == [0, 2, 4]
+
+def random_ranker(rng, trees=20, features=4):
+    """Plain (missing_type None) depth-2 trees, built the way compile_booster lays them out."""
+    feature, threshold, left, right, leaves = [], [], [], [], []
+    roots = []
+    for _ in range(trees):
+        root = len(feature)
+        roots.append(root)
+        for node in range(3):
+            feature.append(rng.integers(0, features))
+            threshold.append(np.round(rng.uniform(-2, 2), 2))
+        left += [root + 1, ~len(leaves), ~(len(leaves) + 2)]
+        right += [root + 2, ~(len(leaves) + 1), ~(len(leaves) + 3)]
+        leaves += rng.normal(size=4).tolist()
+    return TreeEnsemble(features, [f"f{f}" for f in range(features)], np.array(roots, dtype=np.int32),
+                        np.array(feature, dtype=np.int32), np.array(threshold), np.array(left, dtype=np.int32),
+                        np.array(right, dtype=np.int32), np.ones(len(feature), dtype=bool),
+                        np.zeros(len(feature), dtype=np.int8), np.array(leaves))
+
+class Handle:
+    """Stands in for ModelServer's handle: the loaded model under .model and an async predict."""
+    def __init__(self, model):
+        self.model = model
+        self.rows_scored = 0
+
+    async def predict(self, features):
+        self.rows_scored += len(features)
+        return self.model.predict(features)
+
+def test_split_buckets_are_exact():
+    rng = np.random.default_rng(0)
+    ranker = random_ranker(rng)
+    thresholds = ranker.threshold[:ranker.first_leaf]
+    # Values on, just below and just above every threshold, plus NaN and random points
+    boundary = np.concatenate((thresholds, np.nextafter(thresholds, -np.inf), np.nextafter(thresholds, np.inf), [np.nan]))
+    rows = rng.uniform(-3, 3, size=(2000, 4))
+    mask = rng.random(rows.shape) < 0.6
+    rows[mask] = rng.choice(boundary, size=int(mask.sum()))
+
+    memo = PriorityMemo(Handle(ranker), buckets="splits", maxsize=100000)
+    assert memo.edges is not None
+    for batch in np.array_split(rows, 10):
+        assert asyncio.run(memo.predict(batch)).tolist() == ranker.predict(batch).tolist()
+    # Hits across batches reuse scores from other rows in the same bucket
+    assert memo.hits > 0
+    assert memo.hits + memo.misses == len(rows)
+    assert memo.model.rows_scored == len(memo.entries)  # Each bucket scored once
+
+def test_repeated_bucket_scored_once_and_lru_bound():
+    ranker = random_ranker(np.random.default_rng(1))
+    handle = Handle(ranker)
+    memo = PriorityMemo(handle, buckets="splits", maxsize=2)
+    rows = np.array([[5.0, 5.0, 5.0, 5.0], [5.5, 5.5, 5.5, 5.5], [-5.0, -5.0, -5.0, -5.0]])
+    asyncio.run(memo.predict(rows))  # First two rows share every interval
+    assert handle.rows_scored == 2
+    assert memo.stats()["misses"] == 3 and memo.stats()["size"] == 2
+    asyncio.run(memo.predict(rows[:1]))
+    assert memo.stats()["hits"] == 1 and handle.rows_scored == 2
+
+def test_width_buckets_score_the_representative_point():
+    ranker = random_ranker(np.random.default_rng(2))
+    rows = np.array([[0.51, 0.0, 0.0, 0.0], [0.49, 0.0, 0.0, 0.0]])  # Same 0.5-wide bucket around 0.5
+    first, second = PriorityMemo(Handle(ranker), buckets="0.5,0,0,0"), PriorityMemo(Handle(ranker), buckets="0.5,0,0,0")
+    # Either fill order gives the score of the bucket's centre, not of whichever row came first
+    a = asyncio.run(first.predict(rows))
+    b = asyncio.run(second.predict(rows[::-1]))
+    centre = ranker.predict([[0.5, 0.0, 0.0, 0.0]])[0]
+    assert a.tolist() == b.tolist() == [centre, centre]
+
+def test_falls_back_to_widths_without_thresholds():
+    class Opaque:
+        async def predict(self, features):
+            return np.zeros(len(features))
+    memo = PriorityMemo(Opaque(), buckets="splits")
+    assert memo.edges is None and memo.widths.tolist() == list(FALLBACK_BUCKETS)
@@ -0,0 +1,27 @@
+from types import SimpleNamespace
+from web3 import Web3
+from agents.auctionState import create_sealed_bid
+from agents.bidAggregator import BATCH_GAS_BASE, BATCH_GAS_PER_BID, BidAggregator
+
+def aggregator(gas_limit, batch_size=40):
+    web3 = SimpleNamespace(eth=SimpleNamespace(get_block=lambda block: {"gasLimit": gas_limit}))
+    return BidAggregator(web3, contract=None, operator="0xoperator", transactions=None, batch_size=batch_size)
+
+def test_sealed_bid_matches_abi_encode_packed():
+    packed = (10 ** 16).to_bytes(32, "big") + b"house1"
+    assert create_sealed_bid(10 ** 16, "house1") == Web3.keccak(packed)
+    assert create_sealed_bid("10000000000000000", "house1") == Web3.keccak(packed)
+
+def test_batch_size_fits_the_block_gas_limit():
+    assert aggregator(30_000_000).batch_size == 40
+    small = aggregator(6_000_000)
+    assert small.batch_size == 39
+    assert BATCH_GAS_BASE + small.batch_size * BATCH_GAS_PER_BID <= 6_000_000
+    assert aggregator(100_000).batch_size == 1
+
+def test_batches_split_by_batch_size():
+    bids = aggregator(1_000_000)  # 6 houses per batch
+    for house in range(14):
+        bids.add(7, f"house{house}", 1000 + house, f"nonce{house}")
+    assert [len(batch) for batch in bids.batches(7)] == [6, 6, 2]
+    assert bids.batches(7)[0][0] == ("house0", (1000, "nonce0"))
@@ -0,0 +1,38 @@
+import json
+import numpy as np
+from agents.codec import decode_array, encode_array
+from agents.gridForecast import window_key
+
+def round_trip(value):
+    return decode_array(json.loads(json.dumps(value)))
+
+def test_round_trip_keeps_dtype_shape_and_values():
+    rng = np.random.default_rng(0)
+    for array in (rng.random((24, 8)), rng.random((3, 18, 1)).astype(np.float32), np.arange(10).reshape(2, 5)):
+        decoded = round_trip(encode_array(array))
+        assert decoded.dtype == array.dtype
+        assert decoded.shape == array.shape
+        assert np.array_equal(decoded, array)
+
+def test_float64_is_not_downcast_by_default():
+    array = np.array([0.1, 1 / 3, 1e-12], dtype=np.float64)
+    assert round_trip(encode_array(array)).tolist() == array.tolist()
+
+def test_downcast_is_opt_in():
+    array = np.array([0.1, 1 / 3], dtype=np.float64)
+    decoded = round_trip(encode_array(array, np.float32))
+    assert decoded.dtype == np.float32
+    assert np.array_equal(decoded, array.astype(np.float32))
+
+def test_plain_lists_decode_with_requested_dtype():
+    decoded = decode_array([[1, 2], [3, 4]], np.float32)
+    assert decoded.dtype == np.float32
+    assert decoded.tolist() == [[1.0, 2.0], [3.0, 4.0]]
+
+def test_forecast_table_keys_match_for_list_and_binary_messages():
+    rng = np.random.default_rng(1)
+    demand, supply = rng.random((24, 8)), rng.random((24, 2))
+    expected = window_key(demand, supply)
+    assert window_key(round_trip(demand.tolist()), round_trip(supply.tolist())) == expected
+    assert window_key(round_trip(encode_array(demand)), round_trip(encode_array(supply))) == expected
+    assert window_key(round_trip(encode_array(demand, np.float32)), round_trip(encode_array(supply, np.float32))) == expected
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from agents.datasets import DatasetStore, export_store, open_dataset, store_dir_for
+
+def write_archive(tmp_path):
+    rng = np.random.default_rng(0)
+    arrays = {"X_test": rng.random((12, 24, 8)), "y_test": rng.random((12, 1)).astype(np.float32)}
+    path = str(tmp_path / "windows.npz")
+    np.savez(path, **arrays)
+    return path, arrays
+
+def test_falls_back_to_the_archive_without_a_store(tmp_path):
+    path, arrays = write_archive(tmp_path)
+    data = open_dataset(path)
+    assert not isinstance(data, DatasetStore)
+    np.testing.assert_array_equal(data["X_test"], arrays["X_test"])
+
+def test_exported_store_maps_the_same_arrays(tmp_path):
+    path, arrays = write_archive(tmp_path)
+    store_dir = export_store(path)
+    assert store_dir == store_dir_for(path) == str(tmp_path / "windows")
+
+    data = open_dataset(path)
+    assert isinstance(data, DatasetStore)
+    assert open_dataset(path) is data  # One store per directory per process
+    assert data.files == ["X_test", "y_test"]
+    assert "y_test" in data and "missing" not in data
+    for name, array in arrays.items():
+        assert isinstance(data[name], np.memmap)
+        assert data[name].dtype == array.dtype
+        np.testing.assert_array_equal(data[name], array)
+    # Slices are views onto the mapping, not copies
+    window = data["X_test"][3:5]
+    assert np.shares_memory(window, data["X_test"])
+    np.testing.assert_array_equal(window, arrays["X_test"][3:5])
+    with pytest.raises(KeyError):
+        data["missing"]
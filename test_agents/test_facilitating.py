@@ -0,0 +1,189 @@
+import asyncio
+import json
+from datetime import timedelta
+from types import SimpleNamespace
+import numpy as np
+from spade.message import Message
+from agents.demandResponse import DemandResponseAgent
+from agents.facilitating import FacilitatingAgent, PayloadCache, coalesce
+from agents.streaming import WindowRing
+
+def message(sender, body):
+    return Message(to="facilitating@localhost", sender=f"{sender}@localhost", body=body)
+
+def test_coalesce_keeps_newest_snapshot_per_sender():
+    batch = [message("house", '{"n": 1}'), message("prediction", '{"n": 1}'), message("house", '{"n": 2}')]
+    assert [(str(msg.sender), msg.body) for msg in coalesce(batch)] == [
+        ("prediction@localhost", '{"n": 1}'),
+        ("house@localhost", '{"n": 2}'),
+    ]
+
+def test_coalesce_keeps_every_grid_message_in_order():
+    batch = [message("grid", '{"seq": 1}'), message("house", '{"n": 1}'), message("grid", '{"seq": 2}'),
+             message("house", '{"n": 2}'), message("grid", '{"seq": 3}')]
+    kept = coalesce(batch)
+    assert [msg.body for msg in kept if str(msg.sender) == "grid@localhost"] == ['{"seq": 1}', '{"seq": 2}', '{"seq": 3}']
+    assert [msg.body for msg in kept if str(msg.sender) == "house@localhost"] == ['{"n": 2}']
+
+def test_looks_like_json():
+    assert PayloadCache.looks_like_json('{"a": 1}')
+    assert PayloadCache.looks_like_json('  {"a": 1}\n')
+    assert not PayloadCache.looks_like_json("hello")
+    assert not PayloadCache.looks_like_json("[1, 2]")
+    assert not PayloadCache.looks_like_json('{"a": 1')
+
+def test_bundle_splices_raw_bodies_in_dependency_order():
+    cache = PayloadCache()
+    house = '{"current_demand": 1.5, "test_sample": [[0.1], [0.2]]}'
+    grid = '{"seq": 4, "grid_demand": 2.0}'
+    cache.store("house", house)
+    cache.store("grid", grid)
+    body = cache.bundle(["grid", "house", "fleet"], {"grid": 1, "house": 1, "fleet": 0})
+    assert body == '{"grid": ' + grid + ', "house": ' + house + ', "fleet": null}'
+    assert json.loads(body) == {"grid": json.loads(grid), "house": json.loads(house), "fleet": None}
+
+def test_bundle_is_rebuilt_only_on_a_new_version():
+    cache = PayloadCache()
+    cache.store("house", '{"n": 1}')
+    first = cache.bundle(["house"], {"house": 1})
+    cache.store("house", '{"n": 2}')
+    # Same version: the cached bundle is returned even though a body was stored
+    assert cache.bundle(["house"], {"house": 1}) is first
+    assert json.loads(cache.bundle(["house"], {"house": 2})) == {"house": {"n": 2}}
+
+WINDOW = 24
+
+def grid_body(seq, supply, demand, full):
+    """Same layout as agents/grid.py in delta mode; window `seq` covers rows seq-1 .. seq+22."""
+    position = seq - 1
+    body = {"seq": seq, "position": position, "grid_demand": 0.0, "grid_supply": 0.0}
+    if full:
+        body["test_sample_supply"] = supply[position:position + WINDOW].tolist()
+        body["test_sample_demand"] = demand[position:position + WINDOW].tolist()
+    else:
+        body["delta_supply"] = supply[position + WINDOW - 1].tolist()
+        body["delta_demand"] = demand[position + WINDOW - 1].tolist()
+    return json.dumps(body)
+
+async def dispatch_all(cycles):
+    """Runs the facilitator over each cycle's messages (drained together); returns what it sent."""
+    handler = FacilitatingAgent.MultiAgentHandler()
+    handler.agent = SimpleNamespace(drain_mailbox=True)
+    handler.queue = asyncio.Queue()
+    sent = []
+    async def send(msg):
+        sent.append(msg)
+    handler.send = send
+    await handler.on_start()
+    for cycle in cycles:
+        for msg in cycle:
+            handler.queue.put_nowait(msg)
+        await handler.run()
+    return sent
+
+def test_grid_deltas_reach_demand_response_without_gaps():
+    rng = np.random.default_rng(0)
+    ticks = 40
+    supply, demand = rng.random((ticks + WINDOW, 2)), rng.random((ticks + WINDOW, 8))
+    grid = [message("grid", grid_body(seq, supply, demand, full=seq == 1)) for seq in range(1, ticks + 1)]
+    # Bursts of grid messages far less than 5s apart, with house snapshots in between
+    cycles, house = [], 0
+    for start in range(0, ticks, 4):
+        cycle = []
+        for msg in grid[start:start + 4]:
+            cycle.append(msg)
+            house += 1
+            cycle.append(message("house", json.dumps({"current_demand": house})))
+        cycles.append(cycle)
+    sent = asyncio.run(dispatch_all(cycles))
+
+    receiver = DemandResponseAgent.DRBehaviour()
+    receiver.supply_ring, receiver.demand_ring = WindowRing(), WindowRing()
+    seqs = []
+    for msg in sent:
+        if str(msg.to) != "demandresponse@localhost":
+            continue
+        data = json.loads(msg.body)["grid"]
+        windows = receiver.grid_windows(data)
+        assert windows is not None, f"gap before grid message {data['seq']}"
+        position = data["position"]
+        assert np.array_equal(windows[0], supply[position:position + WINDOW])
+        assert np.array_equal(windows[1], demand[position:position + WINDOW])
+        seqs.append(data["seq"])
+    assert sorted(set(seqs)) == list(range(1, ticks + 1))
+    assert seqs == sorted(seqs)
+
+def test_one_resync_per_gap_until_the_full_window_arrives():
+    rng = np.random.default_rng(1)
+    supply, demand = rng.random((20 + WINDOW, 2)), rng.random((20 + WINDOW, 8))
+    receiver = DemandResponseAgent.DRBehaviour()
+    receiver.supply_ring, receiver.demand_ring, receiver.resync_pending = WindowRing(), WindowRing(), False
+    requests = []
+    async def send(msg):
+        requests.append(json.loads(msg.body))
+    receiver.send = send
+
+    async def deliver(seq, full=False):
+        windows = receiver.grid_windows(json.loads(grid_body(seq, supply, demand, full)))
+        if windows is None:
+            await receiver.request_resync()
+        return windows
+
+    async def scenario():
+        assert await deliver(1, full=True) is not None
+        assert await deliver(2) is not None
+        # seq 3 is lost: every later delta gaps until grid answers with a full window
+        for seq in range(4, 8):
+            assert await deliver(seq) is None
+        assert requests == [{"resync": True}]
+        assert await deliver(8, full=True) is not None
+        assert await deliver(9) is not None
+        assert await deliver(11) is None  # A new gap asks again
+        assert requests == [{"resync": True}] * 2
+    asyncio.run(scenario())
+
+def test_grid_deltas_are_not_held_back_by_a_stale_house():
+    rng = np.random.default_rng(2)
+    supply, demand = rng.random((10 + WINDOW, 2)), rng.random((10 + WINDOW, 8))
+
+    async def scenario():
+        handler = FacilitatingAgent.MultiAgentHandler()
+        handler.agent = SimpleNamespace(drain_mailbox=True)
+        handler.queue = asyncio.Queue()
+        sent = []
+        async def send(msg):
+            sent.append(msg)
+        handler.send = send
+        await handler.on_start()
+        handler.queue.put_nowait(message("house", json.dumps({"current_demand": 1})))
+        handler.queue.put_nowait(message("grid", grid_body(1, supply, demand, full=True)))
+        await handler.run()
+        # The house stops reporting: its last message is now older than the 30s freshness limit
+        handler.last_message["house"]["time"] -= timedelta(seconds=60)
+        stale_from = len(sent)
+        for seq in range(2, 6):
+            handler.queue.put_nowait(message("grid", grid_body(seq, supply, demand, full=False)))
+            await handler.run()
+        handler.last_message["prediction"]["time"] -= timedelta(seconds=10)  # Past the 5s throttle
+        handler.queue.put_nowait(message("prediction", json.dumps({"predicted_demand": 1.0})))
+        await handler.run()
+        return handler, sent, stale_from
+
+    handler, sent, stale_from = asyncio.run(scenario())
+    # Snapshot consumers (negotiation waits on the house) still hold off while the house is stale
+    assert "negotiation" in handler.pending
+    assert {str(msg.to) for msg in sent[stale_from:]} == {"demandresponse@localhost"}
+    receiver = DemandResponseAgent.DRBehaviour()
+    receiver.supply_ring, receiver.demand_ring = WindowRing(), WindowRing()
+    seqs = []
+    for msg in sent:
+        if str(msg.to) == "demandresponse@localhost":
+            data = json.loads(msg.body)["grid"]
+            assert receiver.grid_windows(data) is not None, f"gap before grid message {data['seq']}"
+            seqs.append(data["seq"])
+    assert seqs == [1, 2, 3, 4, 5]
+
+def test_agent_keeps_spades_constructor_arguments():
+    agent = FacilitatingAgent("facilitating@localhost", "password", port=5223, verify_security=True, drain_mailbox=False)
+    assert (agent.xmpp_port, agent.verify_security, agent.drain_mailbox) == (5223, True, False)
+    assert FacilitatingAgent("facilitating@localhost", "password").drain_mailbox
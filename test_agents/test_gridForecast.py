@@ -0,0 +1,76 @@
+import asyncio
+import os
+import numpy as np
+from agents.gridForecast import ForecastMemo, ForecastTable, GridForecaster, load_scalers, window_key
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+
+def windows(seed):
+    rng = np.random.default_rng(seed)
+    return rng.random((24, 8)), rng.random((24, 2))
+
+class Model:
+    """Async model handle stub returning the first feature of the last step."""
+    def __init__(self):
+        self.calls = 0
+
+    async def predict(self, batch):
+        self.calls += 1
+        return np.asarray(batch)[:, -1, :1]
+
+def forecaster(table=None):
+    scale, offset = load_scalers(MODEL_DIR)
+    return GridForecaster(Model(), Model(), scale, offset, table)
+
+def test_window_key_is_stable_across_dtypes():
+    demand, supply = windows(0)
+    key = window_key(demand, supply)
+    assert window_key(demand.astype(np.float32), supply.astype(np.float32)) == key
+    assert window_key(demand.tolist(), supply.tolist()) == key
+    assert window_key(demand.astype(np.float32).astype(np.float64), supply) == key
+    assert window_key(supply, demand) != key
+    assert window_key(demand + 1e-3, supply) != key
+
+def test_memo_evicts_least_recently_used():
+    memo = ForecastMemo(2)
+    memo.put("a", np.array([1.0, 1.0]))
+    memo.put("b", np.array([2.0, 2.0]))
+    assert memo.get("a") is not None  # "a" is now the most recent
+    memo.put("c", np.array([3.0, 3.0]))
+    assert memo.get("b") is None
+    assert list(memo.entries) == ["a", "c"]
+    assert memo.get("missing") is None
+
+def test_scalers_match_the_original_constants():
+    scale, offset = load_scalers(MODEL_DIR)
+    raw = np.array([[0.25, 0.5], [1.0, -0.1]])
+    expected = np.column_stack((raw[:, 0] * 4924.1 + 13673.1, raw[:, 1] * 20667))
+    np.testing.assert_allclose(forecaster().denormalize(raw), expected, rtol=0, atol=1e-9)
+    assert scale.tolist() == [4924.1, 20667.0] and offset.tolist() == [13673.1, 0.0]
+
+def test_table_then_memo_then_model():
+    demand, supply = windows(1)
+    other_demand, other_supply = windows(2)
+    table = ForecastTable(np.array(["0" * 32, window_key(demand, supply)]), np.array([[0.0, 0.0], [111.0, 222.0]]))
+    grid = forecaster(table)
+
+    forecast, source = asyncio.run(grid.forecast_window(demand, supply, position=1))
+    assert (source, forecast.tolist()) == ("table", [111.0, 222.0])
+    assert grid.model_demand.calls == grid.model_supply.calls == 0
+
+    # Same content at another position (or none) is not a table hit
+    forecast, source = asyncio.run(grid.forecast_window(demand, supply, position=0))
+    expected = grid.denormalize(np.array([[demand[-1, 0], supply[-1, 0]]]))[0]
+    assert source == "model"
+    np.testing.assert_allclose(forecast, expected)
+    forecast, source = asyncio.run(grid.forecast_window(demand, supply))
+    assert source == "memo"
+    np.testing.assert_allclose(forecast, expected)
+    assert grid.model_demand.calls == grid.model_supply.calls == 1
+
+    # Out-of-range positions and a missing table fall through to the models
+    assert asyncio.run(grid.forecast_window(other_demand, other_supply, position=5))[1] == "model"
+    assert asyncio.run(forecaster().forecast_window(demand, supply, position=1))[1] == "model"
+
+def test_missing_table_file(tmp_path):
+    assert ForecastTable.load(str(tmp_path)) is None
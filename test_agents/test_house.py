@@ -0,0 +1,61 @@
+import asyncio
+import json
+import numpy as np
+from agents import house
+from agents.behavioralSegmentation import fleet_features
+from agents.codec import decode_array
+from agents.house import APPLIANCES, HouseFleet, holiday_model, holiday_model_batch, temperature_model, temperature_model_batch
+from agents.prediction import PredictionAgent
+
+def test_batched_models_match_the_scalar_models(monkeypatch):
+    steps = np.arange(0, 100, 7)
+    batched = temperature_model_batch(steps, np.random.default_rng(3))
+    # Same noise stream for the scalar model: Generator.uniform draws one value at a time identically
+    scalar_noise = np.random.default_rng(3)
+    monkeypatch.setattr(house.random, "uniform", lambda low, high: scalar_noise.uniform(low, high))
+    scalar = [temperature_model(int(step)) for step in steps]
+    np.testing.assert_allclose(batched, scalar, rtol=0, atol=1e-12)
+    assert holiday_model_batch(steps).tolist() == [holiday_model(int(step)) for step in steps]
+
+def fleet_behaviour(houses, rows=30):
+    rng = np.random.default_rng(0)
+    behaviour = HouseFleet.FleetStatus()
+    behaviour.tick = 0
+    behaviour.rng = np.random.default_rng(1)
+    behaviour.X_test = rng.random((rows, 18))
+    behaviour.Y_test = rng.random((rows, 2))
+    behaviour.house_ids = [f"house{i}" for i in range(houses)]
+    behaviour.offsets = np.arange(houses) * 7
+    behaviour.sent = []
+
+    async def receive(timeout=None):
+        return None
+
+    async def send(msg):
+        behaviour.sent.append(msg)
+    behaviour.receive, behaviour.send = receive, send
+    return behaviour
+
+def test_columnar_message_decodes_for_the_consumers(monkeypatch):
+    async def no_wait(seconds):
+        return None
+    monkeypatch.setattr(house.asyncio, "sleep", no_wait)
+    behaviour = fleet_behaviour(houses=4)
+    asyncio.run(behaviour.run())
+    asyncio.run(behaviour.run())
+    fleet = json.loads(behaviour.sent[-1].body)
+    rows = (behaviour.offsets + 1) % len(behaviour.X_test)  # Second tick
+
+    features, groups = fleet_features(fleet)
+    assert features.shape == (4 * len(APPLIANCES), 4)
+    assert groups.tolist() == np.repeat(np.arange(4), len(APPLIANCES)).tolist()
+    # [power_consumption, temperature, duration, holiday], house-major
+    np.testing.assert_allclose(features[:len(APPLIANCES), 0], behaviour.Y_test[rows[0], 1] / len(APPLIANCES))
+    assert features[:, 3].tolist() == np.repeat(rows % 4, len(APPLIANCES)).tolist()
+    assert np.all((features[:, 2] >= 0) & (features[:, 2] <= 200))
+
+    np.testing.assert_allclose(decode_array(fleet["current_demand"], np.float64), behaviour.Y_test[rows, 1])
+    samples = PredictionAgent.PredictBehaviour().collect_samples({}, fleet)
+    assert list(samples) == fleet["house_ids"]
+    assert samples["house2"].shape == (18, 1)
+    np.testing.assert_allclose(samples["house2"][:, 0], behaviour.X_test[rows[2]], rtol=1e-6)
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+import numpy as np
+from agents.inference import MicroBatcher, ModelServer
+
+class RecordingModel:
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, inputs):
+        self.batches.append(len(inputs))
+        return inputs.sum(axis=1, keepdims=True)
+
+def test_concurrent_submitters_share_one_model_call():
+    model = RecordingModel()
+
+    async def main():
+        batcher = MicroBatcher(model.predict, max_batch_size=64, max_wait=10)
+        house = np.ones((1, 3))
+        fleet = np.arange(12, dtype=np.float64).reshape(4, 3)
+        return await asyncio.wait_for(
+            asyncio.gather(batcher.predict_many(list(house)), batcher.predict_many(list(fleet))), timeout=2
+        )
+
+    house_rows, fleet_rows = asyncio.run(main())
+    assert model.batches == [5]
+    assert [row.tolist() for row in house_rows] == [[3.0]]
+    assert [row.tolist() for row in fleet_rows] == [[3.0], [12.0], [21.0], [30.0]]
+
+def test_predict_many_does_not_wait_for_max_wait():
+    model = RecordingModel()
+
+    async def main():
+        batcher = MicroBatcher(model.predict, max_wait=10)
+        start = time.perf_counter()
+        await batcher.predict_many([np.ones(2)])
+        return time.perf_counter() - start
+
+    assert asyncio.run(main()) < 1
+    assert model.batches == [1]
+
+def test_single_submits_are_batched_within_max_wait():
+    model = RecordingModel()
+
+    async def main():
+        batcher = MicroBatcher(model.predict, max_wait=0.05)
+        return await asyncio.gather(*(batcher.submit(np.full(2, i, dtype=np.float64)) for i in range(3)))
+
+    rows = asyncio.run(main())
+    assert model.batches == [3]
+    assert [row.tolist() for row in rows] == [[0.0], [2.0], [4.0]]
+
+def test_full_batches_flush_immediately():
+    model = RecordingModel()
+
+    async def main():
+        batcher = MicroBatcher(model.predict, max_batch_size=4, max_wait=10)
+        return await asyncio.wait_for(batcher.predict_many([np.ones(2)] * 10), timeout=2)
+
+    assert len(asyncio.run(main())) == 10
+    assert sorted(model.batches) == [2, 4, 4]
+
+def test_batch_tasks_are_held_until_done():
+    release = threading.Event()
+
+    def slow_predict(inputs):
+        release.wait(timeout=5)
+        return inputs.sum(axis=1, keepdims=True)
+
+    async def main():
+        batcher = MicroBatcher(slow_predict, max_wait=10)
+        pending = asyncio.ensure_future(batcher.predict_many([np.ones(2), np.ones(2)]))
+        await asyncio.sleep(0.05)
+        in_flight = len(batcher.running)
+        release.set()
+        rows = await asyncio.wait_for(pending, timeout=2)
+        await asyncio.sleep(0)  # Done callbacks run on the next iteration
+        return in_flight, rows, len(batcher.running)
+
+    in_flight, rows, left = asyncio.run(main())
+    assert (in_flight, left) == (1, 0)
+    assert [row.tolist() for row in rows] == [[2.0], [2.0]]
+
+def test_model_errors_reach_every_caller():
+    def failing_predict(inputs):
+        raise RuntimeError("model failed")
+
+    async def main():
+        batcher = MicroBatcher(failing_predict, max_wait=10)
+        results = await asyncio.gather(batcher.predict_many([np.ones(2)]), batcher.submit(np.ones(2)),
+                                       return_exceptions=True)
+        await asyncio.sleep(0)
+        return results, batcher.running
+
+    results, running = asyncio.run(main())
+    assert [str(result) for result in results] == ["model failed", "model failed"]
+    assert not running
+
+def test_call_stats_do_not_wait_for_a_model_load():
+    server = ModelServer()
+    finished = threading.Event()
+    with server.load_lock:  # Held for the whole of a (multi-second) load
+        worker = threading.Thread(target=lambda: (server.record_call(), finished.set()))
+        worker.start()
+        assert finished.wait(1)
+    assert server.total_calls == 1
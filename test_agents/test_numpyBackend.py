@@ -0,0 +1,38 @@
+import os
+import numpy as np
+import pytest
+from agents.numpyBackend import NumpySequential, exported_path
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Keras predictions for fixed random inputs, saved from the .keras models in models/
+REFERENCE = os.path.join(ROOT, "test_agents", "data", "keras_reference_outputs.npz")
+
+@pytest.mark.parametrize("name", ["energy_lstm", "lstm_cnn_demand_predictor", "lstm_cnn_supply_predictor"])
+def test_exported_model_matches_stored_keras_outputs(name):
+    model = NumpySequential.load(exported_path(os.path.join(ROOT, "models", f"{name}.keras")))
+    with np.load(REFERENCE) as reference:
+        inputs, outputs = reference[f"{name}_inputs"], reference[f"{name}_outputs"]
+    predicted = model.predict(inputs)
+    assert predicted.shape == outputs.shape
+    np.testing.assert_allclose(predicted, outputs, atol=1e-5)
+
+def test_conv_and_pooling_layers():
+    x = np.arange(10, dtype=np.float32).reshape(1, 5, 2)
+    kernel = np.ones((2, 2, 1), dtype=np.float32)  # Sums two neighbouring steps of both channels
+    conv = NumpySequential.conv1d(x, {"activation": "linear"}, [kernel, np.array([1.0], dtype=np.float32)])
+    assert conv[0, :, 0].tolist() == [7.0, 15.0, 23.0, 31.0]
+    pooled = NumpySequential.max_pooling1d(conv, {"pool_size": 2, "strides": 2}, [])
+    assert pooled[0, :, 0].tolist() == [15.0, 31.0]
+
+def test_lstm_with_zero_weights_follows_the_gate_equations():
+    units = 3
+    x = np.ones((2, 4, 1), dtype=np.float32)
+    weights = [np.zeros((1, 4 * units), np.float32), np.zeros((units, 4 * units), np.float32), np.zeros(4 * units, np.float32)]
+    # All gates at sigmoid(0) = 0.5 and the candidate at tanh(0) = 0, so the state stays zero
+    assert not NumpySequential.lstm(x, {"return_sequences": False}, weights).any()
+    weights[2][2 * units:3 * units] = 1.0  # Candidate tanh(1)
+    h = NumpySequential.lstm(x, {"return_sequences": True}, weights)
+    c1 = 0.5 * np.tanh(1.0)
+    assert h.shape == (2, 4, units)
+    np.testing.assert_allclose(h[:, 0], 0.5 * np.tanh(c1), rtol=1e-6)
+    np.testing.assert_allclose(h[:, 1], 0.5 * np.tanh(0.5 * c1 + c1), rtol=1e-6)
@@ -0,0 +1,80 @@
+import asyncio
+import numpy as np
+import pytest
+from agents.horizonHead import build_horizon_model, horizon_targets
+from agents.numpyBackend import NumpySequential, export_keras_model
+from agents.prediction import (HORIZON_MODEL_NAME, HorizonCache, PredictionAgent, forecast_model_name,
+                               horizon_payload, split_horizon)
+
+def test_payload_reports_the_step_valid_now():
+    cache = HorizonCache()
+    steps = np.array([[1.0, 10.0], [2.0, 20.0], [3.0, 30.0]])
+    entry = cache.put("house", "window", steps, now=100.0)
+    step = entry["valid_until"][0] - entry["valid_from"][0]
+    assert horizon_payload(entry, 100.0)["predicted_demand"] == 1.0
+    assert horizon_payload(entry, 100.0 + step)["predicted_demand"] == 2.0
+    payload = horizon_payload(entry, 100.0 + 2.5 * step)
+    assert (payload["predicted_demand"], payload["predicted_production"]) == (3.0, 30.0)
+    assert [item["step"] for item in payload["horizon"]] == [1, 2, 3]
+
+def test_cache_expires_after_the_last_step():
+    cache = HorizonCache()
+    entry = cache.put("house", "window", np.zeros((2, 2)), now=0.0)
+    assert cache.get("house", "window", entry["valid_until"][-1] - 1e-6) is entry
+    assert cache.get("house", "window", entry["valid_until"][-1]) is None
+    assert cache.get("house", "other window", 0.0) is None
+
+def test_split_horizon_is_step_major():
+    outputs = np.array([[1.0, 10.0, 2.0, 20.0, 3.0, 30.0], [4.0, 40.0, 5.0, 50.0, 6.0, 60.0]])
+    steps = split_horizon(outputs)
+    assert steps.shape == (2, 3, 2)
+    assert steps[1, 2].tolist() == [6.0, 60.0]
+    assert split_horizon(np.array([[0.5, 0.7]])).shape == (1, 1, 2)  # One-step energy_lstm
+
+def test_one_forward_pass_per_horizon():
+    class Batcher:
+        calls = []
+        async def predict_many(self, windows):
+            Batcher.calls.append(len(windows))
+            return [np.arange(8.0) + i for i in range(len(windows))]
+    behaviour = PredictionAgent.PredictBehaviour()
+    behaviour.batcher = Batcher()
+    steps = asyncio.run(behaviour.forecast_horizon(np.zeros((3, 18, 1), dtype=np.float32)))
+    assert Batcher.calls == [3]
+    assert steps.shape == (3, 4, 2)
+    assert steps[2, 3].tolist() == [8.0, 9.0]
+
+def test_uses_the_horizon_model_once_built(tmp_path):
+    assert forecast_model_name(str(tmp_path)) == "energy_lstm.keras"
+    (tmp_path / HORIZON_MODEL_NAME).write_bytes(b"")
+    assert forecast_model_name(str(tmp_path)) == HORIZON_MODEL_NAME
+
+def test_horizon_targets_follow_consecutive_windows():
+    series = np.arange(30.0)
+    X = np.stack([series[t:t + 18] for t in range(10)])[:, :, None]
+    y = np.column_stack((series[18:28], -series[18:28]))
+    inputs, targets = horizon_targets(X, y, steps=3)
+    assert len(inputs) == 8
+    assert targets[0].tolist() == [18.0, -18.0, 19.0, -19.0, 20.0, -20.0]
+    with pytest.raises(ValueError):
+        horizon_targets(X[::-1], y, steps=3)  # Not consecutive
+
+def test_horizon_head_starts_from_the_one_step_forecast(tmp_path):
+    keras = pytest.importorskip("keras")
+    keras.utils.set_random_seed(0)
+    base = keras.Sequential([keras.Input((18, 1)), keras.layers.LSTM(8), keras.layers.Dense(4, activation="relu"),
+                             keras.layers.Dense(2)])
+    model = build_horizon_model(base, steps=3)
+    windows = np.random.default_rng(0).random((5, 18, 1), dtype=np.float32)
+    one_step = base.predict(windows, verbose=0)
+    steps = split_horizon(model.predict(windows, verbose=0))
+    assert steps.shape == (5, 3, 2)
+    for step in range(3):
+        np.testing.assert_allclose(steps[:, step], one_step, rtol=1e-6)
+    assert [layer.trainable for layer in model.layers] == [False, False, True]
+
+    # The saved head runs on the NumPy backend like the other exports
+    path = str(tmp_path / HORIZON_MODEL_NAME)
+    model.save(path)
+    np.testing.assert_allclose(NumpySequential.load(export_keras_model(path)).predict(windows),
+                               model.predict(windows, verbose=0), atol=1e-5)
@@ -0,0 +1,46 @@
+import numpy as np
+from agents.streaming import WindowRing
+
+WINDOW = 4
+
+def rows(start, stop):
+    return np.arange(start, stop, dtype=np.float64)[:, None] * np.ones((1, 2))
+
+def test_push_before_load_asks_for_resync():
+    assert not WindowRing().push(1, rows(0, 1)[0])
+
+def test_deltas_slide_the_window():
+    ring = WindowRing()
+    ring.load(10, rows(0, WINDOW))
+    for seq in range(11, 17):
+        assert ring.push(seq, rows(seq - 10 + WINDOW - 1, seq - 10 + WINDOW)[0])
+        assert np.array_equal(ring.window(), rows(seq - 10, seq - 10 + WINDOW))
+
+def test_duplicates_are_ignored():
+    ring = WindowRing()
+    ring.load(1, rows(0, WINDOW))
+    assert ring.push(2, rows(WINDOW, WINDOW + 1)[0])
+    expected = ring.window().copy()
+    # The same bundle forwarded again, and an older one, change nothing
+    assert ring.push(2, rows(99, 100)[0])
+    assert ring.push(1, rows(99, 100)[0])
+    assert np.array_equal(ring.window(), expected)
+    assert ring.seq == 2
+
+def test_gap_is_reported_and_leaves_the_window_untouched():
+    ring = WindowRing()
+    ring.load(1, rows(0, WINDOW))
+    assert not ring.push(3, rows(WINDOW + 1, WINDOW + 2)[0])
+    assert ring.seq == 1
+    assert np.array_equal(ring.window(), rows(0, WINDOW))
+    # A full sync recovers
+    ring.load(3, rows(2, WINDOW + 2))
+    assert ring.push(4, rows(WINDOW + 2, WINDOW + 3)[0])
+    assert np.array_equal(ring.window(), rows(3, WINDOW + 3))
+
+def test_load_copies_the_window():
+    window = rows(0, WINDOW)
+    ring = WindowRing()
+    ring.load(1, window)
+    ring.push(2, rows(WINDOW, WINDOW + 1)[0])
+    assert np.array_equal(window, rows(0, WINDOW))
@@ -0,0 +1,119 @@
+import asyncio
+import pytest
+from web3.exceptions import TransactionNotFound
+from agents.transactions import AsyncTransactionManager, TransactionFailed, TransactionManager
+
+class Chain:
+    """Node stub: hands out tx hashes, mines them on request and counts nonce reads."""
+    def __init__(self, start_nonce=7):
+        self.start_nonce = start_nonce
+        self.nonce_reads = 0
+        self.sent = []      # (account, nonce) per accepted transaction
+        self.receipts = {}  # tx hash -> receipt once mined
+        self.reject_next = False
+
+    def get_transaction_count(self, account, block):
+        assert block == "pending"
+        self.nonce_reads += 1
+        return self.start_nonce + sum(1 for sender, _ in self.sent if sender == account)
+
+    def get_transaction_receipt(self, tx_hash):
+        if tx_hash not in self.receipts:
+            raise TransactionNotFound(f"{tx_hash.hex()} not mined")
+        return self.receipts[tx_hash]
+
+    def transact(self, params):
+        if self.reject_next:
+            self.reject_next = False
+            raise ValueError("nonce too low")
+        self.sent.append((params["from"], params["nonce"]))
+        return len(self.sent).to_bytes(32, "big")
+
+    def mine(self, tx_hash, status=1):
+        self.receipts[tx_hash] = {"transactionHash": tx_hash, "status": status, "blockNumber": len(self.receipts)}
+
+class Function:
+    def __init__(self, transact):
+        self.transact = transact
+
+class AsyncChain(Chain):
+    async def get_transaction_count(self, account, block):
+        return Chain.get_transaction_count(self, account, block)
+
+    async def get_transaction_receipt(self, tx_hash):
+        return Chain.get_transaction_receipt(self, tx_hash)
+
+def manager(chain, cls=TransactionManager, **kwargs):
+    web3 = type("Web3", (), {})()
+    web3.eth = chain
+    return cls(web3, poll_interval=0.001, **kwargs)
+
+def test_back_to_back_nonces_for_one_account():
+    chain = Chain()
+    transactions = manager(chain)
+    futures = [transactions.submit(Function(chain.transact), {"from": "0xa"}) for _ in range(3)]
+    transactions.submit(Function(chain.transact), {"from": "0xb"})
+    assert chain.sent == [("0xa", 7), ("0xa", 8), ("0xa", 9), ("0xb", 7)]
+    assert chain.nonce_reads == 2  # Once per account
+    for tx_hash in list(transactions.pending):
+        chain.mine(tx_hash)
+    assert [future.result(timeout=5)["blockNumber"] for future in futures] == [0, 1, 2]
+
+def test_nonce_is_read_again_after_a_failed_send():
+    chain = Chain()
+    transactions = manager(chain)
+    transactions.submit(Function(chain.transact), {"from": "0xa"})
+    chain.reject_next = True
+    with pytest.raises(ValueError):
+        transactions.submit(Function(chain.transact), {"from": "0xa"})
+    assert "0xa" not in transactions.nonces
+    chain.start_nonce = 20  # The node's count moved on (e.g. another client used the account)
+    transactions.submit(Function(chain.transact), {"from": "0xa"})
+    assert chain.sent == [("0xa", 7), ("0xa", 21)]
+    assert chain.nonce_reads == 2
+
+def test_reverted_transaction_raises_through_its_future():
+    chain = Chain()
+    transactions = manager(chain)
+    ok = transactions.submit(Function(chain.transact), {"from": "0xa"})
+    reverted = transactions.submit(Function(chain.transact), {"from": "0xa"})
+    first, second = list(transactions.pending)
+    chain.mine(first)
+    chain.mine(second, status=0)
+    assert ok.result(timeout=5)["status"] == 1
+    with pytest.raises(TransactionFailed) as failure:
+        reverted.result(timeout=5)
+    assert failure.value.receipt["transactionHash"] == second
+
+def test_missing_receipt_times_out():
+    chain = Chain()
+    transactions = manager(chain, timeout=0)
+    future = transactions.submit(Function(chain.transact), {"from": "0xa"})
+    with pytest.raises(TimeoutError):
+        future.result(timeout=5)
+
+def test_async_manager_nonces_and_receipts():
+    async def scenario():
+        chain = AsyncChain()
+        transactions = manager(chain, AsyncTransactionManager)
+        async def transact(params):
+            return chain.transact(params)
+        futures = await asyncio.gather(*(transactions.submit(Function(transact), {"from": "0xa"}) for _ in range(3)))
+        assert sorted(nonce for _, nonce in chain.sent) == [7, 8, 9]
+        assert chain.nonce_reads == 1
+
+        chain.reject_next = True
+        with pytest.raises(ValueError):
+            await transactions.submit(Function(transact), {"from": "0xa"})
+        assert "0xa" not in transactions.nonces
+        reverted = await transactions.submit(Function(transact), {"from": "0xa"})
+        assert chain.sent[-1] == ("0xa", 10) and chain.nonce_reads == 2
+
+        hashes = list(transactions.pending)
+        for tx_hash in hashes[:-1]:
+            chain.mine(tx_hash)
+        chain.mine(hashes[-1], status=0)
+        assert [(await future)["status"] for future in futures] == [1, 1, 1]
+        with pytest.raises(TransactionFailed):
+            await reverted
+    asyncio.run(scenario())
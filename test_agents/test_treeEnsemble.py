@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from agents.treeEnsemble import TreeEnsemble, MISSING_NONE, MISSING_ZERO, MISSING_NAN
+
+def ensemble(trees=3):
+    """
+    Three hand-built trees over features f0, f1 and f2 (children < 0 are ~leaf_index):
+      tree 0: f0 <= 1.0                                    -> 1 | 2
+      tree 1: f1 <= 0.5, missing Zero, default right       -> 10 | 20
+      tree 2: f2 <= 0.5, missing NaN, default right        -> 100 | (f0 <= 3.0 -> 200 | 300)
+    """
+    nodes = np.array([
+        # feature, threshold, left, right, default_left, missing_type
+        (0, 1.0, ~0, ~1, True, MISSING_NONE),
+        (1, 0.5, ~2, ~3, False, MISSING_ZERO),
+        (2, 0.5, ~4, 3, False, MISSING_NAN),
+        (0, 3.0, ~5, ~6, True, MISSING_NONE),
+    ], dtype=object)
+    splits = nodes if trees == 3 else nodes[:1]
+    return TreeEnsemble(
+        num_features=3,
+        feature_names=["f0", "f1", "f2"],
+        roots=np.array([0, 1, 2][:trees], dtype=np.int32),
+        feature=splits[:, 0].astype(np.int32),
+        threshold=splits[:, 1].astype(np.float64),
+        left=splits[:, 2].astype(np.int32),
+        right=splits[:, 3].astype(np.int32),
+        default_left=splits[:, 4].astype(bool),
+        missing_type=splits[:, 5].astype(np.int8),
+        leaf_values=np.array([1.0, 2.0, 10.0, 20.0, 100.0, 200.0, 300.0][:2 if trees == 1 else 7])
+    )
+
+def test_traversal_sums_one_leaf_per_tree():
+    model = ensemble()
+    assert model.depth == 2
+    scores = model.predict([[0.0, 0.3, 0.2], [2.0, 1.0, 1.0], [5.0, -1.0, 7.0]])
+    assert scores.tolist() == [1 + 10 + 100, 2 + 20 + 200, 2 + 10 + 300]
+
+def test_threshold_goes_left():
+    assert ensemble().predict([1.0, 0.5, 0.5]).tolist() == [1 + 10 + 100]
+
+def test_missing_value_routing():
+    model = ensemble()
+    scores = model.predict([
+        [0.0, 0.0, 0.2],       # Zero split: 0 takes the default (right) branch
+        [5.0, 1e-36, 0.2],     # ...and so does anything within the zero threshold
+        [2.0, 0.3, np.nan],    # NaN split: NaN takes the default (right) branch
+        [np.nan, 1.0, 1.0],    # None splits: NaN is compared as 0.0 (left of 1.0 and 3.0)
+        [5.0, np.nan, 0.2],    # Zero split: NaN counts as 0.0 and takes the default branch
+    ])
+    assert scores.tolist() == [1 + 20 + 100, 2 + 20 + 100, 2 + 10 + 200, 1 + 20 + 200, 2 + 20 + 100]
+
+def test_split_thresholds_only_for_plain_ensembles():
+    assert ensemble().split_thresholds() is None
+    plain = ensemble(trees=1)
+    assert [edges.tolist() for edges in plain.split_thresholds()] == [[1.0], [], []]
+    assert plain.predict([[np.nan, 0.0, 0.0], [1.5, 0.0, 0.0]]).tolist() == [1.0, 2.0]
+
+def test_load_round_trip(tmp_path):
+    model = ensemble()
+    path = tmp_path / "ensemble.npz"
+    np.savez(path, num_features=np.int32(3), feature_names=np.array(model.feature_names),
+             roots=np.array([0, 1, 2], dtype=np.int32), feature=model.feature[:4], threshold=model.threshold[:4],
+             left=np.array([~0, ~2, ~4, ~5], dtype=np.int32), right=np.array([~1, ~3, 3, ~6], dtype=np.int32),
+             default_left=model.default_left[:4], missing_type=model.missing_type[:4], leaf_values=model.leaf_values)
+    rows = np.array([[0.0, 0.0, np.nan], [4.0, 2.0, 1.0]])
+    assert TreeEnsemble.load(path).predict(rows).tolist() == model.predict(rows).tolist()
+
+def test_rejects_wrong_feature_count():
+    with pytest.raises(ValueError):
+        ensemble().predict([[1.0, 2.0]])